@@ -1,15 +1,23 @@
 import typing
-import io
 import ipaddress
+import bisect
+import datetime
+import functools
+import hashlib
+import inspect
+import operator
 import json
 import uuid
 import faulthandler
 from functools import cache
 from html import escape as html_escape
 from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import ORJSONResponse
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import numpy as np
+import orjson
 import requests
 import scipy.stats
 
@@ -20,35 +28,23 @@ from pydantic import BaseModel
 faulthandler.enable()  # will catch segfaults and write to STDERR
 
 from lib.global_config import GlobalConfig
-from lib.db import DB
-from lib import error_helpers
+from lib.db import AsyncDB
 
-import redis
 from enum import Enum
+from api.artifact_cache import ArtifactCache
 
-def get_artifact(artifact_type: Enum, key: str, decode_responses=True):
-    if not GlobalConfig().config['redis']['host']:
-        return None
-
-    data = None
-    try:
-        r = redis.Redis(host=GlobalConfig().config['redis']['host'], port=6379, db=artifact_type.value, protocol=3, decode_responses=decode_responses)
+async def get_artifact(artifact_type: Enum, key: str):
+    return await ArtifactCache().get(artifact_type, key)
 
-        data = r.get(key)
-    except redis.RedisError as e:
-        error_helpers.log_error('Redis get_artifact failed', exception=e)
+async def store_artifact(artifact_type: Enum, key:str, data, ex=None):
+    await ArtifactCache().set(artifact_type, key, data, ttl=ex) # None => the TTL of the artifact type
 
-    return None if data is None or data == [] else data
+async def invalidate_artifacts(artifact_type: Enum, pattern: str):
+    await ArtifactCache().invalidate(artifact_type, pattern)
 
-def store_artifact(artifact_type: Enum, key:str, data, ex=2592000):
-    if not GlobalConfig().config['redis']['host']:
-        return
-
-    try:
-        r = redis.Redis(host=GlobalConfig().config['redis']['host'], port=6379, db=artifact_type.value, protocol=3)
-        r.set(key, data, ex=ex) # Expiration => 2592000 = 30 days
-    except redis.RedisError as e:
-        error_helpers.log_error('Redis store_artifact failed', exception=e)
+# The artifact already is the JSON of the data, so it is sent as it is instead of being decoded and encoded again
+def artifact_json_response(artifact, headers=None):
+    return Response(content=f'{{"success":true,"data":{artifact}}}', media_type='application/json', headers=headers)
 
 def rescale_energy_value(value, unit):
     # We only expect values to be mJ for energy!
@@ -76,6 +72,81 @@ def is_valid_uuid(val):
     except ValueError:
         return False
 
+# The IMF-fixdate of HTTP, e.g. Thu, 25 Apr 2024 12:00:00 GMT. Always in UTC
+HTTP_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+def is_not_modified(request, etag, last_modified):
+    if (if_none_match := request.headers.get('if-none-match')) is not None:
+        # weak comparison, as nginx turns the ETag weak when it compresses the response
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+
+    if (if_modified_since := request.headers.get('if-modified-since')) is not None:
+        try:
+            # Clients send back the Last-Modified they got, which is always in this format
+            if_modified_since = datetime.datetime.strptime(if_modified_since, HTTP_DATE_FORMAT).replace(tzinfo=datetime.timezone.utc)
+            return last_modified.replace(microsecond=0) <= if_modified_since
+        except ValueError:
+            return False
+    return False
+
+# Conditional GET for the routes of a single run. Once the run has its end_measurement and phase_stats, it only
+# changes when its phase_stats are rebuilt. Then the response gets an ETag and Last-Modified derived from the updated_at
+# of the run, and a request with matching validators is answered with 304 without running the route at all.
+# Cache-Control is no-cache, so clients revalidate every time and a rebuild is never missed.
+# headers are the ones that the route sets itself and that the 304 must repeat, like the Vary of routes with
+# several formats. The route gets the request as additional parameter, unless it already has one.
+# Direct calls without the request, like from warm_artifacts, run the route as it is
+def cache_finished_run(route=None, *, headers=None):
+    if route is None:
+        return functools.partial(cache_finished_run, headers=headers)
+
+    signature = inspect.signature(route)
+    route_takes_request = 'request' in signature.parameters
+    if not route_takes_request:
+        signature = signature.replace(parameters=[
+            inspect.Parameter('request', inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Request),
+            *signature.parameters.values()
+        ])
+
+    @functools.wraps(route)
+    async def wrapper(*args, **kwargs):
+        request = kwargs['request'] if route_takes_request else kwargs.pop('request', None)
+        run_id = kwargs.get('run_id')
+        if request is None or not is_valid_uuid(run_id):
+            return await route(*args, **kwargs)
+
+        query = """
+            SELECT COALESCE(updated_at, created_at),
+                end_measurement IS NOT NULL AND EXISTS (SELECT 1 FROM phase_stats WHERE run_id = runs.id)
+            FROM runs
+            WHERE id = %s
+            """
+        run = await AsyncDB().fetch_one(query, params=(run_id, ))
+        if run is None or not run[1]:
+            response = await route(*args, **kwargs)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        last_modified = run[0]
+        # The query parameters and the format select different representations of the same run
+        representation = f"{request.url.path}?{request.url.query}|{COLUMNAR_MEDIA_TYPE in request.headers.get('accept', '')}|{last_modified.isoformat()}"
+        validators = {
+            'ETag': f'"{hashlib.sha256(representation.encode()).hexdigest()[:32]}"',
+            'Last-Modified': last_modified.astimezone(datetime.timezone.utc).strftime(HTTP_DATE_FORMAT),
+            'Cache-Control': 'no-cache',
+        }
+        if is_not_modified(request, validators['ETag'], last_modified):
+            return Response(status_code=304, headers={**(headers or {}), **validators})
+
+        response = await route(*args, **kwargs)
+        if response.status_code == 200:
+            response.headers.update(validators)
+        return response
+
+    wrapper.__signature__ = signature
+    return wrapper
+
 def html_escape_multi(item):
     """Replace special characters "'", "\"", "&", "<" and ">" to HTML-safe sequences."""
     if item is None:
@@ -116,7 +187,7 @@ def html_escape_multi(item):
 
     return item
 
-def get_machine_list():
+async def get_machine_list():
     query = """
         WITH timings as (
             SELECT
@@ -140,9 +211,9 @@ def get_machine_list():
             ORDER BY m.description DESC
             """
 
-    return DB().fetch_all(query)
+    return await AsyncDB().fetch_all(query)
 
-def get_run_info(run_id):
+async def get_run_info(run_id):
     query = """
             SELECT
                 id, name, uri, branch, commit_hash,
@@ -155,7 +226,7 @@ def get_run_info(run_id):
             WHERE id = %s
             """
     params = (run_id,)
-    return DB().fetch_one(query, params=params, row_factory=psycopg_rows_dict_row)
+    return await AsyncDB().fetch_one(query, params=params, row_factory=psycopg_rows_dict_row)
 
 
 def get_timeline_query(uri, filename, machine_id, branch, metrics, phase, start_date=None, end_date=None, detail_name=None, limit_365=False, sorting='run'):
@@ -227,7 +298,7 @@ def get_timeline_query(uri, filename, machine_id, branch, metrics, phase, start_
 
     return (query, params)
 
-def determine_comparison_case(ids):
+async def determine_comparison_case(ids):
 
     query = '''
             WITH uniques as (
@@ -241,7 +312,7 @@ def determine_comparison_case(ids):
             FROM uniques
     '''
 
-    data = DB().fetch_one(query, (ids, ))
+    data = await AsyncDB().fetch_one(query, (ids, ))
     if data is None or data == [] or data[1] is None: # special check for data[1] as this is aggregate query which always returns result
         raise RuntimeError('Could not determine compare case')
 
@@ -327,7 +398,7 @@ def determine_comparison_case(ids):
 
     return case
 
-def get_phase_stats(ids):
+async def get_phase_stats(ids):
     query = """
             SELECT
                 a.phase, a.metric, a.detail_name, a.value, a.type, a.max_value, a.min_value, a.unit,
@@ -349,7 +420,7 @@ def get_phase_stats(ids):
                 branch ASC,
                 b.created_at ASC
             """
-    data = DB().fetch_all(query, (ids, ))
+    data = await AsyncDB().fetch_all(query, (ids, ))
     if data is None or data == []:
         raise RuntimeError('Data is empty')
     return data
@@ -613,7 +684,194 @@ class ORJSONResponseObjKeep(ORJSONResponse):
         self.content = content
         super().__init__(content, status_code, headers, media_type, background)
 
-def get_geo(ip):
+# Streams {'success': True, 'data': [...]} with the rows of AsyncDB().fetch_batches() batch by batch, so that the memory
+# of the worker is bounded by the batch size instead of the size of the result. The first batch is fetched before
+# the response starts, so that a result without rows can still be answered with 204 (returns None then)
+async def stream_rows_response(batches, transform=None, headers=None):
+    first_batch = await anext(batches, None)
+    if first_batch is None:
+        await batches.aclose()
+        return None
+
+    def dump_rows(rows):
+        if transform is not None:
+            rows = transform(rows)
+        # the same options as ORJSONResponse. The brackets are removed so that the batches form one list
+        return orjson.dumps(rows, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)[1:-1] # pylint: disable=no-member
+
+    async def body():
+        try:
+            yield b'{"success":true,"data":['
+            yield dump_rows(first_batch)
+            async for rows in batches:
+                yield b',' + dump_rows(rows)
+            yield b']}'
+        finally:
+            await batches.aclose() # returns the connection also when the client disconnected
+
+    return StreamingResponse(body(), media_type='application/json', headers=headers)
+
+# Media type in the Accept header that selects the columnar format, like format=columnar does
+COLUMNAR_MEDIA_TYPE = 'application/vnd.green-metrics.columnar+json'
+
+def is_columnar_requested(request, output_format):
+    if output_format is not None:
+        if output_format not in ('rows', 'columnar'):
+            raise RequestValidationError(f"Unknown format '{output_format}' submitted")
+        return output_format == 'columnar'
+    return COLUMNAR_MEDIA_TYPE in request.headers.get('accept', '')
+
+class ColumnarEncoder:
+    '''
+        Encodes rows in the columnar format that the endpoints with long lists of rows offer next to a list per row:
+        {"series": [{<series column>: value, <column>: [values]}], "dictionaries": {<column>: [values]}}
+
+        Consecutive rows with the same values in the series_columns form a series, so these values are sent only once.
+        The other columns become one list per series. For the dictionary_columns these lists hold indices into the
+        dictionary of the column instead of repeating the same strings.
+
+        The rows of a series must be contiguous, as the series are found by bisection. Ordering by the series_columns does that
+    '''
+
+    def __init__(self, columns, series_columns=(), dictionary_columns=()):
+        self._columns = columns
+        series_indices = [columns.index(column) for column in series_columns]
+        self._series_key = operator.itemgetter(*series_indices) if series_indices else lambda row: None
+        self._series_columns = [(column, i) for i, column in enumerate(columns) if i in series_indices]
+        self._list_columns = [(column, operator.itemgetter(i), column in dictionary_columns) for i, column in enumerate(columns) if i not in series_indices]
+        self._dictionaries = {column: {} for column in dictionary_columns}
+        self._current_key = None
+        self._series = None
+
+    # The values are taken out of the rows right away, as holding on to many rows makes the garbage collector scan them
+    # again and again. map is used instead of zip(*rows), which creates an iterator per row
+    def _extend_series(self, rows):
+        for column, getter, is_dictionary_column in self._list_columns:
+            values = list(map(getter, rows))
+            if is_dictionary_column:
+                lookup = self._dictionaries[column]
+                for value in dict.fromkeys(values): # the new values in order of appearance
+                    lookup.setdefault(value, len(lookup))
+                values = map(lookup.__getitem__, values)
+            self._series[column].extend(values)
+
+    def _encode_series(self):
+        series = self._series
+        self._series = None
+        return orjson.dumps(series, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) # pylint: disable=no-member
+
+    # Returns the JSON of the series that are complete with these rows
+    def add(self, rows):
+        encoded = []
+        start = 0
+        while start < len(rows):
+            key = self._series_key(rows[start])
+            end = bisect.bisect_left(rows, True, lo=start + 1, key=lambda row: self._series_key(row) != key) # pylint: disable=cell-var-from-loop
+
+            if self._series is not None and key != self._current_key:
+                encoded.append(self._encode_series())
+            if self._series is None:
+                self._series = {column: rows[start][i] for column, i in self._series_columns}
+                self._series.update({column: [] for column, _, _ in self._list_columns})
+            self._current_key = key
+            self._extend_series(rows[start:end])
+            start = end
+        return encoded
+
+    # Returns the JSON of the last series and the dictionaries, that close the data object
+    def finish(self):
+        last_series = self._encode_series() if self._series is not None else None
+        dictionaries = orjson.dumps({column: list(lookup) for column, lookup in self._dictionaries.items()}) # pylint: disable=no-member
+        return last_series, dictionaries
+
+    def encode(self, rows):
+        encoded = self.add(rows)
+        last_series, dictionaries = self.finish()
+        if last_series is not None:
+            encoded.append(last_series)
+        return b'{"series":[' + b','.join(encoded) + b'],"dictionaries":' + dictionaries + b'}'
+
+# Size of the pieces that stream_columnar_response sends. A series can be megabytes long, and writing it in one
+# piece takes longer than in many, as the whole series then sits in the buffer of the transport
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# The columnar counterpart of stream_rows_response. Every series is sent as soon as it is complete
+async def stream_columnar_response(batches, encoder, headers=None):
+    first_batch = await anext(batches, None)
+    if first_batch is None:
+        await batches.aclose()
+        return None
+
+    async def all_batches():
+        yield first_batch
+        async for rows in batches:
+            yield rows
+
+    def pieces(data):
+        return (data[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(data), STREAM_CHUNK_SIZE))
+
+    async def body():
+        try:
+            yield b'{"success":true,"data":{"series":['
+            separator = b''
+            async for rows in all_batches():
+                for series in encoder.add(rows):
+                    for piece in pieces(separator + series):
+                        yield piece
+                    separator = b','
+            last_series, dictionaries = encoder.finish()
+            if last_series is not None:
+                for piece in pieces(separator + last_series):
+                    yield piece
+            yield b'],"dictionaries":' + dictionaries + b'}}'
+        finally:
+            await batches.aclose() # returns the connection also when the client disconnected
+
+    return StreamingResponse(body(), media_type='application/json', headers=headers)
+
+# Reduces a time series to at most `points` samples by keeping the minimum and the maximum of equally sized buckets,
+# so that peaks and drops stay visible in a chart. Every kept sample gets the time since the sample before it
+# in the full series appended, as the conversion of energy to power needs the original interval
+def downsample_series(rows, points):
+    times = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+    intervals = np.diff(times, prepend=times[0])
+
+    if len(rows) <= points:
+        return [(*row, int(interval)) for row, interval in zip(rows, intervals)]
+
+    values = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+    bucket_starts = np.linspace(0, len(rows), points // 2, endpoint=False).astype(np.int64)
+    bucket_ids = np.repeat(np.arange(len(bucket_starts)), np.diff(bucket_starts, append=len(rows)))
+
+    # Index of the first minimum or maximum of every bucket
+    def get_extremes(reduce):
+        extremes = reduce.reduceat(values, bucket_starts)
+        matches = np.flatnonzero(values == extremes[bucket_ids])
+        _, first_of_bucket = np.unique(bucket_ids[matches], return_index=True)
+        return matches[first_of_bucket]
+
+    return [(*rows[i], int(intervals[i])) for i in np.union1d(get_extremes(np.minimum), get_extremes(np.maximum))]
+
+# Expects the rows of the measurements ordered by metric, detail_name and time and downsamples every series on its own.
+# Only one series is kept in memory at a time besides the result
+async def downsample_measurements(batches, points):
+    result = []
+    series = []
+    try:
+        async for rows in batches:
+            for row in rows:
+                if series and (row[0] != series[0][0] or row[2] != series[0][2]):
+                    result.extend(downsample_series(series, points))
+                    series = []
+                series.append(row)
+    finally:
+        await batches.aclose()
+
+    if series:
+        result.extend(downsample_series(series, points))
+    return result
+
+async def get_geo(ip):
     try:
         ip_obj = ipaddress.ip_address(ip)
         if ip_obj.is_private:
@@ -622,25 +880,25 @@ def get_geo(ip):
         return (None, None)
 
     query = "SELECT ip_address, data FROM ip_data WHERE created_at > NOW() - INTERVAL '24 hours' AND ip_address=%s;"
-    db_data = DB().fetch_all(query, (ip,))
+    db_data = await AsyncDB().fetch_all(query, (ip,))
 
     if db_data is not None and len(db_data) != 0:
         return (db_data[0][1].get('latitude'), db_data[0][1].get('longitude'))
 
-    latitude, longitude = get_geo_ipapi_co(ip)
+    latitude, longitude = await get_geo_ipapi_co(ip)
 
     if latitude is False:
-        latitude, longitude = get_geo_ip_api_com(ip)
+        latitude, longitude = await get_geo_ip_api_com(ip)
     if latitude is False:
-        latitude, longitude = get_geo_ip_ipinfo(ip)
+        latitude, longitude = await get_geo_ip_ipinfo(ip)
 
     #If all 3 fail there is something bigger wrong
     return (latitude, longitude)
 
 
-def get_geo_ipapi_co(ip):
+async def get_geo_ipapi_co(ip):
 
-    response = requests.get(f"https://ipapi.co/{ip}/json/", timeout=10)
+    response = await run_in_threadpool(requests.get, f"https://ipapi.co/{ip}/json/", timeout=10)
     print(f"Accessing https://ipapi.co/{ip}/json/")
     if response.status_code == 200:
         resp_data = response.json()
@@ -651,15 +909,15 @@ def get_geo_ipapi_co(ip):
         resp_data['source'] = 'ipapi.co'
 
         query = "INSERT INTO ip_data (ip_address, data) VALUES (%s, %s)"
-        DB().query(query=query, params=(ip, json.dumps(resp_data)))
+        await AsyncDB().query(query=query, params=(ip, json.dumps(resp_data)))
 
         return (resp_data.get('latitude'), resp_data.get('longitude'))
 
     return (False, False)
 
-def get_geo_ip_api_com(ip):
+async def get_geo_ip_api_com(ip):
 
-    response = requests.get(f"http://ip-api.com/json/{ip}", timeout=10)
+    response = await run_in_threadpool(requests.get, f"http://ip-api.com/json/{ip}", timeout=10)
     print(f"Accessing http://ip-api.com/json/{ip}")
     if response.status_code == 200:
         resp_data = response.json()
@@ -672,15 +930,15 @@ def get_geo_ip_api_com(ip):
         resp_data['source'] = 'ip-api.com'
 
         query = "INSERT INTO ip_data (ip_address, data) VALUES (%s, %s)"
-        DB().query(query=query, params=(ip, json.dumps(resp_data)))
+        await AsyncDB().query(query=query, params=(ip, json.dumps(resp_data)))
 
         return (resp_data.get('latitude'), resp_data.get('longitude'))
 
     return (False, False)
 
-def get_geo_ip_ipinfo(ip):
+async def get_geo_ip_ipinfo(ip):
 
-    response = requests.get(f"https://ipinfo.io/{ip}/json", timeout=10)
+    response = await run_in_threadpool(requests.get, f"https://ipinfo.io/{ip}/json", timeout=10)
     print(f"Accessing https://ipinfo.io/{ip}/json")
     if response.status_code == 200:
         resp_data = response.json()
@@ -695,19 +953,19 @@ def get_geo_ip_ipinfo(ip):
         resp_data['source'] = 'ipinfo.io'
 
         query = "INSERT INTO ip_data (ip_address, data) VALUES (%s, %s)"
-        DB().query(query=query, params=(ip, json.dumps(resp_data)))
+        await AsyncDB().query(query=query, params=(ip, json.dumps(resp_data)))
 
         return (resp_data.get('latitude'), resp_data.get('longitude'))
 
     return (False, False)
 
-def get_carbon_intensity(latitude, longitude):
+async def get_carbon_intensity(latitude, longitude):
 
     if latitude is None or longitude is None:
         return None
 
     query = "SELECT latitude, longitude, data FROM carbon_intensity WHERE created_at > NOW() - INTERVAL '1 hours' AND latitude=%s AND longitude=%s;"
-    db_data = DB().fetch_all(query, (latitude, longitude))
+    db_data = await AsyncDB().fetch_all(query, (latitude, longitude))
 
     if db_data is not None and len(db_data) != 0:
         return db_data[0][2].get('carbonIntensity')
@@ -722,21 +980,21 @@ def get_carbon_intensity(latitude, longitude):
     headers = {'auth-token': token }
     params = {'lat': latitude, 'lon': longitude }
 
-    response = requests.get('https://api.electricitymap.org/v3/carbon-intensity/latest', params=params, headers=headers, timeout=10)
+    response = await run_in_threadpool(requests.get, 'https://api.electricitymap.org/v3/carbon-intensity/latest', params=params, headers=headers, timeout=10)
     print(f"Accessing electricitymap with {latitude} {longitude}")
     if response.status_code == 200:
         resp_data = response.json()
         query = "INSERT INTO carbon_intensity (latitude, longitude, data) VALUES (%s, %s, %s)"
-        DB().query(query=query, params=(latitude, longitude, json.dumps(resp_data)))
+        await AsyncDB().query(query=query, params=(latitude, longitude, json.dumps(resp_data)))
 
         return resp_data.get('carbonIntensity')
 
     return None
 
-def carbondb_add(client_ip, energydatas):
+async def carbondb_add(client_ip, energydatas):
 
-    latitude, longitude = get_geo(client_ip)
-    carbon_intensity = get_carbon_intensity(latitude, longitude)
+    latitude, longitude = await get_geo(client_ip)
+    carbon_intensity = await get_carbon_intensity(latitude, longitude)
 
     data_rows = []
 
@@ -759,22 +1017,24 @@ def carbondb_add(client_ip, energydatas):
 
         if 'ip' in e:
             # An ip has been given with the data. Let's use this:
-            latitude, longitude = get_geo(e['ip'])
-            carbon_intensity = get_carbon_intensity(latitude, longitude)
+            latitude, longitude = await get_geo(e['ip'])
+            carbon_intensity = await get_carbon_intensity(latitude, longitude)
+
+        # get_geo returns strings for private ips and cached ip_data, which the binary float8 dumper rejects
+        latitude = float(latitude) if latitude is not None else None
+        longitude = float(longitude) if longitude is not None else None
+        carbon_intensity = float(carbon_intensity) if carbon_intensity is not None else None
 
         energy_kwh = float(e['energy_value']) * 2.77778e-7
         co2_value = energy_kwh * carbon_intensity
 
-        company_uuid = e['company'] if e['company'] is not None else ''
-        project_uuid = e['project'] if e['project'] is not None else ''
-        tags_clean = "{" + ",".join([f'"{tag.strip()}"' for tag in e['tags'].split(',') if e['tags']]) + "}" if e['tags'] is not None else ''
-
-        row = f"{e['type']}|{company_uuid}|{e['machine']}|{project_uuid}|{tags_clean}|{int(e['time_stamp'])}|{e['energy_value']}|{co2_value}|{carbon_intensity}|{latitude}|{longitude}|{client_ip}"
-        data_rows.append(row)
+        company_uuid = uuid.UUID(str(e['company'])) if e['company'] else None
+        project_uuid = uuid.UUID(str(e['project'])) if e['project'] else None
+        tags_clean = [tag.strip() for tag in e['tags'].split(',') if e['tags']] if e['tags'] is not None else None
 
-    data_str = "\n".join(data_rows)
-    data_file = io.StringIO(data_str)
+        data_rows.append((e['type'], company_uuid, uuid.UUID(str(e['machine'])), project_uuid, tags_clean, int(e['time_stamp']), float(e['energy_value']), co2_value, carbon_intensity, latitude, longitude, ipaddress.ip_address(client_ip)))
 
     columns = ['type', 'company', 'machine', 'project', 'tags', 'time_stamp', 'energy_value', 'co2_value', 'carbon_intensity', 'latitude', 'longitude', 'ip_address']
+    types = ['text', 'uuid', 'uuid', 'uuid', 'text[]', 'bigint', 'float8', 'float8', 'float8', 'float8', 'float8', 'inet']
 
-    DB().copy_from(file=data_file, table='carbondb_energy_data', columns=columns, sep='|')
+    await AsyncDB().copy_binary(table='carbondb_energy_data', columns=columns, types=types, data=data_rows)
@@ -0,0 +1,215 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from enum import Enum
+from fnmatch import fnmatchcase
+
+import redis.asyncio as redis
+
+from lib.global_config import GlobalConfig
+from lib import error_helpers
+
+# Every type is stored in its own redis database
+ArtifactType = Enum('ArtifactType', ['DIFF', 'COMPARE', 'STATS', 'BADGE', 'MEASUREMENTS'])
+
+# Channel on which the invalidations are sent to the LRUCache of all API workers
+INVALIDATION_CHANNEL = 'artifact_invalidations'
+
+# Seconds an artifact is kept, if the route does not give its own TTL
+ARTIFACT_TTL = {
+    ArtifactType.DIFF: 60*60*24*30,
+    ArtifactType.COMPARE: 60*60*24*30,
+    ArtifactType.STATS: 60*60*24*30,
+    ArtifactType.BADGE: 60*60*24*30,
+    ArtifactType.MEASUREMENTS: 60*60*24*30,
+}
+
+# Seconds after which a worker drops its local copy of an artifact at the latest. An invalidation that a worker missed
+# only keeps the stale copy for that long and not for the TTL of the artifact in redis
+LOCAL_TTL = 60*5
+
+# Seconds between two attempts to subscribe to the invalidations again, doubled up to the maximum on every failure
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 60
+
+class LRUCache:
+    '''
+        Keeps the most recently used values up to max_bytes in the memory of the process.
+        Every value expires after its own TTL. The size of a value is its length, as artifacts are strings.
+
+        The API workers run a single event loop and nothing is awaited in here, so no locking is needed
+    '''
+
+    def __init__(self, max_bytes):
+        self._entries = OrderedDict() # key => (expires_at, value)
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        self.delete(key)
+        if len(value) > self._max_bytes: # would only push out everything else
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._bytes += len(value)
+        while self._bytes > self._max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def delete_matching(self, match):
+        for key in [key for key in self._entries if match(key)]:
+            self.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self._max_bytes, 'evictions': self.evictions}
+
+# Escapes the glob characters of a part of an artifact key, so that it only matches itself in redis and fnmatch
+def escape_pattern(text):
+    return re.sub(r'([*?\[])', r'[\1]', str(text))
+
+class ArtifactCache:
+    '''
+        Two tiers for the artifacts of the API: an LRUCache in every API worker in front of redis, that all workers share.
+        redis is reached through one pooled client per artifact type that lives as long as the worker.
+        Without redis.host in the config.yml only the LRUCache is used.
+        The LRUCache keeps an artifact for at most redis.local_cache_ttl seconds, as it may miss invalidations.
+
+        Artifacts are returned as str, like redis returns them with decode_responses
+    '''
+
+    def __new__(cls):
+        if not hasattr(cls, 'instance'):
+            cls.instance = super(ArtifactCache, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self):
+
+        if not hasattr(self, '_local'):
+            config = GlobalConfig().config['redis']
+            self._local = LRUCache(int(config.get('local_cache_mb', 64) * 1024 * 1024))
+            self._local_ttl = config.get('local_cache_ttl', LOCAL_TTL)
+            self._clients = {}
+            if config['host']:
+                self._clients = {
+                    artifact_type: redis.Redis(host=config['host'], port=6379, db=artifact_type.value, protocol=3, decode_responses=True)
+                    for artifact_type in ArtifactType
+                }
+            self._counters = {artifact_type.name: {'local_hits': 0, 'redis_hits': 0, 'misses': 0} for artifact_type in ArtifactType}
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.aclose()
+
+    # Runs as long as the worker and removes the artifacts that other workers invalidated from the LRUCache.
+    # If the connection to redis is lost it subscribes again. Invalidations sent in between are missed, so the
+    # LRUCache is cleared on every subscribe
+    async def listen_for_invalidations(self):
+        if not self._clients:
+            return
+
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with self._clients[ArtifactType.BADGE].pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    self._local.clear()
+                    delay = RECONNECT_DELAY
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            type_name, pattern = message['data'].split(' ', 1)
+                            self._delete_local(ArtifactType[type_name], pattern)
+            except redis.RedisError as e:
+                # Only the first failure is logged, so that a redis that is down does not flood the error log
+                if delay == RECONNECT_DELAY:
+                    error_helpers.log_error('Redis listen_for_invalidations failed. Subscribing again', exception=e)
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def _delete_local(self, artifact_type, pattern):
+        self._local.delete_matching(lambda key: key[0] == artifact_type and fnmatchcase(key[1], pattern))
+
+    # Deletes all artifacts of the type whose key matches the glob pattern in redis and in the LRUCache of every worker.
+    # Parts of the pattern that come from user input must go through escape_pattern
+    async def invalidate(self, artifact_type, pattern):
+        self._delete_local(artifact_type, pattern)
+
+        if artifact_type in self._clients:
+            client = self._clients[artifact_type]
+            try:
+                keys = [key async for key in client.scan_iter(match=pattern, count=1000)]
+                if keys:
+                    await client.unlink(*keys)
+                await client.publish(INVALIDATION_CHANNEL, f"{artifact_type.name} {pattern}")
+            except redis.RedisError as e:
+                error_helpers.log_error('Redis invalidate_artifacts failed', exception=e)
+
+    async def get(self, artifact_type, key):
+        counters = self._counters[artifact_type.name]
+        if (data := self._local.get((artifact_type, key))) is not None:
+            counters['local_hits'] += 1
+            return data
+
+        if artifact_type in self._clients:
+            try:
+                # The remaining TTL, so that the local copy does not outlive the one in redis
+                async with self._clients[artifact_type].pipeline(transaction=False) as pipe:
+                    data, ttl = await pipe.get(key).ttl(key).execute()
+            except redis.RedisError as e:
+                error_helpers.log_error('Redis get_artifact failed', exception=e)
+                data = None
+
+            if data is not None:
+                counters['redis_hits'] += 1
+                self._local.set((artifact_type, key), data, min(ttl if ttl > 0 else ARTIFACT_TTL[artifact_type], self._local_ttl))
+                return data
+
+        counters['misses'] += 1
+        return None
+
+    async def set(self, artifact_type, key, data, ttl=None):
+        if ttl is None:
+            ttl = ARTIFACT_TTL[artifact_type]
+        if isinstance(data, bytes):
+            data = data.decode()
+
+        self._local.set((artifact_type, key), data, min(ttl, self._local_ttl))
+
+        if artifact_type in self._clients:
+            try:
+                await self._clients[artifact_type].set(key, data, ex=ttl)
+            except redis.RedisError as e:
+                error_helpers.log_error('Redis store_artifact failed', exception=e)
+
+    # Hit and miss counters per artifact type and the usage of the local tier of this worker
+    def get_stats(self):
+        return {
+            'pid': os.getpid(),
+            'redis': bool(self._clients),
+            'local': self._local.get_stats(),
+            'artifacts': self._counters,
+        }
@@ -5,20 +5,25 @@ import time
 # Is the redundant call problematic
 faulthandler.enable()  # will catch segfaults and write to STDERR
 
+import asyncio
+import hmac
 import zlib
 import base64
 import orjson
 from typing import List
 from xml.sax.saxutils import escape as xml_escape
 import math
-from fastapi import FastAPI, Request, Response
+import numpy
+from fastapi import FastAPI, Header, Query, Request, Response
 from fastapi.responses import ORJSONResponse
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import date
+from contextlib import asynccontextmanager
 
 from starlette.responses import RedirectResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from pydantic import BaseModel, ValidationError, field_validator
@@ -28,23 +33,33 @@ from uuid import UUID
 import anybadge
 
 from api.object_specifications import Measurement
+from api.artifact_cache import ArtifactCache, ArtifactType, escape_pattern
 from api.api_helpers import (ORJSONResponseObjKeep, add_phase_stats_statistics, carbondb_add, determine_comparison_case,
                          html_escape_multi, get_phase_stats, get_phase_stats_object,
                          is_valid_uuid, rescale_energy_value, get_timeline_query,
-                         get_run_info, get_machine_list, get_artifact, store_artifact)
+                         get_run_info, get_machine_list, get_artifact, store_artifact, invalidate_artifacts, artifact_json_response, stream_rows_response,
+                         downsample_measurements, is_columnar_requested, ColumnarEncoder, stream_columnar_response, cache_finished_run)
 
 from lib.global_config import GlobalConfig
-from lib.db import DB
+from lib.db import AsyncDB, DB
 from lib.diff import get_diffable_row, diff_rows
+from lib.powermetrics_decoder import PowermetricsDecoder
 from lib import error_helpers
 from lib.job.base import Job
 from tools.timeline_projects import TimelineProject
 
-from enum import Enum
-ArtifactType = Enum('ArtifactType', ['DIFF', 'COMPARE', 'STATS', 'BADGE'])
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # The pool of every worker is opened in its own event loop
+    await AsyncDB().open()
+    invalidations = asyncio.create_task(ArtifactCache().listen_for_invalidations())
+    yield
+    invalidations.cancel()
+    await AsyncDB().close()
+    await ArtifactCache().close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -130,6 +145,7 @@ async def home():
 
 # A route to return all of the available entries in our catalog.
 @app.get('/v1/notes/{run_id}')
+@cache_finished_run
 async def get_notes(run_id):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
@@ -140,7 +156,7 @@ async def get_notes(run_id):
             WHERE run_id = %s
             ORDER BY created_at DESC  -- important to order here, the charting library in JS cannot do that automatically!
             """
-    data = DB().fetch_all(query, (run_id,))
+    data = await AsyncDB().fetch_all(query, (run_id,))
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -148,6 +164,7 @@ async def get_notes(run_id):
     return ORJSONResponseObjKeep({'success': True, 'data': escaped_data})
 
 @app.get('/v1/network/{run_id}')
+@cache_finished_run
 async def get_network(run_id):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
@@ -158,17 +175,18 @@ async def get_network(run_id):
             WHERE run_id = %s
             ORDER BY time
             """
-    data = DB().fetch_all(query, (run_id,))
+    response = await stream_rows_response(AsyncDB().fetch_batches(query, (run_id,)), transform=html_escape_multi)
+    if response is None:
+        return ORJSONResponse({'success': True, 'data': []})
 
-    escaped_data = html_escape_multi(data)
-    return ORJSONResponseObjKeep({'success': True, 'data': escaped_data})
+    return response
 
 
 # return a list of all possible registered machines
 @app.get('/v1/machines')
 async def get_machines():
 
-    data = get_machine_list()
+    data = await get_machine_list()
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -212,7 +230,7 @@ async def get_repositories(uri: str | None = None, branch: str | None = None, ma
     else:
         query = f"{query} ORDER BY last_run DESC"
 
-    data = DB().fetch_all(query, params=tuple(params))
+    data = await AsyncDB().fetch_all(query, params=tuple(params))
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -259,7 +277,7 @@ async def get_runs(uri: str | None = None, branch: str | None = None, machine_id
         params.append(limit)
 
 
-    data = DB().fetch_all(query, params=tuple(params))
+    data = await AsyncDB().fetch_all(query, params=tuple(params))
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -281,15 +299,15 @@ async def compare_in_repo(ids: str):
         raise RequestValidationError('One of Run IDs is not a valid UUID or empty')
 
 
-    if artifact := get_artifact(ArtifactType.COMPARE, str(ids)):
-        return ORJSONResponse({'success': True, 'data': orjson.loads(artifact)}) # pylint: disable=no-member
+    if artifact := await get_artifact(ArtifactType.COMPARE, str(ids)):
+        return artifact_json_response(artifact)
 
     try:
-        case = determine_comparison_case(ids)
+        case = await determine_comparison_case(ids)
     except RuntimeError as err:
         raise RequestValidationError(str(err)) from err
     try:
-        phase_stats = get_phase_stats(ids)
+        phase_stats = await get_phase_stats(ids)
     except RuntimeError:
         return Response(status_code=204) # No-Content
     try:
@@ -297,9 +315,9 @@ async def compare_in_repo(ids: str):
         phase_stats_object = add_phase_stats_statistics(phase_stats_object)
         phase_stats_object['common_info'] = {}
 
-        run_info = get_run_info(ids[0])
+        run_info = await get_run_info(ids[0])
 
-        machine_list = get_machine_list()
+        machine_list = await get_machine_list()
         machines = {machine[0]: machine[1] for machine in machine_list}
 
         machine = machines[run_info['machine_id']]
@@ -351,59 +369,111 @@ async def compare_in_repo(ids: str):
     except RuntimeError as err:
         raise RequestValidationError(str(err)) from err
 
-    store_artifact(ArtifactType.COMPARE, str(ids), orjson.dumps(phase_stats_object)) # pylint: disable=no-member
+    await store_artifact(ArtifactType.COMPARE, str(ids), orjson.dumps(phase_stats_object)) # pylint: disable=no-member
 
 
     return ORJSONResponse({'success': True, 'data': phase_stats_object})
 
 
 @app.get('/v1/phase_stats/single/{run_id}')
+@cache_finished_run
 async def get_phase_stats_single(run_id: str):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
 
-    if artifact := get_artifact(ArtifactType.STATS, str(run_id)):
-        return ORJSONResponse({'success': True, 'data': orjson.loads(artifact)}) # pylint: disable=no-member
+    if artifact := await get_artifact(ArtifactType.STATS, str(run_id)):
+        return artifact_json_response(artifact)
 
     try:
-        phase_stats = get_phase_stats([run_id])
+        phase_stats = await get_phase_stats([run_id])
         phase_stats_object = get_phase_stats_object(phase_stats, None)
         phase_stats_object = add_phase_stats_statistics(phase_stats_object)
 
     except RuntimeError:
         return Response(status_code=204) # No-Content
 
-    store_artifact(ArtifactType.STATS, str(run_id), orjson.dumps(phase_stats_object)) # pylint: disable=no-member
+    await store_artifact(ArtifactType.STATS, str(run_id), orjson.dumps(phase_stats_object)) # pylint: disable=no-member
 
     return ORJSONResponseObjKeep({'success': True, 'data': phase_stats_object})
 
 
+# The responses of the routes that offer the columnar format depend on the Accept header
+VARY_ON_FORMAT = {'Vary': 'Accept'}
+
+MEASUREMENTS_COLUMNS = ['detail_name', 'time', 'metric', 'value', 'unit']
+
+# Downsampled measurements carry the interval to the sample before as additional column
+def measurements_encoder(with_interval=False):
+    columns = MEASUREMENTS_COLUMNS + ['interval'] if with_interval else MEASUREMENTS_COLUMNS
+    return ColumnarEncoder(columns, series_columns=('metric', 'detail_name'), dictionary_columns=('unit', ))
+
 # This route gets the measurements to be displayed in a timeline chart
+# With points every series of a metric and detail_name is downsampled to at most that many samples. Without it
+# all samples are returned in full resolution
 @app.get('/v1/measurements/single/{run_id}')
-async def get_measurements_single(run_id: str):
+@cache_finished_run(headers=VARY_ON_FORMAT)
+async def get_measurements_single(request: Request, run_id: str, points: int | None = None, output_format: str | None = Query(None, alias='format')):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
 
+    columnar = is_columnar_requested(request, output_format)
+    artifact_key = f"{run_id}_{points}_columnar" if columnar else f"{run_id}_{points}"
+
+    if points is not None:
+        if points < 2:
+            raise RequestValidationError('Points must be at least 2, as the minimum and maximum are kept')
+        if artifact := await get_artifact(ArtifactType.MEASUREMENTS, artifact_key):
+            return artifact_json_response(artifact, headers=VARY_ON_FORMAT)
+
     query = """
             SELECT measurements.detail_name, measurements.time, measurements.metric,
                    measurements.value, measurements.unit
             FROM measurements
             WHERE measurements.run_id = %s
+                -- only the partition of the month the run was created in is read
+                AND measurements.created_at = (SELECT created_at FROM runs WHERE id = %s)
             """
 
     # extremely important to order here, cause the charting library in JS cannot do that automatically!
 
     query = f"{query} ORDER BY measurements.metric ASC, measurements.detail_name ASC, measurements.time ASC"
+    batches = AsyncDB().fetch_batches(query, params=(run_id, run_id))
+
+    if points is None:
+        # Streamed, as runs can have millions of measurements
+        if columnar:
+            response = await stream_columnar_response(batches, measurements_encoder(), headers=VARY_ON_FORMAT)
+        else:
+            response = await stream_rows_response(batches, headers=VARY_ON_FORMAT)
+        if response is None:
+            return Response(status_code=204) # No-Content
 
-    data = DB().fetch_all(query, params=(run_id, ))
+        return response
 
-    if data is None or data == []:
+    measurements = await downsample_measurements(batches, points)
+    if not measurements:
         return Response(status_code=204) # No-Content
 
-    return ORJSONResponseObjKeep({'success': True, 'data': data})
+    if columnar:
+        artifact = measurements_encoder(with_interval=True).encode(measurements).decode()
+    else:
+        artifact = orjson.dumps(measurements).decode() # pylint: disable=no-member
+
+    # The phase_stats are built after all measurements are imported. Before that the measurements may still be incomplete
+    if await AsyncDB().fetch_one('SELECT 1 FROM phase_stats WHERE run_id = %s LIMIT 1', params=(run_id, )):
+        await store_artifact(ArtifactType.MEASUREMENTS, artifact_key, artifact)
+
+    return artifact_json_response(artifact, headers=VARY_ON_FORMAT)
+
+TIMELINE_COLUMNS = ['id', 'name', 'created_at', 'metric', 'detail_name', 'phase', 'value', 'unit', 'commit_hash', 'commit_timestamp', 'gmt_hash', 'row_num']
+
+# The runs repeat in every series
+def timeline_encoder():
+    return ColumnarEncoder(TIMELINE_COLUMNS, series_columns=('metric', 'detail_name', 'phase'),
+                           dictionary_columns=('id', 'name', 'created_at', 'unit', 'commit_hash', 'commit_timestamp', 'gmt_hash'))
 
 @app.get('/v1/timeline')
-async def get_timeline_stats(uri: str, machine_id: int, branch: str | None = None, filename: str | None = None, start_date: date | None = None, end_date: date | None = None, metrics: str | None = None, phase: str | None = None, sorting: str | None = None,):
+async def get_timeline_stats(request: Request, uri: str, machine_id: int, branch: str | None = None, filename: str | None = None, start_date: date | None = None, end_date: date | None = None, metrics: str | None = None, phase: str | None = None, sorting: str | None = None, output_format: str | None = Query(None, alias='format')):
     if uri is None or uri.strip() == '':
         raise RequestValidationError('URI is empty')
 
@@ -411,13 +481,16 @@ async def get_timeline_stats(uri: str, machine_id: int, branch: str | None = Non
         raise RequestValidationError('Phase is empty')
 
     query, params = get_timeline_query(uri,filename,machine_id, branch, metrics, phase, start_date=start_date, end_date=end_date, sorting=sorting)
+    batches = AsyncDB().fetch_batches(query, params=params)
 
-    data = DB().fetch_all(query, params=params)
-
-    if data is None or data == []:
+    if is_columnar_requested(request, output_format):
+        response = await stream_columnar_response(batches, timeline_encoder(), headers=VARY_ON_FORMAT)
+    else:
+        response = await stream_rows_response(batches, headers=VARY_ON_FORMAT)
+    if response is None:
         return Response(status_code=204) # No-Content
 
-    return ORJSONResponse({'success': True, 'data': data})
+    return response
 
 @app.get('/v1/badge/timeline')
 async def get_timeline_badge(detail_name: str, uri: str, machine_id: int, branch: str | None = None, filename: str | None = None, metrics: str | None = None):
@@ -427,7 +500,7 @@ async def get_timeline_badge(detail_name: str, uri: str, machine_id: int, branch
     if detail_name is None or detail_name.strip() == '':
         raise RequestValidationError('Detail Name is mandatory')
 
-    if artifact := get_artifact(ArtifactType.BADGE, f"{uri}_{filename}_{machine_id}_{branch}_{metrics}_{detail_name}"):
+    if artifact := await get_artifact(ArtifactType.BADGE, f"{uri}_{filename}_{machine_id}_{branch}_{metrics}_{detail_name}"):
         return Response(content=str(artifact), media_type="image/svg+xml")
 
 
@@ -444,7 +517,7 @@ async def get_timeline_badge(detail_name: str, uri: str, machine_id: int, branch
         FROM trend_data;
     """
 
-    data = DB().fetch_one(query, params=params)
+    data = await AsyncDB().fetch_one(query, params=params)
 
     if data is None or data == [] or data[1] is None: # special check for data[1] as this is aggregate query which always returns result
         return Response(status_code=204) # No-Content
@@ -460,7 +533,7 @@ async def get_timeline_badge(detail_name: str, uri: str, machine_id: int, branch
 
     badge_str = str(badge)
 
-    store_artifact(ArtifactType.BADGE, f"{uri}_{filename}_{machine_id}_{branch}_{metrics}_{detail_name}", badge_str, ex=60*60*12) # 12 hour storage
+    await store_artifact(ArtifactType.BADGE, f"{uri}_{filename}_{machine_id}_{branch}_{metrics}_{detail_name}", badge_str, ex=60*60*12) # 12 hour storage
 
     return Response(content=badge_str, media_type="image/svg+xml")
 
@@ -472,7 +545,7 @@ async def get_badge_single(run_id: str, metric: str = 'ml-estimated'):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
 
-    if artifact := get_artifact(ArtifactType.BADGE, f"{run_id}_{metric}"):
+    if artifact := await get_artifact(ArtifactType.BADGE, f"{run_id}_{metric}"):
         return Response(content=str(artifact), media_type="image/svg+xml")
 
     query = '''
@@ -505,7 +578,7 @@ async def get_badge_single(run_id: str, metric: str = 'ml-estimated'):
         raise RequestValidationError(f"Unknown metric '{metric}' submitted")
 
     params = (run_id, value)
-    data = DB().fetch_one(query, params=params)
+    data = await AsyncDB().fetch_one(query, params=params)
 
     if data is None or data == [] or data[1] is None: # special check for data[1] as this is aggregate query which always returns result
         badge_value = 'No energy data yet'
@@ -521,11 +594,54 @@ async def get_badge_single(run_id: str, metric: str = 'ml-estimated'):
 
     badge_str = str(badge)
 
-    store_artifact(ArtifactType.BADGE, f"{run_id}_{metric}", badge_str)
+    await store_artifact(ArtifactType.BADGE, f"{run_id}_{metric}", badge_str)
 
     return Response(content=badge_str, media_type="image/svg+xml")
 
 
+# Builds the artifacts of a finished run, so that the first visitor of the run does not have to wait for them.
+# Called by the RunJob once the phase_stats are stored. Artifacts of the run that were built before, like a badge
+# without energy data while the run was still going, are replaced. The timeline badges of the repo and machine are
+# invalidated, as their trend now has one more run, and the ones of the branch are built again.
+# This runs many queries, so only the job runner may call it with the shared cluster.warm_token. Without it warming is disabled
+@app.post('/v1/artifacts/warm/{run_id}')
+async def warm_artifacts(run_id: str, authorization: str | None = Header(None)):
+    warm_token = GlobalConfig().config['cluster'].get('warm_token')
+    if not warm_token or authorization is None or not hmac.compare_digest(authorization.encode(), f"Bearer {warm_token}".encode()):
+        return ORJSONResponse({'success': False, 'err': 'Not allowed to warm artifacts'}, status_code=403)
+
+    if run_id is None or not is_valid_uuid(run_id):
+        raise RequestValidationError('Run ID is not a valid UUID or empty')
+
+    run = await AsyncDB().fetch_one('SELECT uri, branch, filename, machine_id FROM runs WHERE id = %s', params=(run_id, ))
+    if run is None or run == []:
+        return Response(status_code=204) # No-Content
+    [uri, branch, filename, machine_id] = run
+
+    await invalidate_artifacts(ArtifactType.STATS, run_id)
+    await invalidate_artifacts(ArtifactType.BADGE, f"{run_id}_*")
+    await invalidate_artifacts(ArtifactType.BADGE, f"{escape_pattern(uri)}_*_{machine_id}_*")
+
+    await get_phase_stats_single(run_id)
+    for metric in ['ml-estimated', 'RAPL', 'AC', 'SCI']:
+        await get_badge_single(run_id, metric)
+
+    # The key metrics, which the timeline shows by default
+    query = """
+        SELECT DISTINCT metric, detail_name
+        FROM phase_stats
+        WHERE
+            run_id = %s
+            AND phase LIKE '%%_[RUNTIME]'
+            AND (metric LIKE '%%_energy_%%' OR metric = 'software_carbon_intensity_global')
+    """
+    timeline_badges = await AsyncDB().fetch_all(query, params=(run_id, ))
+    for [metric, detail_name] in timeline_badges:
+        await get_timeline_badge(detail_name, uri, machine_id, branch=branch, filename=filename, metrics=metric)
+
+    return ORJSONResponse({'success': True, 'data': {'timeline_badges': len(timeline_badges)}})
+
+
 @app.get('/v1/timeline-projects')
 async def get_timeline_projects():
     # Do not get the email jobs as they do not need to be display in the frontend atm
@@ -554,7 +670,7 @@ async def get_timeline_projects():
         LEFT JOIN machines as m ON m.id = p.machine_id
         ORDER BY p.url ASC;
     """
-    data = DB().fetch_all(query)
+    data = await AsyncDB().fetch_all(query)
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -587,7 +703,7 @@ async def get_jobs(machine_id: int | None = None, state: str | None = None):
             {state_condition}
         ORDER BY j.updated_at DESC, j.created_at ASC
     """
-    data = DB().fetch_all(query, params)
+    data = await AsyncDB().fetch_all(query, params)
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -660,9 +776,89 @@ def validate_measurement_data(data):
     # All checks passed
     return True
 
+# Only these values of the processor are needed from the hog measurements. The coalitions are saved as they are
+HOG_FIELDS = {
+    'elapsed_ns': ('elapsed_ns',),
+    'energy_impact_per_s': ('all_tasks', 'energy_impact_per_s'),
+    'combined_power': ('processor', 'combined_power'),
+    'cpu_energy': ('processor', 'cpu_energy'),
+    'gpu_energy': ('processor', 'gpu_energy'),
+    'ane_energy': ('processor', 'ane_energy'),
+    'package_joules': ('processor', 'package_joules'),
+    'cpu_joules': ('processor', 'cpu_joules'),
+    'igpu_watts': ('processor', 'igpu_watts'),
+}
+
+# Calculates the energy columns of hog_measurements for all measurements of a request at once
+def get_hog_cpu_energy(data):
+    apple_silicon = ~numpy.isnan(data['ane_energy'])
+    intel = ~apple_silicon & ~numpy.isnan(data['package_joules'])
+    if not numpy.all(apple_silicon | intel):
+        raise RequestValidationError("input not valid")
+
+    # Missing values are counted as 0
+    values = {field: numpy.nan_to_num(array) for field, array in data.items()}
+
+    cpu_energy_data = {
+        # Intel processors report in joules/ watts and not mJ
+        'combined_energy': numpy.where(apple_silicon, values['combined_power'] * values['elapsed_ns'] / 1_000_000_000.0, values['package_joules'] * 1_000),
+        'cpu_energy': numpy.where(apple_silicon, values['cpu_energy'], values['cpu_joules'] * 1_000),
+        'gpu_energy': numpy.where(apple_silicon, values['gpu_energy'], values['igpu_watts'] * values['elapsed_ns'] / 1_000_000_000.0 * 1_000),
+        'ane_energy': numpy.where(apple_silicon, values['ane_energy'], 0),
+        'energy_impact': values['energy_impact_per_s'] * values['elapsed_ns'] / 1_000_000_000,
+    }
+
+    return {field: numpy.round(array).astype(numpy.int64).tolist() for field, array in cpu_energy_data.items()}
+
+# The columns and binary COPY types of the rows of a hog upload, without the id that store_hog_rows() reserves
+HOG_COLUMNS = {
+    'hog_measurements': (
+        ('time', 'machine_uuid', 'elapsed_ns', 'combined_energy', 'cpu_energy', 'gpu_energy', 'ane_energy', 'energy_impact', 'thermal_pressure', 'settings'),
+        ('int8', 'uuid', 'int8', 'int4', 'int4', 'int4', 'int4', 'int4', 'text', 'jsonb'),
+    ),
+    'hog_coalitions': (
+        ('measurement', 'name', 'cputime_ns', 'cputime_per', 'energy_impact', 'diskio_bytesread', 'diskio_byteswritten', 'intr_wakeups', 'idle_wakeups'),
+        ('int4', 'text', 'int8', 'int4', 'int4', 'int8', 'int8', 'int8', 'int8'),
+    ),
+    'hog_tasks': (
+        ('coalition', 'name', 'cputime_ns', 'cputime_per', 'energy_impact', 'bytes_received', 'bytes_sent', 'diskio_bytesread', 'diskio_byteswritten', 'intr_wakeups', 'idle_wakeups'),
+        ('int4', 'text', 'int8', 'int4', 'int4', 'int8', 'int8', 'int8', 'int8', 'int8', 'int8'),
+    ),
+}
+
+# Stores all rows of a hog upload in one transaction with one COPY per table instead of one INSERT per row.
+# The ids of all rows are reserved from the sequences in one query beforehand, so that the coalitions and tasks
+# can reference their parents. Their first column is the index of the parent row in measurement_rows / coalition_rows
+async def store_hog_rows(measurement_rows, coalition_rows, task_rows):
+    async with AsyncDB().transaction() as cur:
+        await cur.execute("""
+            SELECT
+                ARRAY(SELECT nextval(pg_get_serial_sequence('hog_measurements', 'id')) FROM generate_series(1, %s)),
+                ARRAY(SELECT nextval(pg_get_serial_sequence('hog_coalitions', 'id')) FROM generate_series(1, %s)),
+                ARRAY(SELECT nextval(pg_get_serial_sequence('hog_tasks', 'id')) FROM generate_series(1, %s))
+            """, (len(measurement_rows), len(coalition_rows), len(task_rows)))
+        measurement_ids, coalition_ids, task_ids = await cur.fetchone()
+
+        tables = (
+            ('hog_measurements', (
+                (measurement_id, *row) for measurement_id, row in zip(measurement_ids, measurement_rows))),
+            ('hog_coalitions', (
+                (coalition_id, measurement_ids[row[0]], *row[1:]) for coalition_id, row in zip(coalition_ids, coalition_rows))),
+            ('hog_tasks', (
+                (task_id, coalition_ids[row[0]], *row[1:]) for task_id, row in zip(task_ids, task_rows))),
+        )
+        for table, rows in tables:
+            columns, types = HOG_COLUMNS[table]
+            async with cur.copy(f"COPY {table}(id,{','.join(columns)}) FROM stdin (format binary)") as copy:
+                copy.set_types(('int4', *types))
+                for row in rows:
+                    await copy.write_row(row)
+
 @app.post('/v1/hog/add')
 async def hog_add(measurements: List[HogMeasurement]):
 
+    decoder = PowermetricsDecoder(HOG_FIELDS, capacity=len(measurements))
+    measurements_data = []
     for measurement in measurements:
         decoded_data = base64.b64decode(measurement.data)
         decompressed_data = zlib.decompress(decoded_data)
@@ -687,6 +883,15 @@ async def hog_add(measurements: List[HogMeasurement]):
             print(f"Caught Exception in validate_measurement_data() {exc.__class__.__name__} {exc}")
             raise exc
 
+        decoder.add_sample(measurement_data)
+        measurements_data.append(measurement_data)
+
+    cpu_energy_data = get_hog_cpu_energy(decoder.get_arrays())
+
+    measurement_rows = []
+    coalition_rows = [] # the first column is the index of the parent row until store_hog_rows() reserved the ids
+    task_rows = []
+    for i, (measurement, measurement_data) in enumerate(zip(measurements, measurements_data)):
         coalitions = []
         for coalition in measurement_data['coalitions']:
             if coalition['name'] == 'com.googlecode.iterm2' or \
@@ -704,59 +909,18 @@ async def hog_add(measurements: List[HogMeasurement]):
         del measurement_data['coalitions']
         del measurement.data
 
-        cpu_energy_data = {}
-        energy_impact = round(measurement_data['all_tasks'].get('energy_impact_per_s') * measurement_data['elapsed_ns'] / 1_000_000_000)
-        if 'ane_energy' in measurement_data['processor']:
-            cpu_energy_data = {
-                'combined_energy': round(measurement_data['processor'].get('combined_power', 0) * measurement_data['elapsed_ns'] / 1_000_000_000.0),
-                'cpu_energy': round(measurement_data['processor'].get('cpu_energy', 0)),
-                'gpu_energy': round(measurement_data['processor'].get('gpu_energy', 0)),
-                'ane_energy': round(measurement_data['processor'].get('ane_energy', 0)),
-                'energy_impact': energy_impact,
-            }
-        elif 'package_joules' in measurement_data['processor']:
-            # Intel processors report in joules/ watts and not mJ
-            cpu_energy_data = {
-                'combined_energy': round(measurement_data['processor'].get('package_joules', 0) * 1_000),
-                'cpu_energy': round(measurement_data['processor'].get('cpu_joules', 0) * 1_000),
-                'gpu_energy': round(measurement_data['processor'].get('igpu_watts', 0) * measurement_data['elapsed_ns'] / 1_000_000_000.0 * 1_000),
-                'ane_energy': 0,
-                'energy_impact': energy_impact,
-            }
-        else:
-            raise RequestValidationError("input not valid")
-
-        query = """
-            INSERT INTO
-                hog_measurements (
-                    time,
-                    machine_uuid,
-                    elapsed_ns,
-                    combined_energy,
-                    cpu_energy,
-                    gpu_energy,
-                    ane_energy,
-                    energy_impact,
-                    thermal_pressure,
-                    settings)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-            """
-        params = (
+        measurement_rows.append((
             measurement.time,
-            measurement.machine_uuid,
+            UUID(measurement.machine_uuid),
             measurement_data['elapsed_ns'],
-            cpu_energy_data['combined_energy'],
-            cpu_energy_data['cpu_energy'],
-            cpu_energy_data['gpu_energy'],
-            cpu_energy_data['ane_energy'],
-            cpu_energy_data['energy_impact'],
+            cpu_energy_data['combined_energy'][i],
+            cpu_energy_data['cpu_energy'][i],
+            cpu_energy_data['gpu_energy'][i],
+            cpu_energy_data['ane_energy'][i],
+            cpu_energy_data['energy_impact'][i],
             measurement_data['thermal_pressure'],
-            measurement.settings,
-        )
-
-        measurement_db_id = DB().fetch_one(query=query, params=params)[0]
-
+            orjson.loads(measurement.settings), # pylint: disable=no-member
+        ))
 
         # Save hog_measurements
         for coalition in coalitions:
@@ -771,60 +935,26 @@ async def hog_add(measurements: List[HogMeasurement]):
             c_energy_impact = round((coalition['energy_impact_per_s'] / 1_000_000_000) * measurement_data['elapsed_ns'])
             c_cputime_ns = ((coalition['cputime_ms_per_s'] * 1_000_000)  / 1_000_000_000) * measurement_data['elapsed_ns']
 
-            query = """
-                INSERT INTO
-                    hog_coalitions (
-                        measurement,
-                        name,
-                        cputime_ns,
-                        cputime_per,
-                        energy_impact,
-                        diskio_bytesread,
-                        diskio_byteswritten,
-                        intr_wakeups,
-                        idle_wakeups)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-                """
-            params = (
-                measurement_db_id,
+            coalition_rows.append((
+                len(measurement_rows) - 1,
                 coalition['name'],
-                c_cputime_ns,
+                round(c_cputime_ns), # rounded like the cast of PostgreSQL
                 int(c_cputime_ns / measurement_data['elapsed_ns'] * 100),
                 c_energy_impact,
                 coalition['diskio_bytesread'],
                 coalition['diskio_byteswritten'],
                 coalition['intr_wakeups'],
                 coalition['idle_wakeups'],
-            )
-
-            coaltion_db_id = DB().fetch_one(query=query, params=params)[0]
+            ))
 
             for task in c_tasks:
                 t_energy_impact = round((task['energy_impact_per_s'] / 1_000_000_000) * measurement_data['elapsed_ns'])
                 t_cputime_ns = ((task['cputime_ms_per_s'] * 1_000_000)  / 1_000_000_000) * measurement_data['elapsed_ns']
 
-                query = """
-                    INSERT INTO
-                        hog_tasks (
-                            coalition,
-                            name,
-                            cputime_ns,
-                            cputime_per,
-                            energy_impact,
-                            bytes_received,
-                            bytes_sent,
-                            diskio_bytesread,
-                            diskio_byteswritten,
-                            intr_wakeups,
-                            idle_wakeups)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                    """
-                params = (
-                    coaltion_db_id,
+                task_rows.append((
+                    len(coalition_rows) - 1,
                     task['name'],
-                    t_cputime_ns,
+                    round(t_cputime_ns),
                     int(t_cputime_ns / measurement_data['elapsed_ns'] * 100),
                     t_energy_impact,
                     task.get('bytes_received', 0),
@@ -833,9 +963,9 @@ async def hog_add(measurements: List[HogMeasurement]):
                     task.get('diskio_byteswritten', 0),
                     task.get('intr_wakeups', 0),
                     task.get('idle_wakeups', 0),
-                )
-                DB().fetch_one(query=query, params=params)
+                ))
 
+    await store_hog_rows(measurement_rows, coalition_rows, task_rows)
     return Response(status_code=204) # No-Content
 
 
@@ -853,7 +983,7 @@ async def hog_get_top_processes():
             total_energy_impact DESC
         LIMIT 100;
     """
-    data = DB().fetch_all(query)
+    data = await AsyncDB().fetch_all(query)
 
     if data is None:
         data = []
@@ -862,7 +992,7 @@ async def hog_get_top_processes():
         SELECT COUNT(DISTINCT machine_uuid) FROM hog_measurements;
     """
 
-    machine_count = DB().fetch_one(query)[0]
+    machine_count = (await AsyncDB().fetch_one(query))[0]
 
     return ORJSONResponse({'success': True, 'process_data': data, 'machine_count': machine_count})
 
@@ -890,7 +1020,7 @@ async def hog_get_machine_details(machine_uuid: str):
             time
     """
 
-    data = DB().fetch_all(query, (machine_uuid,))
+    data = await AsyncDB().fetch_all(query, (machine_uuid,))
 
     return ORJSONResponse({'success': True, 'data': data})
 
@@ -946,9 +1076,9 @@ async def hog_get_coalitions_tasks(machine_uuid: str, measurements_id_start: int
 
     """
 
-    coalitions_data = DB().fetch_all(coalitions_query, (measurements_id_start, measurements_id_end, machine_uuid))
+    coalitions_data = await AsyncDB().fetch_all(coalitions_query, (measurements_id_start, measurements_id_end, machine_uuid))
 
-    energy_data = DB().fetch_one(measurements_query, (measurements_id_start, measurements_id_end, machine_uuid))
+    energy_data = await AsyncDB().fetch_one(measurements_query, (measurements_id_start, measurements_id_end, machine_uuid))
 
     return ORJSONResponse({'success': True, 'data': coalitions_data, 'energy_data': energy_data})
 
@@ -1015,8 +1145,8 @@ async def hog_get_task_details(machine_uuid: str, measurements_id_start: int, me
         LIMIT 100;
     """
 
-    tasks_data = DB().fetch_all(tasks_query, (coalition_name, measurements_id_start,measurements_id_end, machine_uuid))
-    coalitions_data = DB().fetch_one(coalitions_query, (coalition_name, measurements_id_start, measurements_id_end, machine_uuid))
+    tasks_data = await AsyncDB().fetch_all(tasks_query, (coalition_name, measurements_id_start,measurements_id_end, machine_uuid))
+    coalitions_data = await AsyncDB().fetch_one(coalitions_query, (coalition_name, measurements_id_start, measurements_id_end, machine_uuid))
 
     return ORJSONResponse({'success': True, 'tasks_data': tasks_data, 'coalitions_data': coalitions_data})
 
@@ -1057,7 +1187,7 @@ async def software_add(software: Software):
     if software.filename is None or software.filename.strip() == '':
         software.filename = 'usage_scenario.yml'
 
-    if not DB().fetch_one('SELECT id FROM machines WHERE id=%s AND available=TRUE', params=(software.machine_id,)):
+    if not await AsyncDB().fetch_one('SELECT id FROM machines WHERE id=%s AND available=TRUE', params=(software.machine_id,)):
         raise RequestValidationError('Machine does not exist')
 
 
@@ -1066,26 +1196,27 @@ async def software_add(software: Software):
 
     # notify admin of new add
     if notification_email := GlobalConfig().config['admin']['notification_email']:
-        Job.insert('email', name='New run added from Web Interface', message=str(software), email=notification_email)
+        await run_in_threadpool(Job.insert, 'email', name='New run added from Web Interface', message=str(software), email=notification_email)
 
 
     if software.schedule_mode in ['time', 'commit']:
-        TimelineProject.insert(software.name, software.url, software.branch, software.filename, software.machine_id, software.schedule_mode)
+        await run_in_threadpool(TimelineProject.insert, software.name, software.url, software.branch, software.filename, software.machine_id, software.schedule_mode)
 
     # even for timeline projects we do at least one run
     amount = 10 if software.schedule_mode == 'variance' else 1
     for _ in range(0,amount):
-        Job.insert('run', name=software.name, url=software.url, email=software.email, branch=software.branch, filename=software.filename, machine_id=software.machine_id)
+        await run_in_threadpool(Job.insert, 'run', name=software.name, url=software.url, email=software.email, branch=software.branch, filename=software.filename, machine_id=software.machine_id)
 
     return ORJSONResponse({'success': True}, status_code=202)
 
 
 @app.get('/v1/run/{run_id}')
+@cache_finished_run
 async def get_run(run_id: str):
     if run_id is None or not is_valid_uuid(run_id):
         raise RequestValidationError('Run ID is not a valid UUID or empty')
 
-    data = get_run_info(run_id)
+    data = await get_run_info(run_id)
 
     if data is None or data == []:
         return Response(status_code=204) # No-Content
@@ -1094,6 +1225,20 @@ async def get_run(run_id: str):
 
     return ORJSONResponseObjKeep({'success': True, 'data': data})
 
+# Statistics of the connection pools of the API worker that serves the request. Every worker has its own pools
+@app.get('/v1/diagnostics/db')
+async def get_db_diagnostics():
+    pools = [AsyncDB().get_stats()]
+    if hasattr(DB, 'instance'): # the synchronous pool only exists after a library call in the threadpool used it
+        pools.append(DB().get_stats())
+
+    return ORJSONResponse({'success': True, 'data': pools})
+
+# Hits and misses of the artifact cache of this worker. Every API worker has its own local tier
+@app.get('/v1/diagnostics/cache')
+async def get_cache_diagnostics():
+    return ORJSONResponse({'success': True, 'data': ArtifactCache().get_stats()})
+
 @app.get('/v1/optimizations/{run_id}')
 async def get_optimizations(run_id: str):
     if run_id is None or not is_valid_uuid(run_id):
@@ -1105,7 +1250,7 @@ async def get_optimizations(run_id: str):
             WHERE optimizations.run_id = %s
             """
 
-    data = DB().fetch_all(query, params=(run_id, ))
+    data = await AsyncDB().fetch_all(query, params=(run_id, ))
 
     if data is None or data == []:
         return Response(status_code=204) # No-Content
@@ -1124,14 +1269,14 @@ async def diff(ids: str):
     if len(ids) != 2:
         raise RequestValidationError('Run IDs != 2. Only exactly 2 Run IDs can be diffed.')
 
-    if artifact := get_artifact(ArtifactType.DIFF, str(ids)):
+    if artifact := await get_artifact(ArtifactType.DIFF, str(ids)):
         return ORJSONResponse({'success': True, 'data': artifact})
 
-    a = get_diffable_row(ids[0])
-    b = get_diffable_row(ids[1])
+    a = await run_in_threadpool(get_diffable_row, ids[0])
+    b = await run_in_threadpool(get_diffable_row, ids[1])
     diff_runs = diff_rows(a,b)
 
-    store_artifact(ArtifactType.DIFF, str(ids), diff_runs)
+    await store_artifact(ArtifactType.DIFF, str(ids), diff_runs)
 
     return ORJSONResponse({'success': True, 'data': diff_runs})
 
@@ -1218,7 +1363,7 @@ async def post_ci_measurement_add(request: Request, measurement: CI_Measurement)
             measurement.commit_hash, measurement.duration, measurement.cpu_util_avg, measurement.workflow_name,
             measurement.lat, measurement.lon, measurement.city, measurement.co2i, measurement.co2eq)
 
-    DB().query(query=query, params=params)
+    await AsyncDB().query(query=query, params=params)
 
     # If one of these is specified we add the data to the CarbonDB
     if measurement.cb_company_uuid != '' or measurement.cb_project_uuid != '' or measurement.cb_machine_uuid != '':
@@ -1243,12 +1388,20 @@ async def post_ci_measurement_add(request: Request, measurement: CI_Measurement)
         }
 
         # If there is an error the function will raise an Error
-        carbondb_add(client_ip, [energydata])
+        await carbondb_add(client_ip, [energydata])
 
     return ORJSONResponse({'success': True}, status_code=201)
 
+CI_MEASUREMENTS_COLUMNS = ['energy_value', 'energy_unit', 'run_id', 'created_at', 'label', 'cpu', 'commit_hash', 'duration', 'source', 'cpu_util_avg',
+                           'workflow_name', 'lat', 'lon', 'city', 'co2i', 'co2eq']
+
+# A run only has a few steps, so all rows are one series and the strings are shared through the dictionaries
+def ci_measurements_encoder():
+    return ColumnarEncoder(CI_MEASUREMENTS_COLUMNS,
+                           dictionary_columns=('energy_unit', 'run_id', 'label', 'cpu', 'commit_hash', 'source', 'workflow_name', 'city'))
+
 @app.get('/v1/ci/measurements')
-async def get_ci_measurements(repo: str, branch: str, workflow: str, start_date: date, end_date: date):
+async def get_ci_measurements(request: Request, repo: str, branch: str, workflow: str, start_date: date, end_date: date, output_format: str | None = Query(None, alias='format')):
 
     query = """
         SELECT energy_value, energy_unit, run_id, created_at, label, cpu, commit_hash, duration, source, cpu_util_avg,
@@ -1266,12 +1419,17 @@ async def get_ci_measurements(repo: str, branch: str, workflow: str, start_date:
         ORDER BY run_id ASC, created_at ASC
     """
     params = (repo, branch, workflow, str(start_date), str(end_date))
-    data = DB().fetch_all(query, params=params)
 
-    if data is None or data == []:
+    batches = AsyncDB().fetch_batches(query, params=params)
+
+    if is_columnar_requested(request, output_format):
+        response = await stream_columnar_response(batches, ci_measurements_encoder(), headers=VARY_ON_FORMAT)
+    else:
+        response = await stream_rows_response(batches, headers=VARY_ON_FORMAT)
+    if response is None:
         return Response(status_code=204)  # No-Content
 
-    return ORJSONResponse({'success': True, 'data': data})
+    return response
 
 @app.get('/v1/ci/repositories')
 async def get_ci_repositories(repo: str | None = None, sort_by: str = 'name'):
@@ -1294,7 +1452,7 @@ async def get_ci_repositories(repo: str | None = None, sort_by: str = 'name'):
     else:
         query = f"{query} ORDER BY repo ASC"
 
-    data = DB().fetch_all(query, params=tuple(params))
+    data = await AsyncDB().fetch_all(query, params=tuple(params))
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -1326,7 +1484,7 @@ async def get_ci_runs(repo: str, sort_by: str = 'name'):
     else:
         query = f"{query} ORDER BY repo ASC"
 
-    data = DB().fetch_all(query, params=tuple(params))
+    data = await AsyncDB().fetch_all(query, params=tuple(params))
     if data is None or data == []:
         return Response(status_code=204) # No-Content
 
@@ -1344,7 +1502,7 @@ async def get_ci_badge_get(repo: str, branch: str, workflow:str):
     """
 
     params = (repo, branch, workflow)
-    data = DB().fetch_one(query, params=params)
+    data = await AsyncDB().fetch_one(query, params=params)
 
     if data is None or data == [] or data[1] is None: # special check for data[1] as this is aggregate query which always returns result
         return Response(status_code=204) # No-Content
@@ -1388,7 +1546,7 @@ async def add_carbondb(request: Request, energydatas: List[EnergyData]):
     else:
         client_ip = request.client.host
 
-    carbondb_add(client_ip, energydatas)
+    await carbondb_add(client_ip, energydatas)
 
     return Response(status_code=204)
 
@@ -1411,7 +1569,7 @@ async def carbondb_get_machine_details(machine_uuid: str):
         ;
     """
 
-    data = DB().fetch_all(query, (machine_uuid,))
+    data = await AsyncDB().fetch_all(query, (machine_uuid,))
 
     return ORJSONResponse({'success': True, 'data': data})
 
@@ -1440,7 +1598,7 @@ async def carbondb_get_company_project_details(cptype: str, uuid: str):
             machine
         ;
     """
-    data = DB().fetch_all(query, (uuid,))
+    data = await AsyncDB().fetch_all(query, (uuid,))
 
     return ORJSONResponse({'success': True, 'data': data})
 
@@ -1,7 +1,13 @@
 import json
+import asyncio
 
 from api import api_helpers
 
+async def get_phase_stats_object(run_ids):
+    case = await api_helpers.determine_comparison_case(run_ids)
+    phase_stats = await api_helpers.get_phase_stats(run_ids)
+    stats = api_helpers.get_phase_stats_object(phase_stats, case)
+    return api_helpers.add_phase_stats_statistics(stats)
 
 if __name__ == '__main__':
     import argparse
@@ -14,9 +20,6 @@ if __name__ == '__main__':
 
     ids = args.ids.split(',')
 
-    case = api_helpers.determine_comparison_case(ids)
-    phase_stats = api_helpers.get_phase_stats(ids)
-    phase_stats_object = api_helpers.get_phase_stats_object(phase_stats, case)
-    phase_stats_object = api_helpers.add_phase_stats_statistics(phase_stats_object)
+    phase_stats_object = asyncio.run(get_phase_stats_object(ids))
 
     print(json.dumps(phase_stats_object, indent=4))
@@ -76,18 +76,20 @@ CREATE TRIGGER runs_moddatetime
     EXECUTE PROCEDURE moddatetime (updated_at);
 
 
+-- Partitioned by month and every month by run_id. created_at is the one of the run and the partitions are created on import, see lib/metric_importer.py
 CREATE TABLE measurements (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     run_id uuid NOT NULL REFERENCES runs(id) ON DELETE CASCADE ON UPDATE CASCADE ,
     detail_name text NOT NULL,
     metric text NOT NULL,
     value bigint NOT NULL,
     unit text NOT NULL,
     time bigint NOT NULL,
-    created_at timestamp with time zone DEFAULT now(),
-    updated_at timestamp with time zone
-);
-CREATE UNIQUE INDEX measurements_get ON measurements(run_id ,metric ,detail_name ,time );
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    updated_at timestamp with time zone,
+    PRIMARY KEY (id, created_at, run_id)
+) PARTITION BY RANGE (created_at);
+CREATE UNIQUE INDEX measurements_get ON measurements(run_id ,metric ,detail_name ,time, created_at );
 CREATE INDEX measurements_build_and_store_phase_stats ON measurements(run_id, metric, unit, detail_name);
 CREATE INDEX measurements_build_phases ON measurements(metric, unit, detail_name);
 CREATE TRIGGER measurements_moddatetime
@@ -135,6 +137,7 @@ CREATE TABLE phase_stats (
     max_value bigint,
     min_value bigint,
     unit text NOT NULL,
+    statistics jsonb,
     created_at timestamp with time zone DEFAULT now(),
     updated_at timestamp with time zone
 );
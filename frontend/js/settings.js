@@ -11,6 +11,10 @@ var fetch_time_series = localStorage.getItem('fetch_time_series');
 if(fetch_time_series == 'true') fetch_time_series = true;
 else fetch_time_series = false;
 
+var full_time_series_resolution = localStorage.getItem('full_time_series_resolution');
+if(full_time_series_resolution == 'true') full_time_series_resolution = true;
+else full_time_series_resolution = false;
+
 let toggleWatts = () => {
     localStorage.setItem('display_in_watts', !display_in_watts);
     window.location.reload();
@@ -26,6 +30,11 @@ let toggleTimeSeries = () => {
     window.location.reload();
 }
 
+let toggleTimeSeriesResolution = () => {
+    localStorage.setItem('full_time_series_resolution', !full_time_series_resolution);
+    window.location.reload();
+}
+
 
 (() => {
 
@@ -41,6 +50,9 @@ let toggleTimeSeries = () => {
       if(fetch_time_series) $("#fetch-time-series-display").text("Currently fetching time series by default");
       else $("#fetch-time-series-display").text("Currently not fetching time series by default");
 
+      if(full_time_series_resolution) $("#time-series-resolution-display").text("Currently fetching all samples of the time series");
+      else $("#time-series-resolution-display").text("Currently fetching downsampled time series");
+
 
     });
 
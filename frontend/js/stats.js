@@ -72,6 +72,9 @@ class CO2Tangible extends HTMLElement {
 
 customElements.define('co2-tangible', CO2Tangible);
 
+// Samples per series that the API downsamples the time series to. A chart cannot show many more at its width
+const TIME_SERIES_POINTS = 2000;
+
 const fillRunData = (run_data, key = null) => {
 
 
@@ -184,11 +187,14 @@ const getTimelineMetrics = (measurements_data, start_measurement, end_measuremen
                 }
             }
 
+            // downsampled series carry the interval to the sample before in the full series, as the one before here might be further away
+            const interval = (el[5] != undefined) ? el[5] / 1000000 : time_after-time_before;
+
             if(display_in_watts && metrics[metric_name].unit == 'J') {
-                value = value/(time_after-time_before); // convert Joules to Watts by dividing through the time difference of two measurements
+                value = value/interval; // convert Joules to Watts by dividing through the time difference of two measurements
                 metrics[metric_name].converted_unit = 'W';
             } else if(!display_in_watts && metrics[metric_name].unit == 'W') {
-                value = value*(time_after-time_before); // convert Joules to Watts by dividing through the time difference of two measurements
+                value = value*interval; // convert Joules to Watts by dividing through the time difference of two measurements
                 metrics[metric_name].converted_unit = 'J';
             }
             time_before = time_after;
@@ -423,7 +429,9 @@ async function getTimeSeries() {
     }
 
     try {
-        measurement_data = await makeAPICall('/v1/measurements/single/' + url_params.get('id'))
+        // Unless the full resolution is set, every series is downsampled on the server to what a chart can show
+        const points = (localStorage.getItem('full_time_series_resolution') === 'true') ? '' : `?points=${TIME_SERIES_POINTS}`;
+        measurement_data = await makeAPICall('/v1/measurements/single/' + url_params.get('id') + points)
     } catch (err) {
         showNotification('Could not get stats data from API', err);
     }
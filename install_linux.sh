@@ -103,6 +103,7 @@ sed -i -e "s|PLEASE_CHANGE_THIS|$db_pw|" config.yml
 print_message "Updating project with provided URLs ..."
 sed -i -e "s|__API_URL__|$api_url|" config.yml
 sed -i -e "s|__METRICS_URL__|$metrics_url|" config.yml
+sed -i -e "s|^  warm_token:$|  warm_token: $(generate_random_password 32)|" config.yml
 cp docker/nginx/api.conf.example docker/nginx/api.conf
 host_api_url=`echo $api_url | sed -E 's/^\s*.*:\/\///g'`
 host_api_url=${host_api_url%:*}
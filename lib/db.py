@@ -1,9 +1,108 @@
 #pylint: disable=consider-using-enumerate
 
-from psycopg_pool import ConnectionPool
+import bisect
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
 from lib.global_config import GlobalConfig
+
+# Used for every role and setting that is not in postgresql.pool of the config.yml
+POOL_DEFAULTS = {
+    'api': {'min_size': 1, 'max_size': 8}, # concurrent queries per API worker
+    'runner': {'min_size': 1, 'max_size': 4}, # one connection per import worker of the runner
+    'client': {'min_size': 1, 'max_size': 4}, # the client runs the runner in its process
+    'default': {'min_size': 1, 'max_size': 4},
+}
+POOL_SETTINGS = ('min_size', 'max_size', 'timeout', 'max_idle', 'max_lifetime', 'max_waiting')
+
+def get_connection_string():
+    config = GlobalConfig().config
+
+    # force domain socket connection by not supplying host
+    # pylint: disable=consider-using-f-string
+    return "postgresql://%s:%s@%s:%s/%s" % (
+        config['postgresql']['user'],
+        config['postgresql']['password'],
+        config['postgresql']['host'],
+        config['postgresql']['port'],
+        config['postgresql']['dbname'],
+    )
+
+def get_pool_config(role):
+    pool_config = dict(POOL_DEFAULTS.get(role, POOL_DEFAULTS['default']))
+    configured = (GlobalConfig().config['postgresql'].get('pool') or {}).get(role) or {}
+
+    for key, value in configured.items():
+        if key not in POOL_SETTINGS:
+            raise ValueError(f"Unknown setting '{key}' for the {role} pool in postgresql.pool. Allowed are: {POOL_SETTINGS}")
+        pool_config[key] = value
+
+    return pool_config
+
+class LatencyHistogram:
+    '''
+        Counts how long it took to check out a connection from the pool in buckets of milliseconds.
+        The checkouts of the API run in threads and in the event loop, so the counts are guarded by a lock
+    '''
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BUCKETS_MS) + 1) # the last bucket counts everything above
+        self._sum_ms = 0
+        self._max_ms = 0
+
+    def add(self, seconds):
+        ms = seconds * 1_000
+        with self._lock:
+            self._counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+            self._sum_ms += ms
+            self._max_ms = max(self._max_ms, ms)
+
+    def get(self):
+        with self._lock:
+            count = sum(self._counts)
+            return {
+                'count': count,
+                'avg_ms': round(self._sum_ms / count, 3) if count else None,
+                'max_ms': round(self._max_ms, 3),
+                # cumulative counts like Prometheus, so that every bucket reads as "at most this long"
+                'buckets': {
+                    **{f"le_{bucket}": sum(self._counts[:i + 1]) for i, bucket in enumerate(self.BUCKETS_MS)},
+                    'le_inf': count,
+                },
+            }
+
+def get_pool_stats(role, pool, checkout_latency):
+    stats = pool.get_stats() # counters that did not happen yet are missing
+    return {
+        'role': role,
+        'pid': os.getpid(),
+        'min_size': stats.get('pool_min'),
+        'max_size': stats.get('pool_max'),
+        'connections': stats.get('pool_size', 0),
+        'idle': stats.get('pool_available', 0),
+        'active': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'requests_queued': stats.get('requests_queued', 0),
+        'requests_wait_ms': stats.get('requests_wait_ms', 0),
+        'requests_errors': stats.get('requests_errors', 0),
+        'usage_ms': stats.get('usage_ms', 0),
+        'connections_errors': stats.get('connections_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+        'checkout_latency': checkout_latency.get(),
+    }
+
 class DB:
+    # The pool is configured by postgresql.pool.<role> in the config.yml. Entry points set their role before the first query
+    role = 'default'
 
     def __new__(cls):
         if not hasattr(cls, 'instance'):
@@ -13,32 +112,34 @@ class DB:
     def __init__(self):
 
         if not hasattr(self, '_pool'):
-            config = GlobalConfig().config
-
             # Important note: We are not using cursor_factory = psycopg2.extras.RealDictCursor
             # as an argument, because this would increase the size of a single API request
             # from 50 kB to 100kB.
             # Users are required to use the mask of the API requests to read the data.
-            # force domain socket connection by not supplying host
-            # pylint: disable=consider-using-f-string
 
+            self._checkout_latency = LatencyHistogram()
             self._pool = ConnectionPool(
-                "postgresql://%s:%s@%s:%s/%s" % (
-                    config['postgresql']['user'],
-                    config['postgresql']['password'],
-                    config['postgresql']['host'],
-                    config['postgresql']['port'],
-                    config['postgresql']['dbname'],
-                ),
-                min_size=1,
-                max_size=2,
+                get_connection_string(),
+                **get_pool_config(self.role),
+                name=self.role,
                 open=True
             )
 
+    @contextmanager
+    def _connection(self):
+        start = time.perf_counter()
+        with self._pool.connection() as conn:
+            self._checkout_latency.add(time.perf_counter() - start)
+            yield conn
+
+    # Wait time, active and idle connections and the checkout latency histogram of the pool of this process
+    def get_stats(self):
+        return get_pool_stats(self.role, self._pool, self._checkout_latency)
+
     def __query(self, query, params=None, return_type=None, row_factory=None):
         ret = False
 
-        with self._pool.connection() as conn:
+        with self._connection() as conn:
             conn.autocommit = False # should be default, but we are explicit
             cur = conn.cursor(row_factory=row_factory) # None is actually the default cursor factory
             if isinstance(query, list) and isinstance(params, list) and len(query) == len(params):
@@ -66,14 +167,179 @@ class DB:
     def fetch_all(self, query, params=None, row_factory=None):
         return self.__query(query, params=params, return_type='all', row_factory=row_factory)
 
+    # Yields the rows in lists of at most batch_size from a named server side cursor, so that only one batch
+    # is in memory instead of the whole result. The connection is checked out until the generator is exhausted or closed
+    def fetch_batches(self, query, params=None, batch_size=10_000, row_factory=None):
+        with self._connection() as conn:
+            conn.autocommit = False # named cursors only exist within a transaction
+            with conn.cursor(name=f"batches_{uuid.uuid4().hex}", row_factory=row_factory) as cur:
+                cur.itersize = batch_size
+                cur.execute(query, params)
+                while rows := cur.fetchmany(batch_size):
+                    yield rows
+            conn.commit()
+
+    # Yields a cursor for several statements and COPYs that must be stored together, e.g. rows that reference each other.
+    # Everything is committed at the end of the block and rolled back if it raises
+    @contextmanager
+    def transaction(self):
+        with self._connection() as conn:
+            conn.autocommit = False # is implicit default
+            with conn.transaction(), conn.cursor() as cur:
+                yield cur
+
     def copy_from(self, file, table, columns, sep=','):
-        with self._pool.connection() as conn:
+        with self._connection() as conn:
             conn.autocommit = False # is implicit default
             cur = conn.cursor()
             statement = f"COPY {table}({','.join(list(columns))}) FROM stdin (format csv, delimiter '{sep}')"
             with cur.copy(statement) as copy:
                 copy.write(file.read())
 
+    # Binary COPY with typed columns. Postgres does not have to parse the values back from text.
+    # data can be a DataFrame, a dict of equally long column sequences or an iterable of row tuples.
+    # The values must already have the python type matching the postgres type, e.g. uuid.UUID for uuid
+    # before_query is executed in the same transaction before the COPY, e.g. to replace the existing rows
+    def copy_binary(self, table, columns, types, data, before_query=None, before_params=None):
+        if hasattr(data, 'itertuples'): # DataFrame
+            data = {column: data[column].tolist() for column in columns}
+        if isinstance(data, dict):
+            data = zip(*(data[column] for column in columns))
+
+        with self._connection() as conn:
+            conn.autocommit = False # is implicit default
+            cur = conn.cursor()
+            if before_query is not None:
+                cur.execute(before_query, before_params)
+            statement = f"COPY {table}({','.join(list(columns))}) FROM stdin (format binary)"
+            with cur.copy(statement) as copy:
+                copy.set_types(types)
+                for row in data:
+                    copy.write_row(row)
+
+class AsyncDB:
+    '''
+        Async counterpart of DB with the same methods for the API.
+        The routes of the API are async, so a query with DB would block the event loop and a worker
+        could only serve one request at a time. With AsyncDB concurrent requests of a worker
+        run their queries in parallel on the connections of the pool.
+
+        The pool is opened on the first query, as it must be opened within the event loop of the worker.
+    '''
+
+    role = 'api'
+
+    def __new__(cls):
+        if not hasattr(cls, 'instance'):
+            cls.instance = super(AsyncDB, cls).__new__(cls)
+        return cls.instance
+
+    def __init__(self):
+
+        if not hasattr(self, '_pool'):
+            self._checkout_latency = LatencyHistogram()
+            self._pool = AsyncConnectionPool(
+                get_connection_string(),
+                **get_pool_config(self.role),
+                name=self.role,
+                open=False
+            )
+
+    async def open(self):
+        if self._pool.closed:
+            await self._pool.open()
+
+    async def close(self):
+        await self._pool.close()
+
+    @asynccontextmanager
+    async def _connection(self):
+        await self.open()
+        start = time.perf_counter()
+        async with self._pool.connection() as conn:
+            self._checkout_latency.add(time.perf_counter() - start)
+            yield conn
+
+    # See DB.get_stats
+    def get_stats(self):
+        return get_pool_stats(self.role, self._pool, self._checkout_latency)
+
+    async def __query(self, query, params=None, return_type=None, row_factory=None):
+        ret = False
+
+        async with self._connection() as conn:
+            await conn.set_autocommit(False) # should be default, but we are explicit
+            cur = conn.cursor(row_factory=row_factory) # None is actually the default cursor factory
+            if isinstance(query, list) and isinstance(params, list) and len(query) == len(params):
+                for i in range(len(query)):
+                    # In error case the context manager will ROLLBACK the whole transaction
+                    await cur.execute(query[i], params[i])
+            else:
+                await cur.execute(query, params)
+            await conn.commit()
+            if return_type == 'one':
+                ret = await cur.fetchone()
+            elif return_type == 'all':
+                ret = await cur.fetchall()
+            else:
+                ret = True
+
+        return ret
+
+    async def query(self, query, params=None, row_factory=None):
+        return await self.__query(query, params=params, return_type=None, row_factory=row_factory)
+
+    async def fetch_one(self, query, params=None, row_factory=None):
+        return await self.__query(query, params=params, return_type='one', row_factory=row_factory)
+
+    async def fetch_all(self, query, params=None, row_factory=None):
+        return await self.__query(query, params=params, return_type='all', row_factory=row_factory)
+
+    # See DB.fetch_batches
+    async def fetch_batches(self, query, params=None, batch_size=10_000, row_factory=None):
+        async with self._connection() as conn:
+            await conn.set_autocommit(False) # named cursors only exist within a transaction
+            async with conn.cursor(name=f"batches_{uuid.uuid4().hex}", row_factory=row_factory) as cur:
+                cur.itersize = batch_size
+                await cur.execute(query, params)
+                while rows := await cur.fetchmany(batch_size):
+                    yield rows
+            await conn.commit()
+
+    # See DB.transaction
+    @asynccontextmanager
+    async def transaction(self):
+        async with self._connection() as conn:
+            await conn.set_autocommit(False) # is implicit default
+            async with conn.transaction(), conn.cursor() as cur:
+                yield cur
+
+    async def copy_from(self, file, table, columns, sep=','):
+        async with self._connection() as conn:
+            await conn.set_autocommit(False) # is implicit default
+            cur = conn.cursor()
+            statement = f"COPY {table}({','.join(list(columns))}) FROM stdin (format csv, delimiter '{sep}')"
+            async with cur.copy(statement) as copy:
+                await copy.write(file.read())
+
+    # See DB.copy_binary
+    async def copy_binary(self, table, columns, types, data, before_query=None, before_params=None):
+        if hasattr(data, 'itertuples'): # DataFrame
+            data = {column: data[column].tolist() for column in columns}
+        if isinstance(data, dict):
+            data = zip(*(data[column] for column in columns))
+
+        async with self._connection() as conn:
+            await conn.set_autocommit(False) # is implicit default
+            cur = conn.cursor()
+            if before_query is not None:
+                await cur.execute(before_query, before_params)
+            statement = f"COPY {table}({','.join(list(columns))}) FROM stdin (format binary)"
+            async with cur.copy(statement) as copy:
+                copy.set_types(types)
+                for row in data:
+                    await copy.write_row(row)
+
 
 if __name__ == '__main__':
     DB()
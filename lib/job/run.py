@@ -5,6 +5,8 @@ import faulthandler
 faulthandler.enable()  # will catch segfaults and write to stderr
 
 import os
+import asyncio
+import aiohttp
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -13,11 +15,29 @@ from lib.global_config import GlobalConfig
 from lib.db import DB
 from lib.terminal_colors import TerminalColors
 from lib.system_checks import ConfigurationCheckError
+from lib import error_helpers
 from tools.phase_stats import build_and_store_phase_stats
 from runner import Runner
 import optimization_providers.base
 
 
+# The API builds the artifacts, as it holds the caches they are stored in. It only accepts the shared cluster.warm_token
+# The run itself is complete at this point, so a failure is only logged
+def warm_artifacts(run_id):
+    config = GlobalConfig().config['cluster']
+    if not config.get('warm_token'):
+        return
+
+    async def post_warm():
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+            async with session.post(f"{config['api_url']}/v1/artifacts/warm/{run_id}", headers={'Authorization': f"Bearer {config['warm_token']}"}) as response:
+                response.raise_for_status()
+
+    try:
+        asyncio.run(post_warm())
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        error_helpers.log_error('Warming the artifacts of the run failed', run_id=run_id, exception=exc)
+
 class RunJob(Job):
 
     def check_job_running(self):
@@ -42,7 +62,8 @@ class RunJob(Job):
         try:
             # Start main code. Only URL is allowed for cron jobs
             self._run_id = runner.run()
-            build_and_store_phase_stats(self._run_id, runner._sci)
+            build_and_store_phase_stats(self._run_id, runner._sci, runner._phase_stats_collector)
+            warm_artifacts(self._run_id)
 
             # We need to import this here as we need the correct config file
             print(TerminalColors.HEADER, '\nImporting optimization reporters ...', TerminalColors.ENDC)
@@ -0,0 +1,181 @@
+import datetime
+import re
+import threading
+import uuid
+import pandas
+
+from lib.db import DB
+
+MEASUREMENTS_COLUMNS = ('run_id', 'detail_name', 'metric', 'value', 'unit', 'time', 'created_at')
+MEASUREMENTS_TYPES = ('uuid', 'text', 'text', 'bigint', 'text', 'bigint', 'timestamptz')
+
+# measurements is partitioned by the month of created_at (UTC) and every month by the hash of the run_id.
+# created_at of the measurements is always the created_at of their run, so a run is in exactly one run_id partition
+# of one month, which queries for a run select with created_at = (SELECT created_at FROM runs WHERE id = ...).
+# Old months can be detached as a whole, see tools/prune_db.py
+MEASUREMENTS_RUN_PARTITIONS = 4
+_created_partitions = set() # months whose partitions exist, so that every process only checks them once
+_runs_created_at = {} # run_id => created_at, as a run is imported in many chunks
+
+def get_next_month(month):
+    return datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+# Returns {month: partition name} of all months that have a partition
+def get_measurements_partitions():
+    partitions = DB().fetch_all("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'measurements'::regclass
+        """)
+    return {
+        datetime.date(int(match[1]), int(match[2]), 1): name
+        for (name, ) in partitions if (match := re.fullmatch(r'measurements_(\d{4})_(\d{2})', name))
+    }
+
+# Creates the partition of the month with its run_id partitions if it does not exist yet.
+# The lock serializes the runners and import workers that get here at the same time
+def create_measurements_partition(month):
+    name = f"measurements_{month:%Y_%m}"
+    with DB().transaction() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('measurements_partitions'))")
+        cur.execute('SELECT to_regclass(%s)', (name, ))
+        if cur.fetchone()[0] is not None:
+            return
+
+        cur.execute(f"""
+            CREATE TABLE {name} PARTITION OF measurements
+            FOR VALUES FROM ('{month} 00:00:00+00') TO ('{get_next_month(month)} 00:00:00+00')
+            PARTITION BY HASH (run_id)
+            """)
+        for remainder in range(MEASUREMENTS_RUN_PARTITIONS):
+            cur.execute(f"""
+                CREATE TABLE {name}_{remainder} PARTITION OF {name}
+                FOR VALUES WITH (MODULUS {MEASUREMENTS_RUN_PARTITIONS}, REMAINDER {remainder})
+                """)
+
+def ensure_measurements_partition(created_at):
+    month = created_at.astimezone(datetime.timezone.utc).date().replace(day=1)
+    if month not in _created_partitions:
+        create_measurements_partition(month)
+        _created_partitions.add(month)
+
+def get_run_created_at(run_id):
+    if run_id not in _runs_created_at:
+        run = DB().fetch_one('SELECT created_at FROM runs WHERE id = %s', params=(run_id, ))
+        if run is None:
+            raise RuntimeError(f"Cannot import measurements of run {run_id}, as it does not exist")
+        _runs_created_at[run_id] = run[0]
+    return _runs_created_at[run_id]
+
+def import_measurements(df):
+    run_ids = {run_id: uuid.UUID(str(run_id)) for run_id in df['run_id'].unique()}
+    created_at = {run_uuid: get_run_created_at(run_uuid) for run_uuid in run_ids.values()}
+    for run_created_at in created_at.values():
+        ensure_measurements_partition(run_created_at)
+
+    run_uuids = df['run_id'].map(run_ids).tolist()
+    data = {
+        'run_id': run_uuids,
+        'detail_name': df['detail_name'].astype(str).tolist(), # some providers use numeric ids like the package_id
+        'metric': df['metric'].tolist(),
+        'value': df['value'].tolist(),
+        'unit': df['unit'].tolist(),
+        'time': df['time'].tolist(),
+        'created_at': [created_at[run_uuid] for run_uuid in run_uuids],
+    }
+    DB().copy_binary(table='measurements', columns=MEASUREMENTS_COLUMNS, types=MEASUREMENTS_TYPES, data=data)
+
+# Parses and imports the log of the metric provider chunk by chunk, so that only one chunk is in memory at a time.
+# Only if a derived provider needs the frames of this provider they are also kept in the frame_cache
+def import_metric_provider(metric_provider, run_id, containers, chunk_size=4_194_304, frame_cache=None):
+    rows = 0
+    for df in metric_provider.iter_metrics(run_id, containers, chunk_size=chunk_size):
+        import_measurements(df)
+        if frame_cache is not None:
+            frame_cache.add(metric_provider._metric_name, df)
+        rows += df.shape[0]
+    return rows
+
+class MetricFrameCache:
+    '''
+        Keeps the parsed frames of metric providers for the duration of a run, so that derived providers
+        like the XGBoost or SDIA model can be calculated from them without reading and parsing the log again.
+
+        Only the frames of the metric names that were requested by a derived provider are kept.
+        If a phase_stats_collector is given every frame is passed on to it.
+    '''
+
+    def __init__(self, metric_names, phase_stats_collector=None):
+        self._frames = {metric_name: [] for metric_name in metric_names}
+        self._lock = threading.Lock() # frames are added from the import workers and the streaming importer
+        self._phase_stats_collector = phase_stats_collector
+
+    def add(self, metric_name, df):
+        if self._phase_stats_collector is not None:
+            self._phase_stats_collector.add(df)
+        if metric_name not in self._frames:
+            return
+        with self._lock:
+            self._frames[metric_name].append(df)
+
+    # Returns the complete frame of the run or None if the metric was not recorded
+    def get(self, metric_name):
+        with self._lock:
+            frames = self._frames.get(metric_name)
+            if not frames:
+                return None
+            if len(frames) > 1:
+                # Concatenate once, so repeated calls do not copy again
+                self._frames[metric_name] = frames = [pandas.concat(frames, ignore_index=True)]
+            return frames[0]
+
+class StreamingImporter(threading.Thread):
+    '''
+        Tails the output files of all running metric providers during the run and imports
+        every complete line into the measurements table in batches.
+
+        The provider list and the containers dict are the live objects of the runner,
+        so container providers that are booted later are picked up automatically.
+        When the run ends the thread is stopped and the runner only has to call flush()
+        for every provider to import what was written since the last tick.
+    '''
+
+    def __init__(self, metric_providers, run_id, containers, interval=10, chunk_size=4_194_304, frame_cache=None):
+        super().__init__(daemon=True)
+        self._metric_providers = metric_providers
+        self._run_id = run_id
+        self._containers = containers
+        self._interval = interval
+        self._chunk_size = chunk_size
+        self._frame_cache = frame_cache
+        self._stop_event = threading.Event()
+        self._imported = {}
+        self._exception = None
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            # pylint: disable=broad-exception-caught
+            try:
+                for metric_provider in self._metric_providers:
+                    if metric_provider.has_started() and metric_provider.supports_streaming():
+                        self.flush(metric_provider)
+            except Exception as exc:
+                # We stop ingesting here. The error is reported by the runner on stop()
+                self._exception = exc
+                return
+
+    # Returns the total amount of rows imported for this provider so far
+    def flush(self, metric_provider):
+        rows = import_metric_provider(metric_provider, self._run_id, self._containers, chunk_size=self._chunk_size, frame_cache=self._frame_cache)
+        self._imported[metric_provider] = self._imported.get(metric_provider, 0) + rows
+
+        return self._imported[metric_provider]
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+        if self._exception is not None:
+            raise RuntimeError(f"Streaming ingestion of metric providers failed: {self._exception}") from self._exception
@@ -0,0 +1,136 @@
+import concurrent.futures
+import collections
+import math
+import plistlib
+import xml
+from datetime import datetime, timezone
+import numpy
+
+# powermetrics -f plist writes one plist document per sample and separates them with a NUL byte
+SAMPLE_SEPARATOR = b'\x00'
+
+# A field is a path of keys into a sample. The element after 'coalitions' is the name of the coalition,
+# as coalitions are a list and need to be searched by name.
+# Missing keys result in NaN, so that the caller can distinguish them from a measured 0
+PROVIDER_FIELDS = {
+    'timestamp': ('timestamp',),
+    'elapsed_ns': ('elapsed_ns',),
+    'cpu_power': ('processor', 'cpu_power'),
+    'package_joules': ('processor', 'package_joules'),
+    'gpu_power': ('processor', 'gpu_power'),
+    'ane_power': ('processor', 'ane_power'),
+    'docker_cputime_ns': ('coalitions', 'com.docker.docker', 'cputime_ns'),
+    'docker_diskio_bytesread': ('coalitions', 'com.docker.docker', 'diskio_bytesread'),
+    'docker_diskio_byteswritten': ('coalitions', 'com.docker.docker', 'diskio_byteswritten'),
+    'docker_energy_impact': ('coalitions', 'com.docker.docker', 'energy_impact'),
+}
+
+def get_field(sample, path):
+    value = sample
+    for i, key in enumerate(path):
+        if i > 0 and path[i - 1] == 'coalitions':
+            value = next((coalition for coalition in value if coalition['name'] == key), None)
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            value = None
+
+        if value is None:
+            return math.nan
+
+    if isinstance(value, datetime):
+        # Convert to nano seconds
+        return value.replace(tzinfo=timezone.utc).timestamp() * 1e9
+
+    return float(value)
+
+def extract_sample(sample, fields):
+    return tuple(get_field(sample, path) for path in fields.values())
+
+# Module level so that it can be pickled and sent to the worker processes
+def decode_samples(raw_samples, fields, first_count=1):
+    values = []
+    for count, raw_sample in enumerate(raw_samples, start=first_count):
+        try:
+            sample = plistlib.loads(raw_sample)
+        except xml.parsers.expat.ExpatError as e:
+            print('There was an error parsing the powermetrics data!')
+            print(f"Iteration count: {count}")
+            print(raw_sample)
+            raise e
+        values.append(extract_sample(sample, fields))
+    return values
+
+# Yields the raw plist documents of a powermetrics output file without loading the whole file into memory
+def iter_raw_samples(file, block_size=4_194_304):
+    remainder = b''
+    while block := file.read(block_size):
+        samples = (remainder + block).split(SAMPLE_SEPARATOR)
+        remainder = samples.pop()
+        for raw_sample in samples:
+            if raw_sample.strip():
+                yield raw_sample
+
+    if remainder.strip():
+        yield remainder
+
+# Collects the requested fields of powermetrics samples into numpy arrays, one value per sample and field.
+# The arrays are preallocated and grown by doubling, so that no Python object per value is kept around.
+# The samples can be added as already decoded dicts (like the hog sends them) or as raw plist documents
+class PowermetricsDecoder:
+    def __init__(self, fields=None, capacity=1024):
+        self._fields = PROVIDER_FIELDS if fields is None else fields
+        self._values = numpy.empty((max(capacity, 1), len(self._fields)), dtype=numpy.float64)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _reserve(self, count):
+        if self._count + count <= self._values.shape[0]:
+            return
+        capacity = max(self._values.shape[0] * 2, self._count + count)
+        values = numpy.empty((capacity, len(self._fields)), dtype=numpy.float64)
+        values[:self._count] = self._values[:self._count]
+        self._values = values
+
+    def _add_values(self, values):
+        if not values:
+            return
+        self._reserve(len(values))
+        self._values[self._count:self._count + len(values)] = values
+        self._count += len(values)
+
+    def add_sample(self, sample):
+        self._add_values([extract_sample(sample, self._fields)])
+
+    def add_raw_samples(self, raw_samples):
+        self._add_values(decode_samples(raw_samples, self._fields, first_count=self._count + 1))
+
+    # processes > 1 decodes the plist documents in a process pool. Samples are sent to the workers in batches
+    # and only a bounded amount of batches is in flight, so the memory stays bounded for long runs as well
+    def decode_file(self, filename, processes=1, batch_size=256):
+        with open(filename, 'rb') as file:
+            raw_samples = iter_raw_samples(file)
+            batches = iter(lambda: [raw_sample for _, raw_sample in zip(range(batch_size), raw_samples)], [])
+
+            if processes <= 1:
+                for batch in batches:
+                    self.add_raw_samples(batch)
+                return self
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = collections.deque()
+                first_count = self._count + 1
+                for batch in batches:
+                    futures.append(executor.submit(decode_samples, batch, self._fields, first_count))
+                    first_count += len(batch)
+                    if len(futures) >= processes * 2:
+                        self._add_values(futures.popleft().result())
+                while futures:
+                    self._add_values(futures.popleft().result())
+
+        return self
+
+    def get_arrays(self):
+        return {field: self._values[:self._count, i] for i, field in enumerate(self._fields)}
@@ -1,13 +1,18 @@
 import os
+import mmap
 from pathlib import Path
 import platform
 import subprocess
-from io import StringIO
+from io import StringIO, BytesIO
+import numpy
 import pandas
 
 from lib.system_checks import ConfigurationCheckError
 from lib import process_helpers
 
+# Must match BINARY_OUTPUT_ID_LENGTH in metric_providers/binary_output.h
+BINARY_OUTPUT_ID_LENGTH = 64
+
 class MetricProviderConfigurationError(ConfigurationCheckError):
     pass
 
@@ -24,6 +29,7 @@ class BaseMetricProvider:
         sudo=False,
         disable_buffer=True,
         skip_check=False,
+        binary_output=False,
     ):
         self._metric_name = metric_name
         self._metrics = metrics
@@ -36,10 +42,14 @@ class BaseMetricProvider:
         self._disable_buffer = disable_buffer
         self._rootless = None
         self._skip_check = skip_check
+        self._binary_output = binary_output
 
         self._tmp_folder = '/tmp/green-metrics-tool'
         self._ps = None
         self._extra_switches = []
+        self._stream_offset = 0
+        self._previous_time = None
+        self._frame_cache = None
 
         Path(self._tmp_folder).mkdir(exist_ok=True)
 
@@ -98,19 +108,144 @@ class BaseMetricProvider:
     def has_started(self):
         return self._has_started
 
+    # Streaming ingestion reads the log in pieces while the provider is still running.
+    # Providers that need to see the whole log at once in read_metrics() must override this and return False
+    def supports_streaming(self):
+        return True
+
+    # Metric names of other providers that this provider is calculated from, in order of preference.
+    # The runner keeps the parsed frames of these providers for the run and imports this provider after them
+    def get_source_metrics(self):
+        return []
+
+    def set_frame_cache(self, frame_cache):
+        self._frame_cache = frame_cache
+
+    # Returns the frame of the first source metric that was recorded in this run
+    def _get_source_frame(self):
+        if self._frame_cache is not None:
+            for metric_name in self.get_source_metrics():
+                if (df := self._frame_cache.get(metric_name)) is not None:
+                    return df
+
+        raise RuntimeError(f"None of the metrics {', '.join(self.get_source_metrics())} that {self._metric_name} is calculated from was recorded. Did you activate the corresponding provider in the config.yml too?")
+
     def read_metrics(self, run_id, containers=None):
+        self._previous_time = None
+
+        if self._binary_output:
+            return self._read_binary_metrics(run_id, containers)
+
         with open(self._filename, 'r', encoding='utf-8') as file:
             csv_data = file.read()
 
         # remove the last line from the string, as it may be broken due to the output buffering of the metrics reporter
         csv_data = csv_data[:csv_data.rfind('\n')]
 
-        # pylint: disable=invalid-name
-        df = pandas.read_csv(StringIO(csv_data),
-                             sep=' ',
-                             names=self._metrics.keys(),
-                             dtype=self._metrics
-                             )
+        return self._parse_metrics(StringIO(csv_data), run_id, containers)
+
+    # The log is memory mapped and the records are viewed through a structured dtype without parsing or copying.
+    # Only the final columns of the DataFrame are copied, as the mapping is closed afterwards
+    def _read_binary_metrics(self, run_id, containers=None):
+        dtype = self._get_binary_dtype()
+
+        with open(self._filename, 'rb') as file:
+            # A record at the end may not be completely written yet
+            records_count = os.fstat(file.fileno()).st_size // dtype.itemsize
+            if records_count == 0:
+                return self._parse_metrics(numpy.empty(0, dtype=dtype), run_id, containers)
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                records = numpy.frombuffer(mapped_file, dtype=dtype, count=records_count)
+                df = self._parse_metrics(records, run_id, containers)
+                del records # the mapping can only be closed when no array references it anymore
+
+        return df
+
+    # Layout of the fixed-width records that the provider writes when started with -b. See metric_providers/binary_output.h
+    def _get_binary_dtype(self):
+        fields = [('time', '=i8'), ('value', '=i8')]
+        detail_columns = [column for column in self._metrics if column not in ('time', 'value')]
+        if detail_columns:
+            fields.append((detail_columns[0], f"S{BINARY_OUTPUT_ID_LENGTH}"))
+
+        return numpy.dtype(fields)
+
+    # Returns a DataFrame with all lines that were completely written since the last call, or None if there are none.
+    # At most chunk_size bytes are read per call, so callers must call again until None is returned to catch up
+    def stream_metrics(self, run_id, containers=None, chunk_size=4_194_304):
+        if not os.path.isfile(self._filename):
+            return None
+
+        if self._binary_output:
+            return self._stream_binary_metrics(run_id, containers, chunk_size)
+
+        with open(self._filename, 'rb') as file:
+            file.seek(self._stream_offset)
+            csv_data = file.read(chunk_size)
+
+        # Only consume up to the last newline. The remainder may still be written by the metrics reporter
+        last_newline = csv_data.rfind(b'\n')
+        if last_newline == -1:
+            if len(csv_data) == chunk_size:
+                raise RuntimeError(f"Line in {self._filename} is longer than the chunk size of {chunk_size} bytes")
+            return None
+
+        self._stream_offset += last_newline + 1
+
+        return self._parse_metrics(BytesIO(csv_data[:last_newline]), run_id, containers)
+
+    def _stream_binary_metrics(self, run_id, containers, chunk_size):
+        dtype = self._get_binary_dtype()
+        if chunk_size < dtype.itemsize:
+            raise RuntimeError(f"The chunk size of {chunk_size} bytes is smaller than a record of {self._filename} with {dtype.itemsize} bytes")
+
+        with open(self._filename, 'rb') as file:
+            file.seek(self._stream_offset)
+            data = file.read(chunk_size - chunk_size % dtype.itemsize)
+
+        # Only consume complete records. The remainder may still be written by the metrics reporter
+        records_count = len(data) // dtype.itemsize
+        if records_count == 0:
+            return None
+
+        self._stream_offset += records_count * dtype.itemsize
+
+        return self._parse_metrics(numpy.frombuffer(data, dtype=dtype, count=records_count), run_id, containers)
+
+    # Yields the remaining log as DataFrames parsed from at most chunk_size bytes each.
+    # Peak memory is thus bounded by the chunk size and not by the duration of the run
+    def iter_metrics(self, run_id, containers=None, chunk_size=4_194_304):
+        while (df := self.stream_metrics(run_id, containers, chunk_size=chunk_size)) is not None:
+            yield df
+
+    # Time difference of every sample to its predecessor in us. As the log may be parsed in chunks
+    # we remember the last timestamp of the previous chunk. The very first sample has no predecessor and gets
+    # the configured resolution, so the result is the same for every chunk size. Even when streaming starts with a single line
+    def _get_intervals(self, df):
+        intervals = df['time'].diff()
+        if self._previous_time is None:
+            # approximate first interval. resolution is in ms
+            intervals.iloc[0] = self._resolution * 1000 if self._resolution is not None else intervals.mean()
+        else:
+            intervals.iloc[0] = df['time'].iloc[0] - self._previous_time
+        self._previous_time = df['time'].iloc[-1]
+
+        return intervals
+
+    # data is a file-like object with the text output or a structured array of records for the binary output
+    def _parse_metrics(self, data, run_id, containers=None):
+        if self._binary_output:
+            df = pandas.DataFrame({'time': data['time'], 'value': data['value']}, copy=True)
+            for column in data.dtype.names[2:]:
+                df[column] = pandas.Series(numpy.char.decode(data[column], 'utf-8'), dtype=self._metrics[column])
+        else:
+            # pylint: disable=invalid-name
+            df = pandas.read_csv(data,
+                                 sep=' ',
+                                 names=self._metrics.keys(),
+                                 dtype=self._metrics
+                                 )
 
         if self._metrics.get('sensor_name') is not None:
             df['detail_name'] = df.sensor_name
@@ -159,6 +294,9 @@ class BaseMetricProvider:
             call_string += ' '  # space at start
             call_string += ' '.join(self._extra_switches)
 
+        if self._binary_output:
+            call_string += ' -b'
+
         # This needs refactoring see https://github.com/green-coding-berlin/green-metrics-tool/issues/45
         if (self._metrics.get('container_id') is not None) and (containers is not None):
             call_string += ' -s '
@@ -190,6 +328,8 @@ class BaseMetricProvider:
             # therefore we use os.setsid here and later call os.getpgid(pid) to get process group that the shell
             # and the process are running in. These we then can send the signal to and kill them
         )
+        self._stream_offset = 0
+        self._previous_time = None
 
         # set_block False enables non-blocking reads on stderr.read(). Otherwise it would wait forever on empty
         os.set_blocking(self._ps.stderr.fileno(), False)
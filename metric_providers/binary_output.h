@@ -0,0 +1,46 @@
+#ifndef BINARY_OUTPUT_H
+#define BINARY_OUTPUT_H
+
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+#include <sys/time.h>
+
+// Fixed-width records that the metric providers write instead of text lines when called with -b
+// The layout must match BaseMetricProvider._get_binary_dtype() in metric_providers/base.py
+// Values are written in the byte order of the machine, as the file is only read on the same machine
+// A record that is not completely written yet is skipped by the reader until it is complete
+#define BINARY_OUTPUT_ID_LENGTH 64
+
+typedef struct binary_record_t {
+    int64_t time; // in microseconds, same as the text output
+    int64_t value;
+} binary_record_t;
+
+typedef struct binary_record_with_id_t {
+    int64_t time; // in microseconds, same as the text output
+    int64_t value;
+    char id[BINARY_OUTPUT_ID_LENGTH]; // zero padded. Not zero terminated if the id has the full length
+} binary_record_with_id_t;
+
+static inline void output_binary_record(struct timeval *now, int64_t value) {
+    binary_record_t record;
+
+    record.time = (int64_t)now->tv_sec * 1000000 + now->tv_usec;
+    record.value = value;
+
+    fwrite(&record, sizeof(record), 1, stdout);
+}
+
+static inline void output_binary_record_with_id(struct timeval *now, int64_t value, const char *id) {
+    binary_record_with_id_t record;
+
+    memset(&record, 0, sizeof(record));
+    record.time = (int64_t)now->tv_sec * 1000000 + now->tv_usec;
+    record.value = value;
+    strncpy(record.id, id, BINARY_OUTPUT_ID_LENGTH);
+
+    fwrite(&record, sizeof(record), 1, stdout);
+}
+
+#endif
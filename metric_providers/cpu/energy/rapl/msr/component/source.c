@@ -36,6 +36,7 @@
 #include <string.h>
 #include <sys/syscall.h>
 #include <sys/time.h>
+#include "binary_output.h"
 
 
 /* AMD Support */
@@ -167,6 +168,7 @@ static long long read_msr(int fd, unsigned int which) {
 // not pollute another threads state
 static unsigned int msr_rapl_units,msr_pkg_energy_status,msr_pp0_energy_status;
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 static int detect_cpu(void) {
 
@@ -465,7 +467,17 @@ static int rapl_msr(int measurement_mode) {
         // For now, skip reporting this value. in the future, we can use a branchless alternative
         if(energy_output>=0) {
             gettimeofday(&now, NULL);
-            if (measurement_mode == MEASURE_ENERGY_PKG) {
+            if (binary_output) {
+                char id[BINARY_OUTPUT_ID_LENGTH];
+                if (measurement_mode == MEASURE_ENERGY_PKG) {
+                    snprintf(id, sizeof(id), "Package_%d", j);
+                } else if (measurement_mode == MEASURE_DRAM) {
+                    snprintf(id, sizeof(id), "DRAM_%d", j);
+                } else {
+                    snprintf(id, sizeof(id), "PSYS_%d", j);
+                }
+                output_binary_record_with_id(&now, (long int)(energy_output*1000), id);
+            } else if (measurement_mode == MEASURE_ENERGY_PKG) {
                 printf("%ld%06ld %ld Package_%d\n", now.tv_sec, now.tv_usec, (long int)(energy_output*1000), j);
             } else if (measurement_mode == MEASURE_DRAM) {
                 printf("%ld%06ld %ld DRAM_%d\n", now.tv_sec, now.tv_usec, (long int)(energy_output*1000), j);
@@ -492,16 +504,20 @@ int main(int argc, char **argv) {
     int measurement_mode = MEASURE_ENERGY_PKG;
     int check_system_flag = 0;
 
-    while ((c = getopt (argc, argv, "hi:dcp")) != -1) {
+    while ((c = getopt (argc, argv, "hi:dcpb")) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-h] [-m]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-d      : measure the dram energy instead of the CPU package\n");
             printf("\t-p      : measure the psys energy instead of the CPU package\n");
             printf("\t-c      : check system and exit\n");
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
@@ -6,6 +6,7 @@
 #include <time.h>
 #include <string.h> // for strtok
 #include <getopt.h>
+#include "binary_output.h"
 
 typedef struct container_t { // struct is a specification and this static makes no sense here
     char path[BUFSIZ];
@@ -19,6 +20,7 @@ typedef struct container_t { // struct is a specification and this static makes
 static int user_id = 0;
 static long int user_hz;
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 static long int read_cpu_cgroup(char* filename) {
     long int cpu_usage = -1;
@@ -38,7 +40,12 @@ static int output_stats(container_t *containers, int length) {
     gettimeofday(&now, NULL);
 
     for(int i=0; i<length; i++) {
-        printf("%ld%06ld %ld %s\n", now.tv_sec, now.tv_usec, read_cpu_cgroup(containers[i].path), containers[i].id);
+        long int reading = read_cpu_cgroup(containers[i].path);
+        if(binary_output) {
+            output_binary_record_with_id(&now, reading, containers[i].id);
+        } else {
+            printf("%ld%06ld %ld %s\n", now.tv_sec, now.tv_usec, reading, containers[i].id);
+        }
     }
     usleep(msleep_time*1000);
 
@@ -117,16 +124,18 @@ int main(int argc, char **argv) {
         {"interval", no_argument, NULL, 'i'},
         {"containers", no_argument, NULL, 's'},
         {"check", no_argument, NULL, 'c'},
+        {"binary", no_argument, NULL, 'b'},
         {NULL, 0, NULL, 0}
     };
 
-    while ((c = getopt_long(argc, argv, "ri:s:hc", long_options, NULL)) != -1) {
+    while ((c = getopt_long(argc, argv, "ri:s:hcb", long_options, NULL)) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-i msleep_time] [-h]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-s      : string of container IDs separated by comma\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
 
             struct timespec res;
@@ -139,6 +148,9 @@ int main(int argc, char **argv) {
             printf("\tSystemHZ\t%ld\n", (unsigned long)(1/resolution + 0.5));
             printf("\tCLOCKS_PER_SEC\t%ld\n", CLOCKS_PER_SEC);
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
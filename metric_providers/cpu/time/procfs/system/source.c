@@ -4,6 +4,7 @@
 #include <unistd.h>
 #include <sys/time.h>
 #include <time.h>
+#include "binary_output.h"
 
 
 // All variables are made static, because we believe that this will
@@ -15,6 +16,7 @@
 
 static long int user_hz;
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 static long int read_cpu_proc() {
     FILE* fd = NULL;
@@ -41,7 +43,12 @@ static int output_stats() {
     struct timeval now;
 
     gettimeofday(&now, NULL);
-    printf("%ld%06ld %ld\n", now.tv_sec, now.tv_usec, read_cpu_proc());
+    long int reading = read_cpu_proc();
+    if(binary_output) {
+        output_binary_record(&now, reading);
+    } else {
+        printf("%ld%06ld %ld\n", now.tv_sec, now.tv_usec, reading);
+    }
     usleep(msleep_time*1000);
 
     return 1;
@@ -70,12 +77,13 @@ int main(int argc, char **argv) {
 
     user_hz = sysconf(_SC_CLK_TCK);
 
-    while ((c = getopt (argc, argv, "i:hc")) != -1) {
+    while ((c = getopt (argc, argv, "i:hcb")) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-i msleep_time] [-h]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
 
             struct timespec res;
@@ -88,6 +96,9 @@ int main(int argc, char **argv) {
             printf("\tSystemHZ\t%ld\n", (unsigned long)(1/resolution + 0.5));
             printf("\tCLOCKS_PER_SEC\t%ld\n", CLOCKS_PER_SEC);
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
@@ -3,7 +3,7 @@ import os
 from metric_providers.base import BaseMetricProvider
 
 class CpuUtilizationMachSystemProvider(BaseMetricProvider):
-    def __init__(self, resolution, skip_check=False):
+    def __init__(self, resolution, skip_check=False, binary_output=False):
         super().__init__(
             metric_name='cpu_utilization_mach_system',
             metrics={'time': int, 'value': int},
@@ -11,4 +11,5 @@ class CpuUtilizationMachSystemProvider(BaseMetricProvider):
             unit='Ratio',
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check = skip_check,
+            binary_output = binary_output,
         )
@@ -6,6 +6,9 @@
 #include <mach/mach.h>
 #include <mach/mach_host.h>
 #include <unistd.h>
+#include "binary_output.h"
+
+static int binary_output = 0;
 
 void loop_utilization(unsigned int msleep_time) {
     processor_info_array_t cpuInfo = NULL, prevCpuInfo = NULL;
@@ -35,7 +38,12 @@ void loop_utilization(unsigned int msleep_time) {
             }
 
             gettimeofday(&now, NULL);
-            printf("%ld%06i %i\n", now.tv_sec, now.tv_usec, (int)( (ut_total / (float)numCPUsU)*100*100) );
+            int reading = (int)( (ut_total / (float)numCPUsU)*100*100);
+            if (binary_output) {
+                output_binary_record(&now, reading);
+            } else {
+                printf("%ld%06i %i\n", now.tv_sec, now.tv_usec, reading);
+            }
 
             if (prevCpuInfo) {
                 size_t prevCpuInfoSize = sizeof(integer_t) * numPrevCpuInfo;
@@ -83,14 +91,18 @@ int main(int argc, char **argv) {
 
     setvbuf(stdout, NULL, _IONBF, 0);
 
-    while ((c = getopt (argc, argv, "i:hc")) != -1) {
+    while ((c = getopt (argc, argv, "i:hcb")) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-i msleep_time] [-h]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             if (msleep_time < 50){
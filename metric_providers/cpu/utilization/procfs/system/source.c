@@ -4,6 +4,7 @@
 #include <unistd.h>
 #include <sys/time.h>
 #include <time.h>
+#include "binary_output.h"
 
 typedef struct procfs_time_t { // struct is a specification and this static makes no sense here
     unsigned long user_time;
@@ -26,6 +27,7 @@ typedef struct procfs_time_t { // struct is a specification and this static make
 // TODO: If this code ever gets multi-threaded please review this assumption to
 // not pollute another threads state
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 static void read_cpu_proc(procfs_time_t* procfs_time_struct) {
 
@@ -74,7 +76,12 @@ static int output_stats() {
     // printf("%ld%06ld %f\n", now.tv_sec, now.tv_usec, (double)compute_time_reading / (double)(compute_time_reading+idle_reading));
 
     // main output to Stdout
-    printf("%ld%06ld %ld\n", now.tv_sec, now.tv_usec, (compute_time_reading*10000) / (compute_time_reading+idle_reading) ); // Deliberate integer conversion. Precision with 0.01% is good enough
+    long int reading = (compute_time_reading*10000) / (compute_time_reading+idle_reading); // Deliberate integer conversion. Precision with 0.01% is good enough
+    if(binary_output) {
+        output_binary_record(&now, reading);
+    } else {
+        printf("%ld%06ld %ld\n", now.tv_sec, now.tv_usec, reading);
+    }
 
     return 1;
 }
@@ -100,12 +107,13 @@ int main(int argc, char **argv) {
 
     setvbuf(stdout, NULL, _IONBF, 0);
 
-    while ((c = getopt (argc, argv, "i:hc")) != -1) {
+    while ((c = getopt (argc, argv, "i:hcb")) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-i msleep_time] [-h]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
 
 
@@ -118,6 +126,9 @@ int main(int argc, char **argv) {
             printf("\tSystemHZ\t%ld\n", (unsigned long)(1/resolution + 0.5));
             printf("\tCLOCKS_PER_SEC\t%ld\n", CLOCKS_PER_SEC);
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
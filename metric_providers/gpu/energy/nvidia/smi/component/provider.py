@@ -18,8 +18,8 @@ class GpuEnergyNvidiaSmiComponentProvider(BaseMetricProvider):
     def check_system(self, check_command="default", check_error_message=None, check_parallel_provider=True):
         super().check_system(check_command=['which', 'nvidia-smi'], check_error_message="nvidia-smi is not installed on the system")
 
-    def read_metrics(self, run_id, containers=None):
-        df = super().read_metrics(run_id, containers)
+    def _parse_metrics(self, data, run_id, containers=None):
+        df = super()._parse_metrics(data, run_id, containers)
 
         '''
         Conversion to Joules
@@ -37,11 +37,9 @@ class GpuEnergyNvidiaSmiComponentProvider(BaseMetricProvider):
         One can see that the value only changes once per second
         '''
 
-        intervals = df['time'].diff()
-        intervals[0] = intervals.mean()  # approximate first interval
-        df['interval'] = intervals  # in microseconds
+        df['interval'] = self._get_intervals(df)  # in microseconds
         # value is initially in milliWatts. So we just divide by 1_000_000
-        df['value'] = df.apply(lambda x: x['value'] * x['interval'] / 1_000_000, axis=1)
+        df['value'] = df['value'] * df['interval'] / 1_000_000
         df['value'] = df.value.fillna(0) # maybe not needed
         df['value'] = df.value.astype(int)
 
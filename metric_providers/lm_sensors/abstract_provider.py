@@ -23,7 +23,7 @@ class LmSensorsProvider(BaseMetricProvider):
         return ['-c'] + [f"'{i}'" for i in provider_config['chips']] \
             + ['-f'] + [f"'{i}'" for i in provider_config['features']]
 
-    def __init__(self, metric_name, resolution, unit, skip_check=False):
+    def __init__(self, metric_name, resolution, unit, skip_check=False, binary_output=False):
         if __name__ == '__main__':
             # If you run this on the command line you will need to set this in the config
             # This is separate so it is always clear what config is used.
@@ -37,6 +37,7 @@ class LmSensorsProvider(BaseMetricProvider):
             unit=unit,
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check=skip_check,
+            binary_output=binary_output,
         )
         self._extra_switches = self._create_options()
 
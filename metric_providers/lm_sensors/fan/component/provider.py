@@ -1,11 +1,12 @@
 from metric_providers.lm_sensors.abstract_provider import LmSensorsProvider
 
 class LmSensorsFanComponentProvider(LmSensorsProvider):
-    def __init__(self, resolution, **_):
+    def __init__(self, resolution, binary_output=False, **_):
         self._provider_config_path = 'lm_sensors.fan.component.provider.LmSensorsFanComponentProvider'
         super().__init__(
             metric_name='lm_sensors_fan_component',
             resolution=resolution,
+            binary_output=binary_output,
             unit='RPM',
         )
 
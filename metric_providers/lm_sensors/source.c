@@ -45,11 +45,13 @@
 #include "sensors/error.h"
 #include "sensors/sensors.h"
 #include "source.h"
+#include "binary_output.h"
 
 int fahrenheit;
 char degstr[5]; /* store the correct string to print degrees */
 
 static unsigned int msleep_time = 1000;
+static int binary_output = 0;
 static volatile sig_atomic_t keep_running = 1;
 
 /* As we need to do some cleanup when we get SIGINT we need a signal handler*/
@@ -67,6 +69,7 @@ static void print_long_help(char *program) {
         "  -h, --help             Display this help text\n"
         "  -t, --fahrenheit       Show temperatures in degrees fahrenheit\n"
         "  -i, --sleep            Milliseconds to sleep between measurements\n"
+        "  -b, --binary           Write fixed-width binary records instead of text lines\n"
         "\n"
         "Parameters for -c and and -f basically search strings. Like a regex '*' appended, "
         "the parameters are seen to be coretemp* and such will match anything that starts"
@@ -171,7 +174,11 @@ static void output_value(int value, char *container_id) {
     struct timeval now;
 
     gettimeofday(&now, NULL);
-    printf("%ld%06ld %i %s\n", now.tv_sec, now.tv_usec, value, container_id);
+    if (binary_output) {
+        output_binary_record_with_id(&now, value, container_id);
+    } else {
+        printf("%ld%06ld %i %s\n", now.tv_sec, now.tv_usec, value, container_id);
+    }
 }
 
 int main(int argc, char *argv[]) {
@@ -194,6 +201,7 @@ int main(int argc, char *argv[]) {
                                  {"fahrenheit", no_argument, NULL, 't'},
                                  {"config-file", required_argument, NULL, 's'},
                                  {"sleep", required_argument, NULL, 'i'},
+                                 {"binary", no_argument, NULL, 'b'},
                                  {0, 0, 0, 0}};
 
     /* Catch both signals and exit gracefully */
@@ -203,7 +211,7 @@ int main(int argc, char *argv[]) {
     setlocale(LC_CTYPE, "");
 
     while (1) {
-        c = getopt_long(argc, argv, "c:f:hts:i:n:", long_opts, NULL);
+        c = getopt_long(argc, argv, "c:f:hts:i:n:b", long_opts, NULL);
         if (c == EOF) break;
         switch (c) {
             case ':':
@@ -234,6 +242,9 @@ int main(int argc, char *argv[]) {
             case 't':
                 fahrenheit = 1;
                 break;
+            case 'b':
+                binary_output = 1;
+                break;
             case 'i':
                 msleep_time = atoi(optarg);
                 break;
@@ -1,11 +1,12 @@
 from metric_providers.lm_sensors.abstract_provider import LmSensorsProvider
 
 class LmSensorsTemperatureComponentProvider(LmSensorsProvider):
-    def __init__(self, resolution, **_):
+    def __init__(self, resolution, binary_output=False, **_):
         self._provider_config_path = 'lm_sensors.temperature.component.provider.LmSensorsTemperatureComponentProvider'
         super().__init__(
             metric_name='lm_sensors_temperature_component',
             resolution=resolution,
+            binary_output=binary_output,
             unit='centi°C',
         )
 
@@ -3,7 +3,7 @@ import os
 from metric_providers.base import BaseMetricProvider
 
 class MemoryEnergyRaplMsrComponentProvider(BaseMetricProvider):
-    def __init__(self, resolution, skip_check=False):
+    def __init__(self, resolution, skip_check=False, binary_output=False):
         super().__init__(
             metric_name='memory_energy_rapl_msr_component',
             metrics={'time': int, 'value': int, 'dram_id': str},
@@ -11,6 +11,7 @@ class MemoryEnergyRaplMsrComponentProvider(BaseMetricProvider):
             unit='mJ',
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check=skip_check,
+            binary_output=binary_output,
         )
         self._extra_switches = ['-d']
 
@@ -5,6 +5,7 @@
 #include <sys/time.h>
 #include <string.h> // for strtok
 #include <getopt.h>
+#include "binary_output.h"
 
 typedef struct container_t { // struct is a specification and this static makes no sense here
     char path[BUFSIZ];
@@ -17,6 +18,7 @@ typedef struct container_t { // struct is a specification and this static makes
 // in any case, none of these variables should change between threads
 static int user_id = 0;
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 static long int get_memory_cgroup(char* filename) {
     long int memory = -1;
@@ -47,7 +49,12 @@ static int output_stats(container_t *containers, int length) {
 
     gettimeofday(&now, NULL);
     for(i=0; i<length; i++) {
-        printf("%ld%06ld %ld %s\n", now.tv_sec, now.tv_usec, get_memory_cgroup(containers[i].path), containers[i].id);
+        long int reading = get_memory_cgroup(containers[i].path);
+        if(binary_output) {
+            output_binary_record_with_id(&now, reading, containers[i].id);
+        } else {
+            printf("%ld%06ld %ld %s\n", now.tv_sec, now.tv_usec, reading, containers[i].id);
+        }
     }
     usleep(msleep_time*1000);
 
@@ -125,18 +132,23 @@ int main(int argc, char **argv) {
         {"interval", no_argument, NULL, 'i'},
         {"containers", no_argument, NULL, 's'},
         {"check", no_argument, NULL, 'c'},
+        {"binary", no_argument, NULL, 'b'},
         {NULL, 0, NULL, 0}
     };
 
-    while ((c = getopt_long(argc, argv, "ri:s:hc", long_options, NULL)) != -1) {
+    while ((c = getopt_long(argc, argv, "ri:s:hcb", long_options, NULL)) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-i msleep_time] [-h]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-s      : string of container IDs separated by comma\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
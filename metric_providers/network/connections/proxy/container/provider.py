@@ -4,6 +4,8 @@
 
 import os
 import re
+import uuid
+import functools
 from datetime import datetime, timezone
 import platform
 import subprocess
@@ -66,32 +68,37 @@ class NetworkConnectionsProxyContainerProvider(BaseMetricProvider):
                 '--env', f"no_proxy={no_proxy_list}"]
 
 
+    # The proxy log is not in the provider output format and is imported directly in read_metrics()
+    def supports_streaming(self):
+        return False
+
     def read_metrics(self, run_id, containers=None):
-        records_added = 0
+        pattern = re.compile(r"CONNECT\s+([A-Za-z]{3} \d{2} \d{2}:\d{2}:\d{2})(?:\.(\d{3}))? \[\d+\]: Request \(file descriptor \d+\): (.+) (.+)")
+        year = datetime.now().year
+        run_uuid = uuid.UUID(str(run_id))
+
+        # Connections come in bursts, so many lines share the same second. Thus we only parse every second once
+        @functools.cache
+        def second_to_ms(second_str):
+            date = datetime.strptime(f"{year} {second_str}", '%Y %b %d %H:%M:%S')
+            return int(date.replace(tzinfo=timezone.utc).timestamp()) * 1000
+
+        rows = []
+        # The log is streamed line by line, so it is never completely in memory
         with open(self._filename, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-
-        pattern = re.compile(r"CONNECT\s+([A-Za-z]{3} \d{2} \d{2}:\d{2}:\d{2}(?:\.\d{3})?) \[\d+\]: Request \(file descriptor \d+\): (.+) (.+)")
-
-        for line in lines:
-            match = pattern.search(line)
-            if match:
-                date_str, connection_type, protocol = match.groups()
-                # parse the date and time
-                try:
-                    date = datetime.strptime(f"{datetime.now().year} {date_str}", '%Y %b %d %H:%M:%S.%f')
-                except ValueError:
-                    date = datetime.strptime(f"{datetime.now().year} {date_str}", '%Y %b %d %H:%M:%S')
-
-                time =  int(date.replace(tzinfo=timezone.utc).timestamp() * 1000)
-
-                query = '''
-                    INSERT INTO network_intercepts (run_id, time, connection_type, protocol)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                    '''
-                params = (run_id, time, connection_type, protocol)
-                DB().fetch_one(query, params=params)
-                records_added += 1
-
-        return records_added
+            for line in file:
+                match = pattern.search(line)
+                if match:
+                    second_str, milliseconds, connection_type, protocol = match.groups()
+                    time = second_to_ms(second_str) + (int(milliseconds) if milliseconds else 0)
+                    rows.append((run_uuid, time, connection_type, protocol))
+
+        if rows:
+            DB().copy_binary(
+                table='network_intercepts',
+                columns=('run_id', 'time', 'connection_type', 'protocol'),
+                types=('uuid', 'bigint', 'text', 'text'),
+                data=rows
+            )
+
+        return len(rows)
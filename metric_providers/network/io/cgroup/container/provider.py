@@ -3,7 +3,7 @@ import os
 from metric_providers.base import BaseMetricProvider
 
 class NetworkIoCgroupContainerProvider(BaseMetricProvider):
-    def __init__(self, resolution, rootless=False, skip_check=False):
+    def __init__(self, resolution, rootless=False, skip_check=False, binary_output=False):
         super().__init__(
             metric_name='network_io_cgroup_container',
             metrics={'time': int, 'value': int, 'container_id': str},
@@ -11,5 +11,6 @@ class NetworkIoCgroupContainerProvider(BaseMetricProvider):
             unit='Bytes',
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check=skip_check,
+            binary_output=binary_output,
         )
         self._rootless = rootless
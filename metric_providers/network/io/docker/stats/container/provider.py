@@ -27,6 +27,10 @@ class NetworkIoDockerStatsContainerProvider(BaseMetricProvider):
             preexec_fn=os.setsid,
             encoding='UTF-8')
 
+    # Testing-only provider that does not produce time-keyed output
+    def supports_streaming(self):
+        return False
+
     def read_metrics(self, run_id, containers=None):
         print('Read Metrics is overloaded for docker_stats, since values are not time-keyed. \
             Reporter is only for manual falsification. Never use in production!')
@@ -1,17 +1,16 @@
 import os
 import subprocess
-import plistlib
-from datetime import timezone
 import time
-import xml
+import numpy
 import pandas
 import signal
 
 from lib.db import DB
+from lib.powermetrics_decoder import PowermetricsDecoder
 from metric_providers.base import MetricProviderConfigurationError, BaseMetricProvider
 
 class PowermetricsProvider(BaseMetricProvider):
-    def __init__(self, resolution, skip_check=False):
+    def __init__(self, resolution, decoder_processes=1, skip_check=False):
         # We get this value on init as we want to have to for check_system to work in the normal case
         self._pm_process_count = self.powermetrics_total_count()
 
@@ -27,6 +26,7 @@ class PowermetricsProvider(BaseMetricProvider):
         )
 
         self._skip_check =  skip_check
+        self._decoder_processes = decoder_processes
         # We can't use --show-all here as this sometimes triggers output on stderr
         self._extra_switches = [
             '--show-process-io',
@@ -107,117 +107,71 @@ class PowermetricsProvider(BaseMetricProvider):
 
         self._ps = None
 
-    def read_metrics(self, run_id, containers=None):
-
-        with open(self._filename, 'rb') as metrics_file:
-            datas = metrics_file.read()
+    # The plist output can only be parsed once powermetrics has flushed it on shutdown
+    def supports_streaming(self):
+        return False
 
+    def read_metrics(self, run_id, containers=None):
         # Sometimes the container stops so fast that there will be no data in the file as powermetrics takes some time
         # to start. In this case we can't really do anything
-        if datas == b'':
+        if os.path.getsize(self._filename) == 0:
             return 0
 
-        datas = datas.split(b'\x00')
+        decoder = PowermetricsDecoder().decode_file(self._filename, processes=self._decoder_processes)
+        df = self._parse_metrics(decoder.get_arrays(), run_id)
+
+        # Set the invalid run string to indicate, that it was mac and we can't rely on the data
+        invalid_message = 'Measurements are not reliable as they are done on a Mac. See our blog for details.'
+        DB().query('UPDATE runs SET invalid_run=%s WHERE id = %s', params=(invalid_message, run_id))
+
+        return df
 
+    def _parse_metrics(self, data, run_id, containers=None):
         # We allow the usage of `df` and `dfs` here as it makes the code a lot more readable and is convention
         # pylint: disable=invalid-name
+        if data['elapsed_ns'].shape[0] == 0:
+            return pandas.DataFrame(columns=['time', 'value', 'metric', 'detail_name', 'unit', 'run_id'])
+
+        elapsed_ns = data['elapsed_ns'].astype(numpy.int64)
+        cum_time = int(data['timestamp'][0]) + numpy.cumsum(elapsed_ns)
+        cum_time_ms = cum_time // 1_000
+
+        # we want microjoule. Therefore / 10**9 to get seconds and the values are already in mW
+        conversion_factor = elapsed_ns / 1_000_000_000
+
+        metrics = [
+            ('docker_cputime_ns', data['docker_cputime_ns'], 'cpu_time_powermetrics_vm', 'docker_vm', 'ns'),
+            ('docker_diskio_bytesread', data['docker_diskio_bytesread'], 'disk_io_bytesread_powermetrics_vm', 'docker_vm', 'Bytes'),
+            ('docker_diskio_byteswritten', data['docker_diskio_byteswritten'], 'disk_io_byteswritten_powermetrics_vm', 'docker_vm', 'Bytes'),
+            # We need to introduce a new unit here as the energy impact on Mac isn't well understood
+            # https://tinyurl.com/2p9c56pz
+            ('docker_energy_impact', data['docker_energy_impact'], 'energy_impact_powermetrics_vm', 'docker_vm', '*'),
+            ('cpu_power', data['cpu_power'] * conversion_factor, 'cores_energy_powermetrics_component', '[COMPONENT]', 'mJ'),
+            ('package_joules', data['package_joules'] * 1000, 'cpu_energy_powermetrics_component', '[COMPONENT]', 'mJ'),
+            ('gpu_power', data['gpu_power'] * conversion_factor, 'gpu_energy_powermetrics_component', '[COMPONENT]', 'mJ'),
+            ('ane_power', data['ane_power'] * conversion_factor, 'ane_energy_powermetrics_component', '[COMPONENT]', 'mJ'),
+        ]
+
         dfs = []
-        cum_time = None
-
-        for count, data in enumerate(datas, start=1):
-            try:
-                data = plistlib.loads(data)
-            except xml.parsers.expat.ExpatError as e:
-                print('There was an error parsing the powermetrics data!')
-                print(f"Iteration count: {count}")
-                print(f"Number of items in datas: {len(datas)}")
-                print(data)
-                raise e
-
-            if cum_time is None:
-                # Convert seconds to nano seconds
-                cum_time = int(data['timestamp'].replace(tzinfo=timezone.utc).timestamp() * 1e9)
-
-            cum_time = cum_time + data['elapsed_ns']
-
-            # we want microjoule. Therefore / 10**9 to get seconds and the values are already in mW
-            conversion_factor = data['elapsed_ns'] / 1_000_000_000
-            cum_time_ms = int(cum_time / 1_000)
-
-            # coalitions gives us a list so we need to find the named entry
-            docker_task = None
-            for i in data['coalitions']:
-                if i['name'] == 'com.docker.docker':
-                    docker_task = i
-                    break
-
-            if docker_task is not None:
-                dfs.append([cum_time_ms,
-                            docker_task['cputime_ns'],
-                            'cpu_time_powermetrics_vm',
-                            'docker_vm',
-                            'ns'])
-                dfs.append([cum_time_ms,
-                            docker_task['diskio_bytesread'],
-                            'disk_io_bytesread_powermetrics_vm',
-                            'docker_vm',
-                            'Bytes'])
-                dfs.append([cum_time_ms,
-                            docker_task['diskio_byteswritten'],
-                           'disk_io_byteswritten_powermetrics_vm',
-                           'docker_vm',
-                           'Bytes'])
-                dfs.append([cum_time_ms,
-                            int(docker_task['energy_impact']),
-                           'energy_impact_powermetrics_vm',
-                           'docker_vm',
-                           # We need to introduce a new unit here as the energy impact on Mac isn't well understood
-                           # https://tinyurl.com/2p9c56pz
-                           '*'])
-
-            if 'cpu_power' in data['processor']:
-                dfs.append([cum_time_ms,
-                            int(float(data['processor']['cpu_power']) * conversion_factor),
-                           'cores_energy_powermetrics_component',
-                           '[COMPONENT]',
-                           'mJ'])
-
-            if 'package_joules' in data['processor']:
-                dfs.append([cum_time_ms,
-                            int(float(data['processor']['package_joules']) * 1000),
-                           'cpu_energy_powermetrics_component',
-                           '[COMPONENT]',
-                           'mJ'])
-
-            if 'gpu_power' in data['processor']:
-                dfs.append([cum_time_ms,
-                            int(float(data['processor']['gpu_power']) * conversion_factor),
-                            'gpu_energy_powermetrics_component',
-                            '[COMPONENT]',
-                            'mJ'])
-
-            #if 'combined_power' in data['processor']:
-            #    dfs.append([cum_time_ms,
-            #                int(float(data['processor']['combined_power']) * conversion_factor),
-            #                'system_combined_power',
-            #                '[COMPONENT]',
-            #                'mJ'])
-
-            if 'ane_power' in data['processor']:
-                dfs.append([cum_time_ms,
-                            int(float(data['processor']['ane_power']) * conversion_factor),
-                            'ane_energy_powermetrics_component',
-                            '[COMPONENT]',
-                            'mJ'])
-
-        df = pandas.DataFrame.from_records(dfs, columns=['time', 'value', 'metric', 'detail_name', 'unit'])
+        for position, (field, values, metric, detail_name, unit) in enumerate(metrics):
+            # Samples where powermetrics did not report the value are NaN and produce no row
+            measured = ~numpy.isnan(data[field])
+            dfs.append(pandas.DataFrame({
+                'time': cum_time_ms[measured],
+                'value': values[measured].astype(numpy.int64),
+                'metric': metric,
+                'detail_name': detail_name,
+                'unit': unit,
+                'sample': numpy.flatnonzero(measured),
+                'position': position,
+            }))
+
+        # Keep the rows in the order of the samples, as if they had been appended sample by sample
+        df = pandas.concat(dfs, ignore_index=True).sort_values(['sample', 'position'], kind='stable')
+        df = df.drop(columns=['sample', 'position']).reset_index(drop=True)
 
         df['run_id'] = run_id
 
-        # Set the invalid run string to indicate, that it was mac and we can't rely on the data
-        invalid_message = 'Measurements are not reliable as they are done on a Mac. See our blog for details.'
-        DB().query('UPDATE runs SET invalid_run=%s WHERE id = %s', params=(invalid_message, run_id))
-
         return df
 
 
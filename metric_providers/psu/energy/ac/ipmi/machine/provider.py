@@ -15,8 +15,8 @@ class PsuEnergyAcIpmiMachineProvider(BaseMetricProvider):
         )
 
 
-    def read_metrics(self, run_id, containers=None):
-        df = super().read_metrics(run_id, containers)
+    def _parse_metrics(self, data, run_id, containers=None):
+        df = super()._parse_metrics(data, run_id, containers)
 
         '''
         Conversion to Joules
@@ -34,10 +34,8 @@ class PsuEnergyAcIpmiMachineProvider(BaseMetricProvider):
         One can see that the value only changes once per second
         '''
 
-        intervals = df['time'].diff()
-        intervals[0] = intervals.mean()  # approximate first interval
-        df['interval'] = intervals  # in microseconds
-        df['value'] = df.apply(lambda x: x['value'] * x['interval'] / 1_000_000, axis=1)
+        df['interval'] = self._get_intervals(df)  # in microseconds
+        df['value'] = df['value'] * df['interval'] / 1_000_000
         df['value'] = df.value.fillna(0) # maybe not needed
         df['value'] = df.value.astype(int)
 
@@ -4,7 +4,7 @@ import os
 from metric_providers.base import BaseMetricProvider
 
 class PsuEnergyAcMcpMachineProvider(BaseMetricProvider):
-    def __init__(self, resolution, skip_check=False):
+    def __init__(self, resolution, skip_check=False, binary_output=False):
         super().__init__(
             metric_name='psu_energy_ac_mcp_machine',
             metrics={'time': int, 'value': int},
@@ -12,10 +12,11 @@ class PsuEnergyAcMcpMachineProvider(BaseMetricProvider):
             unit="mJ",
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check=skip_check,
+            binary_output=binary_output,
         )
 
-    def read_metrics(self, run_id, containers=None):
-        df = super().read_metrics(run_id, containers)
+    def _parse_metrics(self, data, run_id, containers=None):
+        df = super()._parse_metrics(data, run_id, containers)
 
         '''
         Conversion to Joules
@@ -33,10 +34,8 @@ class PsuEnergyAcMcpMachineProvider(BaseMetricProvider):
         One can see that the value only changes once per second
         '''
 
-        intervals = df['time'].diff()
-        intervals[0] = intervals.mean()  # approximate first interval
-        df['interval'] = intervals  # in microseconds
-        df['value'] = df.apply(lambda x: x['value'] * x['interval'] / 1_000_00, axis=1) # value is in centiwatts, so divide by 1_000_00 instead of 1_000 as we would do for Watts
+        df['interval'] = self._get_intervals(df)  # in microseconds
+        df['value'] = df['value'] * df['interval'] / 1_000_00 # value is in centiwatts, so divide by 1_000_00 instead of 1_000 as we would do for Watts
         df['value'] = df.value.fillna(0) # maybe not needed
         df['value'] = df.value.astype(int)
 
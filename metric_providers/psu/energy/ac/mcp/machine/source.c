@@ -9,6 +9,7 @@
 #include <sys/time.h>
 
 #include "mcp_com.h"
+#include "binary_output.h"
 
 /*
     This file is mostly copied from https://github.com/osmhpi/pinpoint/blob/master/src/data_sources/mcp_com.c
@@ -37,6 +38,7 @@ const unsigned char f511_set_accumulation_interval[] = { 0x41, 0x00, 0xA8, 0x4D,
 
 /* This variable ist just global for consitency with our other metric_provider source files */
 static unsigned int msleep_time=1000;
+static int binary_output = 0;
 
 enum mcp_states { init, wait_ack, get_len, get_data, validate_checksum };
 
@@ -220,14 +222,18 @@ int main(int argc, char **argv) {
     int data[2]; // The MCP has two outlets where you can measure.
 
 
-    while ((c = getopt (argc, argv, "hi:dc")) != -1) {
+    while ((c = getopt (argc, argv, "hi:dcb")) != -1) {
         switch (c) {
         case 'h':
             printf("Usage: %s [-h] [-m]\n\n",argv[0]);
             printf("\t-h      : displays this help\n");
             printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
             printf("\t-c      : check system and exit\n\n");
             exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
         case 'i':
             msleep_time = atoi(optarg);
             break;
@@ -260,7 +266,11 @@ int main(int argc, char **argv) {
         }
         // The MCP returns the current power consumption in 10mW steps.
         gettimeofday(&now, NULL);
-        printf("%ld%06ld %d\n", now.tv_sec, now.tv_usec, data[0]);
+        if(binary_output) {
+            output_binary_record(&now, data[0]);
+        } else {
+            printf("%ld%06ld %d\n", now.tv_sec, now.tv_usec, data[0]);
+        }
         usleep(msleep_time*1000);
     }
     close(fd);
@@ -1,6 +1,4 @@
 import os
-from io import StringIO
-import pandas
 
 from metric_providers.base import BaseMetricProvider, MetricProviderConfigurationError
 from lib.global_config import GlobalConfig
@@ -47,29 +45,16 @@ class PsuEnergyAcSdiaMachineProvider(BaseMetricProvider):
             raise MetricProviderConfigurationError(f"{self._metric_name} provider could not be started.\nPlease activate the CpuUtilizationProcfsSystemProvider in the config.yml\n \
                 This is required to run PsuEnergyAcSdiaMachineProvider")
 
-    def read_metrics(self, run_id, containers=None):
+    # The model is applied to the complete cpu utilization log of the run in read_metrics()
+    def supports_streaming(self):
+        return False
+
+    def get_source_metrics(self):
+        return ['cpu_utilization_procfs_system', 'cpu_utilization_mach_system']
 
-        filename = None
-
-        if os.path.isfile('/tmp/green-metrics-tool/cpu_utilization_procfs_system.log'):
-            filename = '/tmp/green-metrics-tool/cpu_utilization_procfs_system.log'
-        elif os.path.isfile('/tmp/green-metrics-tool/cpu_utilization_mach_system.log'):
-            filename = '/tmp/green-metrics-tool/cpu_utilization_mach_system.log'
-        else:
-            raise RuntimeError('could not find the /tmp/green-metrics-tool/cpu_utilization_procfs_system.log or /tmp/green-metrics-tool/cpu_utilization_mach_system.log file. \
-                Did you activate the CpuUtilizationProcfsSystemProvider or CpuUtilizationMacSystemProvider in the config.yml too? \
-                This is required to run PsuEnergyAcXgboostMachineProvider')
-
-        with open(filename, 'r', encoding='utf-8') as file:            csv_data = file.read()
-
-        # remove the last line from the string, as it may be broken due to the output buffering of the metrics reporter
-        csv_data = csv_data[:csv_data.rfind('\n')]
-        # pylint: disable=invalid-name
-        df = pandas.read_csv(StringIO(csv_data),
-                             sep=' ',
-                             names={'time': int, 'value': int}.keys(),
-                             dtype={'time': int, 'value': int}
-                             )
+    def read_metrics(self, run_id, containers=None):
+        # The utilization log was already parsed when the cpu utilization provider was imported
+        df = self._get_source_frame()[['time', 'value']].copy()
 
         df['detail_name'] = '[DEFAULT]'  # standard container name when no further granularity was measured
         df['metric'] = self._metric_name
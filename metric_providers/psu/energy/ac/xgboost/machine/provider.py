@@ -1,6 +1,9 @@
 import os
 import sys
-from io import StringIO
+import json
+import hashlib
+from pathlib import Path
+import numpy
 import pandas
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,6 +13,9 @@ import model.xgb as mlmodel
 from metric_providers.base import BaseMetricProvider, MetricProviderConfigurationError
 from lib.global_config import GlobalConfig
 
+# The prediction table of the trained model only depends on the hardware parameters and is thus kept across runs
+CACHE_DIR = Path.home() / '.cache' / 'green-metrics-tool' / 'psu_energy_ac_xgboost_machine'
+
 class PsuEnergyAcXgboostMachineProvider(BaseMetricProvider):
     def __init__(self, *, resolution, HW_CPUFreq, CPUChips, CPUThreads, TDP,
                  HW_MemAmountGB, CPUCores=None, Hardware_Availability_Year=None, skip_check=False):
@@ -46,64 +52,89 @@ class PsuEnergyAcXgboostMachineProvider(BaseMetricProvider):
             raise MetricProviderConfigurationError(f"{self._metric_name} provider could not be started.\nPlease activate the CpuUtilizationProcfsSystemProvider in the config.yml\n \
                 This is required to run PsuEnergyAcSdiaMachineProvider")
 
-    def read_metrics(self, run_id, containers=None):
+    # The model is applied to the complete cpu utilization log of the run in read_metrics()
+    def supports_streaming(self):
+        return False
 
-        filename = None
-        if os.path.isfile('/tmp/green-metrics-tool/cpu_utilization_procfs_system.log'):
-            filename = '/tmp/green-metrics-tool/cpu_utilization_procfs_system.log'
-        elif os.path.isfile('/tmp/green-metrics-tool/cpu_utilization_mach_system.log'):
-            filename = '/tmp/green-metrics-tool/cpu_utilization_mach_system.log'
-        else:
-            raise RuntimeError('could not find the /tmp/green-metrics-tool/cpu_utilization_procfs_system.log or /tmp/green-metrics-tool/cpu_utilization_mach_system.log file. \
-                Did you activate the CpuUtilizationProcfsSystemProvider or CpuUtilizationMacSystemProvider in the config.yml too? \
-                This is required to run PsuEnergyAcXgboostMachineProvider')
-
-        with open(filename, 'r', encoding='utf-8') as file:
-            csv_data = file.read()
-        # remove the last line from the string, as it may be broken due to the output buffering of the metrics reporter
-        csv_data = csv_data[:csv_data.rfind('\n')]
+    def get_source_metrics(self):
+        return ['cpu_utilization_procfs_system', 'cpu_utilization_mach_system']
 
-        # pylint: disable=invalid-name
-        df = pandas.read_csv(StringIO(csv_data),
-                              sep=' ',
-                              names={'time': int, 'value': int}.keys(),
-                              dtype={'time': int, 'value': int}
-                              )
+    def read_metrics(self, run_id, containers=None):
+        # The utilization log was already parsed when the cpu utilization provider was imported
+        df = self._get_source_frame()[['time', 'value']].copy()
 
         df['detail_name'] = '[DEFAULT]'  # standard container name when no further granularity was measured
         df['metric'] = self._metric_name
         df['run_id'] = run_id
 
-        Z = df.loc[:, ['value']]
+        prediction_table = self._get_prediction_table()
+
+        df.value = prediction_table[df.value.to_numpy()]  # will result in W
+        df.value = (df.value * df.time.diff()) / 1_000 # W * us / 1_000 will result in mJ
+
+        df['unit'] = self._unit
 
-        Z['HW_CPUFreq'] = self.HW_CPUFreq
-        Z['CPUThreads'] = self.CPUThreads
-        Z['TDP'] = self.TDP
-        Z['HW_MemAmountGB'] = self.HW_MemAmountGB
+        df.value = df.value.fillna(0)
+        df.value = df.value.astype(int)
+
+        return df
+
+    # The model input without the utilization. The columns and their order must be the same as in the training
+    def _get_model_parameters(self):
+        parameters = {
+            'HW_CPUFreq': self.HW_CPUFreq,
+            'CPUThreads': self.CPUThreads,
+            'TDP': self.TDP,
+            'HW_MemAmountGB': self.HW_MemAmountGB,
+        }
 
         # now we process the optional parameters
         if self.CPUCores:
-            Z['CPUCores'] = self.CPUCores
+            parameters['CPUCores'] = self.CPUCores
 
         if self.Hardware_Availability_Year:
-            Z['Hardware_Availability_Year'] = self.Hardware_Availability_Year
+            parameters['Hardware_Availability_Year'] = self.Hardware_Availability_Year
 
-        mlmodel.set_silent()
+        return parameters
 
-        Z = Z.rename(columns={'value': 'utilization'})
-        Z.utilization = Z.utilization / 100
+    # The cache is invalidated when the provider configuration, the model code or its training data change.
+    # The training data is in the data folder of the model submodule
+    def _get_cache_key(self):
+        model_dir = Path(mlmodel.__file__).parent
+        model_hash = hashlib.sha256()
+        for path in [Path(mlmodel.__file__), *sorted((model_dir / 'data').rglob('*'))]:
+            if path.is_file():
+                model_hash.update(str(path.relative_to(model_dir)).encode('utf-8'))
+                with open(path, 'rb') as file:
+                    model_hash.update(file.read())
+
+        configuration = json.dumps({'CPUChips': self.CPUChips, **self._get_model_parameters()}, sort_keys=True)
+        return hashlib.sha256(f"{configuration}{model_hash.hexdigest()}".encode('utf-8')).hexdigest()
+
+    # Returns an array with the predicted watts for every utilization from 0 to 10_000 (0.00% to 100.00%)
+    # so that a whole utilization series can be converted with a single lookup
+    def _get_prediction_table(self):
+        cache_dir = CACHE_DIR / self._get_cache_key()
+        table_file = cache_dir / 'prediction_table.npy'
+
+        if table_file.is_file():
+            return numpy.load(table_file)
+
+        # pylint: disable=invalid-name
+        Z = pandas.DataFrame({'utilization': [0.0], **{key: [value] for key, value in self._get_model_parameters().items()}})
+
+        mlmodel.set_silent()
         model = mlmodel.train_model(self.CPUChips, Z)
 
         inferred_predictions = mlmodel.infer_predictions(model, Z)
         interpolated_predictions = mlmodel.interpolate_predictions(inferred_predictions)
 
+        prediction_table = numpy.array([interpolated_predictions[utilization / 100] for utilization in range(10_001)])
 
-        df.value = df.value.apply(lambda x: interpolated_predictions[x / 100])  # will result in W
-        df.value = (df.value * df.time.diff()) / 1_000 # W * us / 1_000 will result in mJ
-
-        df['unit'] = self._unit
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so that a parallel run never loads a partially written table
+        tmp_file = cache_dir / f"prediction_table.{os.getpid()}.npy"
+        numpy.save(tmp_file, prediction_table)
+        os.replace(tmp_file, table_file)
 
-        df.value = df.value.fillna(0)
-        df.value = df.value.astype(int)
-
-        return df
+        return prediction_table
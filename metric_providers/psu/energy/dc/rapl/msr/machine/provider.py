@@ -3,7 +3,7 @@ import os
 from metric_providers.base import BaseMetricProvider
 
 class PsuEnergyDcRaplMsrMachineProvider(BaseMetricProvider):
-    def __init__(self, resolution, skip_check=False):
+    def __init__(self, resolution, skip_check=False, binary_output=False):
         super().__init__(
             metric_name='psu_energy_dc_rapl_msr_machine',
             metrics={'time': int, 'value': int, 'psys_id': str},
@@ -11,6 +11,7 @@ class PsuEnergyDcRaplMsrMachineProvider(BaseMetricProvider):
             unit='mJ',
             current_dir=os.path.dirname(os.path.abspath(__file__)),
             skip_check=skip_check,
+            binary_output=binary_output,
         )
         self._extra_switches = ['-p']
 
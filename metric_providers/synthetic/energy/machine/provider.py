@@ -0,0 +1,41 @@
+import os
+
+from metric_providers.base import BaseMetricProvider
+
+# Writes generated values instead of measuring. Only meant for profiling and benchmarking the import
+class SyntheticEnergyMachineProvider(BaseMetricProvider):
+    def __init__(self, resolution, detail_names=0, duration=None, skip_check=False, binary_output=False):
+        super().__init__(
+            metric_name='synthetic_energy_machine',
+            metrics={'time': int, 'value': int, 'detail_id': str} if detail_names else {'time': int, 'value': int},
+            resolution=resolution,
+            unit='mJ',
+            current_dir=os.path.dirname(os.path.abspath(__file__)),
+            skip_check=skip_check,
+            binary_output=binary_output,
+        )
+        self._extra_switches = ['-n', str(detail_names)]
+        if duration is not None:
+            # The values of the whole duration are written at once and the provider exits
+            self._extra_switches += ['-d', str(duration)]
+
+    def check_system(self, check_command="default", check_error_message=None, check_parallel_provider=True):
+        # Several synthetic providers may run at the same time in benchmarks
+        super().check_system(check_command=check_command, check_error_message=check_error_message, check_parallel_provider=False)
+
+    def stop_profiling(self):
+        # With a duration the provider exits by itself after writing all values
+        if self._ps is not None and self._ps.poll() is not None:
+            self._ps = None
+            self._has_started = False
+            return
+
+        super().stop_profiling()
+
+    def _parse_metrics(self, data, run_id, containers=None):
+        df = super()._parse_metrics(data, run_id, containers)
+
+        if 'detail_id' in df.columns:
+            df['detail_name'] = df.pop('detail_id')
+
+        return df
@@ -0,0 +1,135 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <unistd.h>
+#include <sys/time.h>
+#include "binary_output.h"
+
+// Generates energy values in mJ in the same output format as the real energy providers
+// The values follow a random walk around the base power, so that they look like a machine under changing load.
+// If detail names are requested every sample has one line per detail name, like the container providers have.
+
+
+// All variables are made static, because we believe that this will
+// keep them local in scope to the file and not make them persist in state
+// between Threads.
+// TODO: If this code ever gets multi-threaded please review this assumption to
+// not pollute another threads state
+static unsigned int msleep_time=1000;
+static unsigned int detail_names=0;
+static unsigned long duration=0; // in seconds. 0 means sampling in real time until killed
+static int binary_output = 0;
+static uint64_t random_state = 42;
+static long long power = 20000; // in mW
+
+// xorshift, as the values only need to look random and must be the same for every run
+static uint64_t next_random() {
+    random_state ^= random_state << 13;
+    random_state ^= random_state >> 7;
+    random_state ^= random_state << 17;
+    return random_state;
+}
+
+static void output_value(struct timeval *now, unsigned int detail_name) {
+    char id[BINARY_OUTPUT_ID_LENGTH];
+    long long step = (long long)(next_random() % 2001) - 1000;
+
+    power += step;
+    if (power < 5000) power = 5000;
+    if (power > 150000) power = 150000;
+
+    long long reading = (power * msleep_time) / 1000; // mW * ms => uJ / 1000 => mJ
+
+    if (detail_names == 0) {
+        if(binary_output) {
+            output_binary_record(now, reading);
+        } else {
+            printf("%ld%06ld %lld\n", now->tv_sec, now->tv_usec, reading);
+        }
+        return;
+    }
+
+    snprintf(id, sizeof(id), "synthetic-%u", detail_name);
+    if(binary_output) {
+        output_binary_record_with_id(now, reading, id);
+    } else {
+        printf("%ld%06ld %lld %s\n", now->tv_sec, now->tv_usec, reading, id);
+    }
+}
+
+static void output_sample(struct timeval *now) {
+    if (detail_names == 0) {
+        output_value(now, 0);
+        return;
+    }
+    for (unsigned int i = 0; i < detail_names; i++) {
+        output_value(now, i);
+    }
+}
+
+int main(int argc, char **argv) {
+
+    int c;
+    struct timeval now;
+
+    while ((c = getopt (argc, argv, "i:n:d:hcb")) != -1) {
+        switch (c) {
+        case 'h':
+            printf("Usage: %s [-i msleep_time] [-n detail_names] [-d duration] [-b] [-h]\n\n",argv[0]);
+            printf("\t-h      : displays this help\n");
+            printf("\t-i      : specifies the milliseconds sleep time that will be slept between measurements\n");
+            printf("\t-n      : amount of detail names every sample has a value for. 0 writes no detail name column\n");
+            printf("\t-d      : writes the samples of this many seconds at once without sleeping and exits\n");
+            printf("\t-b      : writes fixed-width binary records instead of text lines\n");
+            printf("\t-c      : check system and exit\n\n");
+            exit(0);
+        case 'b':
+            binary_output = 1;
+            break;
+        case 'i':
+            msleep_time = atoi(optarg);
+            break;
+        case 'n':
+            detail_names = atoi(optarg);
+            break;
+        case 'd':
+            duration = strtoul(optarg, NULL, 10);
+            break;
+        case 'c':
+            exit(0); // Nothing is needed on the system to generate values
+        default:
+            fprintf(stderr,"Unknown option %c\n",c);
+            exit(-1);
+        }
+    }
+
+    if (msleep_time == 0) {
+        fprintf(stderr, "Sleep time must be at least one millisecond\n");
+        exit(1);
+    }
+
+    gettimeofday(&now, NULL);
+
+    if (duration > 0) {
+        // The samples are spaced by the sleep time as if they had been measured, just without waiting for it
+        unsigned long long samples = (unsigned long long)duration * 1000 / msleep_time;
+        for (unsigned long long i = 0; i < samples; i++) {
+            output_sample(&now);
+            now.tv_usec += msleep_time * 1000;
+            now.tv_sec += now.tv_usec / 1000000;
+            now.tv_usec %= 1000000;
+        }
+        fflush(stdout);
+        return 0;
+    }
+
+    setvbuf(stdout, NULL, _IONBF, 0);
+
+    while(1) {
+        gettimeofday(&now, NULL);
+        output_sample(&now);
+        usleep(msleep_time*1000);
+    }
+
+    return 0;
+}
@@ -0,0 +1 @@
+ALTER TABLE "phase_stats" ADD COLUMN "statistics" jsonb;
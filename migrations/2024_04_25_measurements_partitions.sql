@@ -0,0 +1,48 @@
+-- Partitions measurements by the month of created_at and every month by the hash of run_id, see lib/metric_importer.py
+-- The existing measurements become the partition of the current month, so they can be detached as a whole later.
+-- created_at of the measurements becomes the created_at of their run, which the queries for a run select on.
+-- Attaching checks all rows and builds the primary key and measurements_get on them, so this takes a while on big installations
+BEGIN;
+
+UPDATE measurements SET created_at = runs.created_at FROM runs WHERE measurements.run_id = runs.id AND measurements.created_at IS DISTINCT FROM runs.created_at;
+ALTER TABLE measurements ALTER COLUMN created_at SET NOT NULL;
+
+-- The partitioned table gets its own, the other indexes are the same and are taken over
+ALTER TABLE measurements DROP CONSTRAINT measurements_pkey;
+DROP INDEX measurements_get;
+DROP TRIGGER measurements_moddatetime ON measurements;
+ALTER INDEX measurements_build_and_store_phase_stats RENAME TO measurements_legacy_build_and_store_phase_stats;
+ALTER INDEX measurements_build_phases RENAME TO measurements_legacy_build_phases;
+ALTER TABLE measurements RENAME CONSTRAINT measurements_run_id_fkey TO measurements_legacy_run_id_fkey;
+ALTER TABLE measurements RENAME TO measurements_legacy;
+
+CREATE TABLE measurements (
+    id integer NOT NULL DEFAULT nextval('measurements_id_seq'),
+    run_id uuid NOT NULL REFERENCES runs(id) ON DELETE CASCADE ON UPDATE CASCADE ,
+    detail_name text NOT NULL,
+    metric text NOT NULL,
+    value bigint NOT NULL,
+    unit text NOT NULL,
+    time bigint NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    updated_at timestamp with time zone,
+    PRIMARY KEY (id, created_at, run_id)
+) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE measurements_id_seq OWNED BY measurements.id;
+CREATE UNIQUE INDEX measurements_get ON measurements(run_id ,metric ,detail_name ,time, created_at );
+CREATE INDEX measurements_build_and_store_phase_stats ON measurements(run_id, metric, unit, detail_name);
+CREATE INDEX measurements_build_phases ON measurements(metric, unit, detail_name);
+CREATE TRIGGER measurements_moddatetime
+    BEFORE UPDATE ON measurements
+    FOR EACH ROW
+    EXECUTE PROCEDURE moddatetime (updated_at);
+
+DO $$
+DECLARE
+    month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC');
+BEGIN
+    EXECUTE format('ALTER TABLE measurements_legacy RENAME TO %I', 'measurements_' || to_char(month, 'YYYY_MM'));
+    EXECUTE format('ALTER TABLE measurements ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)', 'measurements_' || to_char(month, 'YYYY_MM'), (month + interval '1 month')::text || '+00');
+END $$;
+
+COMMIT;
@@ -8,6 +8,7 @@ from lib.venv_checker import check_venv
 check_venv() # this check must even run before __main__ as imports might not get resolved
 
 import subprocess
+import concurrent.futures
 import json
 import os
 import time
@@ -15,7 +16,6 @@ from html import escape
 import sys
 import importlib
 import re
-from io import StringIO
 from pathlib import Path
 import random
 import shutil
@@ -34,10 +34,12 @@ from lib.repo_info import get_repo_info
 from lib.debug_helper import DebugHelper
 from lib.terminal_colors import TerminalColors
 from lib.schema_checker import SchemaChecker
-from lib.db import DB
+from lib.db import DB, get_pool_config
 from lib.global_config import GlobalConfig
 from lib.notes import Notes
 from lib import system_checks
+from lib.metric_importer import import_measurements, import_metric_provider, MetricFrameCache, StreamingImporter
+from tools.phase_stats import PhaseStatsCollector
 
 
 
@@ -82,6 +84,7 @@ class Runner:
         self._usage_scenario = {}
         self._architecture = utils.get_architecture()
         self._sci = {'R_d': None, 'R': 0}
+        self._phase_stats_collector = None # only set if the phase stats are calculated in process
         self._job_id = job_id
         self._arguments = locals()
         self._repo_folder = f"{self._tmp_folder}/repo" # default if not changed in checkout_repository
@@ -101,6 +104,8 @@ class Runner:
         self.__ps_to_kill = []
         self.__ps_to_read = []
         self.__metric_providers = []
+        self.__streaming_importer = None
+        self.__frame_cache = None
         self.__notes_helper = Notes()
         self.__phases = OrderedDict()
         self.__start_measurement = None
@@ -466,6 +471,8 @@ class Runner:
         )
 
     def import_metric_providers(self):
+        self._phase_stats_collector = None
+
         if self._dev_no_metrics:
             print(TerminalColors.HEADER, '\nSkipping import of metric providers', TerminalColors.ENDC)
             return
@@ -511,6 +518,15 @@ class Runner:
 
 
         self.__metric_providers.sort(key=lambda item: 'rapl' not in item.__class__.__name__.lower())
+        # Derived providers are calculated from the frames of other providers and must thus come after them
+        self.__metric_providers.sort(key=lambda item: len(item.get_source_metrics()) > 0)
+
+        source_metrics = {metric_name for metric_provider in self.__metric_providers for metric_name in metric_provider.get_source_metrics()}
+        if (config['measurement'].get('metric-import') or {}).get('in-process-phase-stats', False):
+            self._phase_stats_collector = PhaseStatsCollector()
+        self.__frame_cache = MetricFrameCache(source_metrics, phase_stats_collector=self._phase_stats_collector)
+        for metric_provider in self.__metric_providers:
+            metric_provider.set_frame_cache(self.__frame_cache)
 
     def download_dependencies(self):
         if self._dev_no_build:
@@ -1033,6 +1049,24 @@ class Runner:
             if stderr_read:
                 raise RuntimeError(f"Stderr on {metric_provider.__class__.__name__} was NOT empty: {stderr_read}")
 
+        self.start_streaming_importer()
+
+    def start_streaming_importer(self):
+        import_config = GlobalConfig().config['measurement'].get('metric-import') or {}
+        if not import_config.get('streaming', False) or self.__streaming_importer is not None:
+            return
+
+        print(TerminalColors.HEADER, '\nStarting streaming ingestion of metric providers', TerminalColors.ENDC)
+        self.__streaming_importer = StreamingImporter(
+            self.__metric_providers,
+            self._run_id,
+            self.__containers,
+            interval=import_config.get('streaming-interval', 10),
+            chunk_size=import_config.get('chunk-size', 4_194_304),
+            frame_cache=self.__frame_cache,
+        )
+        self.__streaming_importer.start()
+
 
     def start_phase(self, phase, transition = True):
         config = GlobalConfig().config
@@ -1220,36 +1254,93 @@ class Runner:
 
         print(TerminalColors.HEADER, 'Stopping metric providers and parsing measurements', TerminalColors.ENDC)
         errors = []
-        for metric_provider in self.__metric_providers:
-            if not metric_provider.has_started():
-                continue
-
-            stderr_read = metric_provider.get_stderr()
-            if stderr_read:
-                errors.append(f"Stderr on {metric_provider.__class__.__name__} was NOT empty: {stderr_read}")
+        import_config = GlobalConfig().config['measurement'].get('metric-import') or {}
+        chunk_size = import_config.get('chunk-size', 4_194_304)
 
+        streaming_importer = self.__streaming_importer
+        self.__streaming_importer = None
+        if streaming_importer is not None:
             # pylint: disable=broad-exception-caught
             try:
-                metric_provider.stop_profiling()
+                streaming_importer.stop()
             except Exception as exc:
-                errors.append(f"Could not stop profiling on {metric_provider.__class__.__name__}: {str(exc)}")
+                # The run is marked as failed through the error, but we still import everything that is left
+                errors.append(str(exc))
+
+        started_metric_providers = [metric_provider for metric_provider in self.__metric_providers if metric_provider.has_started()]
+
+        # All providers are stopped together, so no provider keeps measuring while another one is shut down
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(started_metric_providers))) as executor:
+            stop_errors = list(executor.map(self.__stop_metric_provider, started_metric_providers))
+
+        # The logs are parsed and imported in parallel. Every worker uses its own DB connection from the pool,
+        # so there are never more workers than the pool has connections, as they would only wait for one.
+        # pandas and psycopg release the GIL for the heavy parts, so threads are sufficient here.
+        # Derived providers are only imported once all other providers are done, as they need their frames
+        import_errors = {}
+        import_workers = max(1, min(import_config.get('workers', 4), get_pool_config(DB.role)['max_size']))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=import_workers) as executor:
+            for derived in (False, True):
+                metric_providers = [metric_provider for metric_provider in started_metric_providers if (len(metric_provider.get_source_metrics()) > 0) == derived]
+                for metric_provider, provider_import_errors in zip(metric_providers, executor.map(lambda metric_provider: self.__import_metric_provider(metric_provider, streaming_importer, chunk_size), metric_providers)):
+                    import_errors[metric_provider] = provider_import_errors
+
+        # We keep the order of the providers for the errors, so the messages are comparable between runs
+        for metric_provider, provider_stop_errors in zip(started_metric_providers, stop_errors):
+            errors.extend(provider_stop_errors + import_errors[metric_provider])
+
+        self.__metric_providers.clear()
+        self.__frame_cache = None # releases the kept frames
+        if errors:
+            raise RuntimeError("\n".join(errors))
+
+
+    # The following two methods run in worker threads of stop_metric_providers(). They return the errors for the provider
+    def __stop_metric_provider(self, metric_provider):
+        errors = []
+
+        stderr_read = metric_provider.get_stderr()
+        if stderr_read:
+            errors.append(f"Stderr on {metric_provider.__class__.__name__} was NOT empty: {stderr_read}")
+
+        # pylint: disable=broad-exception-caught
+        try:
+            metric_provider.stop_profiling()
+        except Exception as exc:
+            errors.append(f"Could not stop profiling on {metric_provider.__class__.__name__}: {str(exc)}")
+
+        return errors
 
+    def __import_metric_provider(self, metric_provider, streaming_importer, chunk_size):
+        errors = []
+        start = time.time()
+        provider_name = metric_provider.__class__.__name__
+
+        self_imported = False
+        if metric_provider.supports_streaming():
+            if streaming_importer is not None:
+                # Only the lines written since the last tick of the importer are left to import
+                rows = streaming_importer.flush(metric_provider)
+            else:
+                rows = import_metric_provider(metric_provider, self._run_id, self.__containers, chunk_size=chunk_size, frame_cache=self.__frame_cache)
+        else:
             df = metric_provider.read_metrics(self._run_id, self.__containers)
             if isinstance(df, int):
-                print('Imported', TerminalColors.HEADER, df, TerminalColors.ENDC, 'metrics from ', metric_provider.__class__.__name__)
                 # If df returns an int the data has already been committed to the db
-                continue
-
-            print('Imported', TerminalColors.HEADER, df.shape[0], TerminalColors.ENDC, 'metrics from ', metric_provider.__class__.__name__)
-            if df is None or df.shape[0] == 0:
-                errors.append(f"No metrics were able to be imported from: {metric_provider.__class__.__name__}")
+                rows = df
+                self_imported = True
+            else:
+                rows = 0 if df is None else df.shape[0]
+                if rows != 0:
+                    import_measurements(df)
+                    if self.__frame_cache is not None:
+                        self.__frame_cache.add(metric_provider._metric_name, df)
 
-            f = StringIO(df.to_csv(index=False, header=False))
-            DB().copy_from(file=f, table='measurements', columns=df.columns, sep=',')
-        self.__metric_providers.clear()
-        if errors:
-            raise RuntimeError("\n".join(errors))
+        print('Imported', TerminalColors.HEADER, rows, TerminalColors.ENDC, 'metrics from', provider_name, f"in {time.time() - start:.2f} s")
+        if rows == 0 and not self_imported:
+            errors.append(f"No metrics were able to be imported from: {provider_name}")
 
+        return errors
 
     def read_and_cleanup_processes(self):
         print(TerminalColors.HEADER, '\nReading process stdout/stderr (if selected) and cleaning them up', TerminalColors.ENDC)
@@ -1395,6 +1486,15 @@ class Runner:
         print(TerminalColors.OKCYAN, '\nStarting cleanup routine', TerminalColors.ENDC)
 
         if continue_measurement is False:
+            if self.__streaming_importer is not None:
+                print('Stopping streaming ingestion')
+                try:
+                    self.__streaming_importer.stop()
+                # pylint: disable=broad-exception-caught
+                except Exception as exc:
+                    error_helpers.log_error('Could not stop streaming ingestion', exception=exc)
+                self.__streaming_importer = None
+
             print('Stopping metric providers')
             for metric_provider in self.__metric_providers:
                 try:
@@ -1403,6 +1503,7 @@ class Runner:
                 except Exception as exc:
                     error_helpers.log_error(f"Could not stop profiling on {metric_provider.__class__.__name__}", exception=exc)
             self.__metric_providers.clear()
+            self.__frame_cache = None
 
 
         print('Stopping containers')
@@ -1579,6 +1680,8 @@ class Runner:
 if __name__ == '__main__':
     import argparse
 
+    DB.role = 'runner' # must be set before the first query creates the pool
+
     parser = argparse.ArgumentParser()
     parser.add_argument('--uri', type=str, help='The URI to get the usage_scenario.yml from. Can be either a local directory starting  with / or a remote git repository starting with http(s)://')
     parser.add_argument('--branch', type=str, help='Optionally specify the git branch when targeting a git repository')
@@ -1673,7 +1776,7 @@ if __name__ == '__main__':
         # loop over them issuing separate queries to the DB
         from tools.phase_stats import build_and_store_phase_stats
 
-        build_and_store_phase_stats(runner._run_id, runner._sci)
+        build_and_store_phase_stats(runner._run_id, runner._sci, runner._phase_stats_collector)
 
         # We need to import this here as we need the correct config file
         if not runner._dev_no_optimizations:
@@ -2,6 +2,7 @@ import json
 import os
 import time
 from uuid import UUID
+import pandas
 import pytest
 import requests
 import psycopg
@@ -9,6 +10,7 @@ import psycopg
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 from lib.db import DB
+from lib.metric_importer import import_measurements
 from lib import utils
 from lib.global_config import GlobalConfig
 from tools.machine import Machine
@@ -181,6 +183,82 @@ def test_hogDB_add():
         data = DB().fetch_one(q, row_factory=psycopg.rows.dict_row)
         assert data is not None or data != []
 
+def test_hogDB_get():
+    hog_data_obj  = [
+    {
+        "time": 1710668240000,
+        "data": hog_data.hog_string,
+        "settings": json.dumps({"powermetrics": 5000, "upload_delta": 3, "upload_data": True, "resolve_coalitions": ["com.googlecode.iterm2", "com.apple.terminal", "com.vix.cron"], "client_version": "0.5"}),
+        "machine_uuid": "371ee758-d4e6-11ee-a082-7e27a1187d3d",
+        "row_id": 51},
+    ]
+
+    response = requests.post(f"{API_URL}/v1/hog/add", json=hog_data_obj, timeout=15)
+    assert response.status_code == 204, Tests.assertion_info('success', response.text)
+
+    response = requests.get(f"{API_URL}/v1/hog/top_processes", timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
+    res_json = response.json()
+    assert res_json['machine_count'] == 1
+    assert res_json['process_data'] != []
+
+    response = requests.get(f"{API_URL}/v1/hog/machine_details/371ee758-d4e6-11ee-a082-7e27a1187d3d", timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
+    measurement_id = response.json()['data'][0][6]
+
+    response = requests.get(f"{API_URL}/v1/hog/coalitions_tasks/371ee758-d4e6-11ee-a082-7e27a1187d3d/{measurement_id}/{measurement_id}", timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
+    coalition_name = response.json()['data'][0][0]
+    assert response.json()['energy_data'] is not None
+
+    response = requests.get(f"{API_URL}/v1/hog/tasks_details/371ee758-d4e6-11ee-a082-7e27a1187d3d/{measurement_id}/{measurement_id}/{coalition_name}", timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
+    assert response.json()['tasks_data'] != []
+
+
+def test_measurements_single_not_modified():
+    run_id = DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, start_measurement, end_measurement)
+        VALUES ('test', 'test', 'test', 'test', 'manual', 1, 100)
+        RETURNING id
+        """)[0]
+    DB().query("""
+        INSERT INTO phase_stats (run_id, metric, detail_name, phase, value, type, unit)
+        VALUES (%s, 'cpu_utilization_procfs_system', '[SYSTEM]', '004_[RUNTIME]', 50, 'MEAN', 'Ratio')
+        """, params=(run_id, ))
+    import_measurements(pandas.DataFrame({
+        'time': range(1, 100),
+        'value': range(1, 100),
+        'detail_name': '[SYSTEM]',
+        'unit': 'Ratio',
+        'metric': 'cpu_utilization_procfs_system',
+        'run_id': run_id,
+    }))
+
+    response = requests.get(f"{API_URL}/v1/measurements/single/{run_id}", timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
+    assert response.headers['Cache-Control'] == 'no-cache', Tests.assertion_info('no-cache', response.headers)
+    assert 'ETag' in response.headers and 'Last-Modified' in response.headers, Tests.assertion_info('validators', response.headers)
+
+    response = requests.get(f"{API_URL}/v1/measurements/single/{run_id}", headers={'If-None-Match': response.headers['ETag']}, timeout=15)
+    assert response.status_code == 304, Tests.assertion_info(304, response.status_code)
+    assert response.headers['Vary'] == 'Accept', Tests.assertion_info('Accept', response.headers)
+    assert response.headers['Cache-Control'] == 'no-cache', Tests.assertion_info('no-cache', response.headers)
+
+def test_warm_artifacts_requires_token():
+    run_id = DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email)
+        VALUES ('test', 'test', 'test', 'test', 'manual')
+        RETURNING id
+        """)[0]
+
+    response = requests.post(f"{API_URL}/v1/artifacts/warm/{run_id}", timeout=15)
+    assert response.status_code == 403, Tests.assertion_info(403, response.status_code)
+    response = requests.post(f"{API_URL}/v1/artifacts/warm/{run_id}", headers={'Authorization': 'Bearer wrong'}, timeout=15)
+    assert response.status_code == 403, Tests.assertion_info(403, response.status_code)
+
+    response = requests.post(f"{API_URL}/v1/artifacts/warm/{run_id}", headers={'Authorization': f"Bearer {config['cluster']['warm_token']}"}, timeout=15)
+    assert response.status_code == 200, Tests.assertion_info('success', response.text)
 
 def test_carbonDB_add():
     energydata = {
@@ -213,3 +291,24 @@ def test_carbonDB_add():
     data = DB().fetch_one('SELECT * FROM carbondb_energy_data', row_factory=psycopg.rows.dict_row)
     assert data is not None or data != []
     assert exp_data == {key: data[key] for key in exp_data if key in data}, "The specified keys do not have the same values in both dictionaries."
+
+def test_carbonDB_add_private_ip():
+    energydata = {
+        'type': 'machine.ci',
+        'energy_value': '1',
+        'time_stamp': str(int(time.time() * 1e6)),
+        'company': '',
+        'project': '',
+        'machine': 'f6d93b14-31c3-4565-9833-675371c67f2f',
+        'tags': ''
+    }
+
+    # Private ips are resolved to a fixed location that get_geo returns as strings
+    response = requests.post(f"{API_URL}/v1/carbondb/add", json=[energydata], headers={'X-Forwarded-For': '10.20.30.40'}, timeout=15)
+    assert response.status_code == 204, Tests.assertion_info('success', response.text)
+
+    data = DB().fetch_one('SELECT latitude, longitude, carbon_intensity, ip_address FROM carbondb_energy_data', row_factory=psycopg.rows.dict_row)
+    assert data['latitude'] == 52.53721666833642
+    assert data['longitude'] == 13.424863870661927
+    assert data['carbon_intensity'] == 1000.0
+    assert str(data['ip_address']) == '10.20.30.40'
@@ -1,3 +1,10 @@
+import asyncio
+import datetime
+import inspect
+import orjson
+import pytest
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel
 
 from api import api_helpers
@@ -55,3 +62,81 @@ def test_escape_measurement():
     escaped = api_helpers.html_escape_multi(measurement.model_copy())
 
     assert escaped.repo == escaped_repo
+
+def test_downsample_series_keeps_extremes():
+    values = [5] * 1000
+    values[123] = 100
+    values[777] = -100
+    rows = [('[SYSTEM]', time * 1000, 'cpu_utilization_procfs_system', value, 'Ratio') for time, value in enumerate(values)]
+
+    downsampled = api_helpers.downsample_series(rows, 100)
+
+    assert len(downsampled) <= 100
+    assert ('[SYSTEM]', 123000, 'cpu_utilization_procfs_system', 100, 'Ratio', 1000) in downsampled
+    assert ('[SYSTEM]', 777000, 'cpu_utilization_procfs_system', -100, 'Ratio', 1000) in downsampled
+    assert [row[1] for row in downsampled] == sorted(row[1] for row in downsampled)
+
+def test_downsample_series_shorter_than_points():
+    rows = [('[SYSTEM]', time, 'cpu_energy_rapl_msr_component', 10, 'mJ') for time in (0, 100, 300)]
+
+    assert api_helpers.downsample_series(rows, 100) == [(*row, interval) for row, interval in zip(rows, (0, 100, 200))]
+
+def test_columnar_encoder_splits_series_and_dictionaries():
+    encoder = api_helpers.ColumnarEncoder(['detail_name', 'time', 'metric', 'value', 'unit'], series_columns=('metric', 'detail_name'), dictionary_columns=('unit', ))
+
+    # The series of container-1 continues in the second batch
+    assert not encoder.add([('container-1', 1, 'cpu', 10, 'Ratio'), ('container-1', 2, 'cpu', 20, 'Ratio')])
+    encoded = encoder.add([('container-1', 3, 'cpu', 30, 'Ratio'), ('container-2', 1, 'cpu', 5, 'mRatio')])
+    last_series, dictionaries = encoder.finish()
+
+    assert [orjson.loads(series) for series in encoded + [last_series]] == [ # pylint: disable=no-member
+        {'detail_name': 'container-1', 'metric': 'cpu', 'time': [1, 2, 3], 'value': [10, 20, 30], 'unit': [0, 0, 0]},
+        {'detail_name': 'container-2', 'metric': 'cpu', 'time': [1], 'value': [5], 'unit': [1]},
+    ]
+    assert orjson.loads(dictionaries) == {'unit': ['Ratio', 'mRatio']} # pylint: disable=no-member
+
+def test_columnar_encoder_without_series_columns():
+    encoded = api_helpers.ColumnarEncoder(['value', 'label'], dictionary_columns=('label', )).encode([(1, 'Build'), (2, 'Test'), (3, 'Build')])
+
+    assert orjson.loads(encoded) == {'series': [{'value': [1, 2, 3], 'label': [0, 1, 0]}], 'dictionaries': {'label': ['Build', 'Test']}} # pylint: disable=no-member
+
+def test_is_columnar_requested():
+    def request(accept):
+        return Request({'type': 'http', 'headers': [(b'accept', accept.encode())]})
+
+    assert api_helpers.is_columnar_requested(request('application/json'), None) is False
+    assert api_helpers.is_columnar_requested(request(api_helpers.COLUMNAR_MEDIA_TYPE), None) is True
+    assert api_helpers.is_columnar_requested(request(api_helpers.COLUMNAR_MEDIA_TYPE), 'rows') is False
+    assert api_helpers.is_columnar_requested(request('application/json'), 'columnar') is True
+    with pytest.raises(RequestValidationError):
+        api_helpers.is_columnar_requested(request('application/json'), 'arrow')
+
+def test_is_not_modified():
+    def request(**headers):
+        return Request({'type': 'http', 'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()]})
+
+    etag = '"abc"'
+    last_modified = datetime.datetime(2024, 4, 25, 12, 0, 0, 500_000, tzinfo=datetime.timezone.utc)
+
+    assert api_helpers.is_not_modified(request(), etag, last_modified) is False
+    assert api_helpers.is_not_modified(request(if_none_match='"other", W/"abc"'), etag, last_modified) is True
+    assert api_helpers.is_not_modified(request(if_none_match='"other"'), etag, last_modified) is False
+    # If-None-Match takes precedence over If-Modified-Since
+    assert api_helpers.is_not_modified(request(if_none_match='"other"', if_modified_since='Thu, 25 Apr 2024 12:00:00 GMT'), etag, last_modified) is False
+    assert api_helpers.is_not_modified(request(if_modified_since='Thu, 25 Apr 2024 12:00:00 GMT'), etag, last_modified) is True
+    assert api_helpers.is_not_modified(request(if_modified_since='Thu, 25 Apr 2024 11:59:59 GMT'), etag, last_modified) is False
+    assert api_helpers.is_not_modified(request(if_modified_since='yesterday'), etag, last_modified) is False
+
+def test_cache_finished_run_adds_request_parameter():
+    async def get_run(run_id: str):
+        return run_id
+
+    route = api_helpers.cache_finished_run(get_run)
+
+    assert list(inspect.signature(route).parameters) == ['request', 'run_id']
+    # Direct calls without a request run the route as it is
+    assert asyncio.run(route('a-run')) == 'a-run'
+
+    route = api_helpers.cache_finished_run(headers={'Vary': 'Accept'})(get_run)
+    assert list(inspect.signature(route).parameters) == ['request', 'run_id']
+    assert asyncio.run(route('a-run')) == 'a-run'
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+
+from api.artifact_cache import LOCAL_TTL, ArtifactCache, ArtifactType, LRUCache, escape_pattern
+from lib.global_config import GlobalConfig
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+@pytest.fixture
+def local_cache():
+    redis_config = GlobalConfig().config['redis']
+    previous = dict(redis_config)
+    redis_config['host'] = None
+    if hasattr(ArtifactCache, 'instance'):
+        del ArtifactCache.instance
+    yield ArtifactCache()
+    del ArtifactCache.instance
+    redis_config.clear()
+    redis_config.update(previous)
+
+@pytest.fixture
+def unreachable_redis_cache():
+    redis_config = GlobalConfig().config['redis']
+    previous = dict(redis_config)
+    redis_config['host'] = '127.0.0.1'
+    if hasattr(ArtifactCache, 'instance'):
+        del ArtifactCache.instance
+    yield ArtifactCache()
+    asyncio.run(ArtifactCache().close())
+    del ArtifactCache.instance
+    redis_config.clear()
+    redis_config.update(previous)
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=10)
+    cache.set('a', 'aaaa', ttl=60)
+    cache.set('b', 'bbbb', ttl=60)
+    cache.get('a')
+    cache.set('c', 'cccc', ttl=60)
+
+    assert cache.get('b') is None, Tests.assertion_info('b evicted', cache.get('b'))
+    assert cache.get('a') == 'aaaa' and cache.get('c') == 'cccc', Tests.assertion_info('a and c kept', cache.get_stats())
+    assert cache.get_stats()['bytes'] == 8, Tests.assertion_info(8, cache.get_stats()['bytes'])
+
+    # Values larger than the cache are not kept at all
+    cache.set('d', 'd' * 11, ttl=60)
+    assert cache.get('d') is None and cache.get_stats()['entries'] == 2, Tests.assertion_info('d not stored', cache.get_stats())
+
+def test_lru_expires_entries(monkeypatch):
+    now = [1_000.0]
+    monkeypatch.setattr('api.artifact_cache.time.monotonic', lambda: now[0])
+    cache = LRUCache(max_bytes=100)
+    cache.set('badge', '<svg/>', ttl=60)
+
+    now[0] += 59
+    assert cache.get('badge') == '<svg/>', Tests.assertion_info('<svg/>', cache.get('badge'))
+    now[0] += 1
+    assert cache.get('badge') is None, Tests.assertion_info(None, cache.get('badge'))
+    assert cache.get_stats()['bytes'] == 0, Tests.assertion_info(0, cache.get_stats()['bytes'])
+
+def test_artifact_cache_without_redis(local_cache): # pylint: disable=redefined-outer-name
+    async def store_and_get():
+        miss = await local_cache.get(ArtifactType.STATS, 'run')
+        await local_cache.set(ArtifactType.STATS, 'run', b'{"a": 1}')
+        return miss, await local_cache.get(ArtifactType.STATS, 'run'), await local_cache.get(ArtifactType.COMPARE, 'run')
+
+    miss, hit, other_type = asyncio.run(store_and_get())
+
+    assert miss is None and other_type is None, Tests.assertion_info('misses', (miss, other_type))
+    assert hit == '{"a": 1}', Tests.assertion_info('{"a": 1}', hit)
+
+    stats = local_cache.get_stats()
+    assert stats['redis'] is False, Tests.assertion_info(False, stats['redis'])
+    assert stats['artifacts']['STATS'] == {'local_hits': 1, 'redis_hits': 0, 'misses': 1}, Tests.assertion_info('1 hit and 1 miss', stats['artifacts']['STATS'])
+
+def test_invalidate_matching_artifacts(local_cache): # pylint: disable=redefined-outer-name
+    uri = 'https://github.com/green-coding-solutions/[test]*'
+    keys = [f"{uri}_usage_scenario.yml_1_main_key_[COMPONENT]", f"{uri}_usage_scenario.yml_2_main_key_[COMPONENT]", f"{uri}x_usage_scenario.yml_1_main_key_[COMPONENT]"]
+
+    async def invalidate():
+        for key in keys:
+            await local_cache.set(ArtifactType.BADGE, key, '<svg/>')
+        await local_cache.set(ArtifactType.STATS, keys[0], '{}')
+        await local_cache.invalidate(ArtifactType.BADGE, f"{escape_pattern(uri)}_*_1_*")
+        return [await local_cache.get(ArtifactType.BADGE, key) for key in keys], await local_cache.get(ArtifactType.STATS, keys[0])
+
+    badges, stats = asyncio.run(invalidate())
+
+    # Only the badges of machine 1 of exactly this uri are gone
+    assert badges == [None, '<svg/>', '<svg/>'], Tests.assertion_info([None, '<svg/>', '<svg/>'], badges)
+    assert stats == '{}', Tests.assertion_info('other types kept', stats)
+
+def test_local_copies_expire_before_the_artifact(local_cache, monkeypatch): # pylint: disable=redefined-outer-name
+    now = [1_000.0]
+    monkeypatch.setattr('api.artifact_cache.time.monotonic', lambda: now[0])
+
+    asyncio.run(local_cache.set(ArtifactType.BADGE, 'badge', '<svg/>'))
+    now[0] += LOCAL_TTL
+
+    badge = asyncio.run(local_cache.get(ArtifactType.BADGE, 'badge'))
+    assert badge is None, Tests.assertion_info(f"expired after {LOCAL_TTL} s", badge)
+
+def test_listen_for_invalidations_subscribes_again(unreachable_redis_cache, monkeypatch): # pylint: disable=redefined-outer-name
+    delays = []
+    errors = []
+
+    async def sleep(delay):
+        delays.append(delay)
+        if len(delays) == 8:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr('api.artifact_cache.asyncio.sleep', sleep)
+    monkeypatch.setattr('api.artifact_cache.error_helpers.log_error', lambda *messages, **kwargs: errors.append(messages))
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(unreachable_redis_cache.listen_for_invalidations())
+
+    # Only stops when the worker does, with a growing delay between the attempts
+    assert delays == [1, 2, 4, 8, 16, 32, 60, 60], Tests.assertion_info([1, 2, 4, 8, 16, 32, 60, 60], delays)
+    assert len(errors) == 1, Tests.assertion_info('the first failure logged', errors)
@@ -0,0 +1,77 @@
+import pytest
+
+from lib.db import DB, LatencyHistogram, get_pool_config
+from lib.global_config import GlobalConfig
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+@pytest.fixture
+def pool_config():
+    postgresql = GlobalConfig().config['postgresql']
+    previous = postgresql.get('pool')
+    postgresql['pool'] = {'runner': {'max_size': 10, 'timeout': 5}}
+    yield postgresql['pool']
+    if previous is None:
+        del postgresql['pool']
+    else:
+        postgresql['pool'] = previous
+
+def test_pool_config_from_config(pool_config): # pylint: disable=unused-argument,redefined-outer-name
+    runner = get_pool_config('runner')
+    assert runner == {'min_size': 1, 'max_size': 10, 'timeout': 5}, Tests.assertion_info({'min_size': 1, 'max_size': 10, 'timeout': 5}, runner)
+
+    # roles that are not configured use the defaults
+    api = get_pool_config('api')
+    assert api == {'min_size': 1, 'max_size': 8}, Tests.assertion_info({'min_size': 1, 'max_size': 8}, api)
+
+def test_pool_config_unknown_setting(pool_config): # pylint: disable=redefined-outer-name
+    pool_config['runner']['max_connections'] = 10
+    with pytest.raises(ValueError) as err:
+        get_pool_config('runner')
+    assert "Unknown setting 'max_connections'" in str(err.value), Tests.assertion_info("Unknown setting 'max_connections'", str(err.value))
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for seconds in (0.0005, 0.003, 0.003, 0.2, 20):
+        histogram.add(seconds)
+
+    stats = histogram.get()
+    assert stats['count'] == 5, Tests.assertion_info(5, stats['count'])
+    assert stats['buckets']['le_1'] == 1, Tests.assertion_info(1, stats['buckets']['le_1'])
+    assert stats['buckets']['le_5'] == 3, Tests.assertion_info(3, stats['buckets']['le_5'])
+    assert stats['buckets']['le_250'] == 4, Tests.assertion_info(4, stats['buckets']['le_250'])
+    assert stats['buckets']['le_10000'] == 4 and stats['buckets']['le_inf'] == 5, Tests.assertion_info('20 s only in le_inf', stats['buckets'])
+    assert stats['max_ms'] == 20_000, Tests.assertion_info(20_000, stats['max_ms'])
+
+def test_pool_stats():
+    before = DB().get_stats()['checkout_latency']['count']
+    DB().fetch_one('SELECT 1')
+    stats = DB().get_stats()
+
+    assert stats['checkout_latency']['count'] == before + 1, Tests.assertion_info(before + 1, stats['checkout_latency']['count'])
+    assert stats['active'] == 0 and stats['idle'] == stats['connections'], Tests.assertion_info('all connections idle', stats)
+    assert stats['requests'] >= 1, Tests.assertion_info('at least one request', stats['requests'])
+
+def test_fetch_batches():
+    batches = list(DB().fetch_batches('SELECT generate_series(1, 25)', batch_size=10))
+
+    assert [len(batch) for batch in batches] == [10, 10, 5], Tests.assertion_info([10, 10, 5], [len(batch) for batch in batches])
+    assert [row[0] for batch in batches for row in batch] == list(range(1, 26)), Tests.assertion_info('1 to 25 in order', batches)
+
+def test_fetch_batches_returns_connection_when_closed():
+    batches = DB().fetch_batches('SELECT generate_series(1, 25)', batch_size=10)
+    next(batches)
+    batches.close() # like a client that disconnects during a streamed response
+
+    stats = DB().get_stats()
+    assert stats['active'] == 0, Tests.assertion_info(0, stats['active'])
+
+def test_transaction_rolls_back():
+    name = 'test_transaction_rolls_back'
+    with pytest.raises(RuntimeError):
+        with DB().transaction() as cur:
+            cur.execute("INSERT INTO categories (name) VALUES (%s)", (name, ))
+            raise RuntimeError('Aborted within the transaction')
+
+    assert DB().fetch_one('SELECT id FROM categories WHERE name = %s', (name, )) is None, Tests.assertion_info('no category', name)
@@ -0,0 +1,96 @@
+import datetime
+import pandas
+import psycopg
+import pytest
+
+from lib.db import DB
+from lib.global_config import GlobalConfig
+from lib.metric_importer import MEASUREMENTS_RUN_PARTITIONS, create_measurements_partition, get_measurements_partitions, get_next_month, import_measurements
+from tools.prune_db import detach_measurements_before
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+OLD_MONTH = datetime.date(2024, 1, 1)
+
+def insert_run(created_at=None):
+    return DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, created_at)
+        VALUES ('test', 'test', 'test', 'test', 'manual', COALESCE(%s, now()))
+        RETURNING id
+        """, params=(created_at, ))[0]
+
+def import_run_measurements(run_id, samples=100, metric='cpu_utilization_procfs_system'):
+    import_measurements(pandas.DataFrame({
+        'time': range(samples),
+        'value': range(samples),
+        'detail_name': '[SYSTEM]',
+        'unit': 'Ratio',
+        'metric': metric,
+        'run_id': run_id,
+    }))
+
+@pytest.fixture
+def old_run():
+    create_measurements_partition(OLD_MONTH)
+    run_id = insert_run(f"{OLD_MONTH} 12:00:00+00")
+    DB().query("""
+        INSERT INTO measurements (run_id, detail_name, metric, value, unit, time, created_at)
+        SELECT %s, '[SYSTEM]', 'cpu_utilization_procfs_system', value, 'Ratio', value, %s
+        FROM generate_series(1, 100) AS value
+        """, params=(run_id, f"{OLD_MONTH} 12:00:00+00"))
+    yield run_id
+    DB().query('DROP TABLE IF EXISTS measurements_2024_01')
+
+def test_import_creates_partitions():
+    import_run_measurements(insert_run())
+
+    month = datetime.datetime.now(datetime.timezone.utc).date().replace(day=1)
+    partitions = get_measurements_partitions()
+    assert month in partitions, Tests.assertion_info(f"partition of {month}", partitions)
+
+    run_partitions = DB().fetch_one("SELECT COUNT(*) FROM pg_inherits WHERE inhparent = %s::regclass", params=(partitions[month], ))[0]
+    assert run_partitions == MEASUREMENTS_RUN_PARTITIONS, Tests.assertion_info(MEASUREMENTS_RUN_PARTITIONS, run_partitions)
+
+def test_queries_of_a_run_skip_older_partitions(old_run): # pylint: disable=redefined-outer-name,unused-argument
+    run_id = insert_run()
+    import_run_measurements(run_id)
+
+    plan = [line for (line, ) in DB().fetch_all("""
+        EXPLAIN (ANALYZE, COSTS OFF, TIMING OFF)
+        SELECT * FROM measurements
+        WHERE run_id = %s AND created_at = (SELECT created_at FROM runs WHERE id = %s)
+        """, params=(run_id, run_id))]
+    scans = [line for line in plan if ' on measurements_' in line]
+
+    assert all('never executed' in line for line in scans if 'measurements_2024_01' in line), Tests.assertion_info('older month not read', plan)
+    # Only one of the run_id partitions of every month is in the plan
+    assert len(scans) == len(get_measurements_partitions()), Tests.assertion_info('one scan per month', plan)
+
+def test_import_uses_created_at_of_run(old_run): # pylint: disable=redefined-outer-name
+    # A run of an older month that is imported now still only fills the partition of its own month
+    import_run_measurements(old_run, metric='cpu_utilization_cgroup_container')
+
+    count = DB().fetch_one('SELECT COUNT(*) FROM measurements_2024_01 WHERE run_id = %s', params=(old_run, ))[0]
+    assert count == 200, Tests.assertion_info(200, count)
+    created_at = DB().fetch_all('SELECT DISTINCT measurements.created_at = runs.created_at FROM measurements JOIN runs ON runs.id = measurements.run_id')
+    assert created_at == [(True, )], Tests.assertion_info('created_at of the run', created_at)
+
+    # So measurements_get also catches measurements that are imported twice
+    with pytest.raises(psycopg.errors.UniqueViolation):
+        import_run_measurements(old_run, metric='cpu_utilization_cgroup_container')
+
+def test_detach_measurements_before(old_run): # pylint: disable=redefined-outer-name
+    run_id = insert_run()
+    import_run_measurements(run_id)
+
+    detached = detach_measurements_before(get_next_month(OLD_MONTH), keep_detached=True)
+
+    assert detached == ['measurements_2024_01'], Tests.assertion_info(['measurements_2024_01'], detached)
+    assert DB().fetch_one('SELECT id FROM runs WHERE id = %s', params=(old_run, )) is None, Tests.assertion_info('old run deleted', old_run)
+    # The detached table keeps the measurements of the deleted run
+    kept = DB().fetch_one('SELECT COUNT(*) FROM measurements_2024_01')[0]
+    assert kept == 100, Tests.assertion_info(100, kept)
+
+    count = DB().fetch_one('SELECT COUNT(*) FROM measurements WHERE run_id = %s', params=(run_id, ))[0]
+    assert count == 100, Tests.assertion_info(100, count)
@@ -0,0 +1,175 @@
+import json
+import numpy
+import pandas
+
+from lib.db import DB
+from lib.global_config import GlobalConfig
+from lib.metric_importer import import_measurements
+from tools.phase_stats import AGGREGATION_RULES, PHASE_STATISTICS, PhaseStatsCollector, PhaseStatsRows, aggregation_rule, build_phase_stats, get_phase_aggregates, integrate_energy
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+START = 1_700_000_000_000_000
+RESOLUTION = 99_000
+
+SERIES = [
+    ('cpu_utilization_procfs_system', 'Ratio', '[SYSTEM]', (0, 10_000)),
+    ('cpu_utilization_cgroup_container', 'Ratio', 'container-1', (0, 10_000)),
+    ('cpu_utilization_cgroup_container', 'Ratio', 'container-2', (0, 10_000)),
+    ('network_io_cgroup_container', 'Bytes', 'container-1', (0, 1_000)),
+    ('cpu_energy_rapl_msr_component', 'mJ', 0, (500, 5_000)), # numeric package_id as detail_name
+    ('psu_energy_ac_mcp_machine', 'mJ', '[machine]', (1_000, 10_000)),
+    ('memory_total_cgroup_container', 'Bytes', 'container-1', (10_000_000, 500_000_000)),
+]
+
+def insert_run(samples):
+    phase_duration = samples * RESOLUTION // 5
+    phases = [{'start': START + i * phase_duration, 'end': START + (i + 1) * phase_duration, 'name': name} for i, name in enumerate(['[BASELINE]', '[BOOT]', '[IDLE]', '[RUNTIME]', '[REMOVE]'])]
+    # A flow within [RUNTIME] and a phase without any measurements
+    phases.insert(4, {'start': phases[3]['start'], 'end': phases[3]['start'] + phase_duration // 2, 'name': 'Flow 1'})
+    phases.insert(5, {'start': phases[3]['start'] + 10, 'end': phases[3]['start'] + 20, 'name': 'Flow 2'})
+
+    run_id = DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, phases)
+        VALUES ('test', 'test', 'test', 'test', 'manual', %s)
+        RETURNING id
+        """, params=(json.dumps(phases), ))[0]
+    return run_id, phases
+
+def generate_measurements(run_id, samples):
+    rng = numpy.random.default_rng(42)
+    dfs = []
+    for metric, unit, detail_name, (low, high) in SERIES:
+        values = rng.integers(low, high, samples, dtype='int64')
+        if metric == 'network_io_cgroup_container':
+            values = numpy.cumsum(values) # accumulating
+        dfs.append(pandas.DataFrame({
+            'time': START + numpy.arange(samples, dtype='int64') * RESOLUTION,
+            'value': values,
+            'detail_name': detail_name,
+            'unit': unit,
+            'metric': metric,
+            'run_id': run_id,
+        }))
+    return pandas.concat(dfs, ignore_index=True)
+
+# AVG and the statistics are floating point and only equal after rounding
+def exact_aggregates(phase_aggregates):
+    return [[aggregates[:6] + aggregates[7:8] for aggregates in phase] for phase in phase_aggregates]
+
+
+def test_in_process_phase_stats_equal_db_phase_stats():
+    run_id, phases = insert_run(5_000)
+    df = generate_measurements(run_id, 5_000)
+
+    collector = PhaseStatsCollector()
+    # The frames arrive in chunks and not ordered by time, like from the parallel import workers
+    df = df.sample(frac=1, random_state=1)
+    for start in range(0, df.shape[0], 5_000):
+        chunk = df.iloc[start:start + 5_000]
+        import_measurements(chunk)
+        collector.add(chunk)
+
+    expected = build_phase_stats(run_id, phases, get_phase_aggregates(run_id, phases), sci={'R_d': 'page request', 'R': 10})
+    actual = build_phase_stats(run_id, phases, collector.get_phase_aggregates(phases), sci={'R_d': 'page request', 'R': 10})
+
+    assert len(expected) > len(phases) * len(SERIES), Tests.assertion_info(f"more than {len(phases) * len(SERIES)} rows", len(expected))
+    assert actual == expected, Tests.assertion_info(expected, actual)
+
+def test_in_process_phase_stats_exclude_phase_borders():
+    run_id, phases = insert_run(5_000)
+    df = generate_measurements(run_id, 5_000)
+    # One measurement exactly on the start of every phase. Flow 1 starts together with [RUNTIME]
+    borders = pandas.DataFrame({'time': sorted({phase['start'] for phase in phases}), 'value': 1_000_000, 'detail_name': '[machine]', 'unit': 'mJ', 'metric': 'psu_energy_ac_mcp_machine', 'run_id': run_id})
+    df = pandas.concat([df[~df.time.isin(borders.time)], borders], ignore_index=True)
+
+    collector = PhaseStatsCollector()
+    import_measurements(df)
+    collector.add(df)
+
+    expected = get_phase_aggregates(run_id, phases)
+    actual = collector.get_phase_aggregates(phases)
+
+    # The AVG of PostgreSQL is rounded to less digits than the Decimal division. Only the rounded phase stats must be equal
+    assert exact_aggregates(actual) == exact_aggregates(expected), Tests.assertion_info(exact_aggregates(expected), exact_aggregates(actual))
+    assert build_phase_stats(run_id, phases, actual) == build_phase_stats(run_id, phases, expected)
+
+def test_phase_stats_have_statistics():
+    run_id, phases = insert_run(5_000)
+    df = generate_measurements(run_id, 5_000)
+    import_measurements(df)
+
+    phase_stats = build_phase_stats(run_id, phases, get_phase_aggregates(run_id, phases))
+    runtime = df[(df.time > phases[3]['start']) & (df.time < phases[3]['end']) & (df.metric == 'cpu_utilization_procfs_system')].value
+
+    row = next(row for row in phase_stats if row[1] == 'cpu_utilization_procfs_system' and row[3] == '003_[RUNTIME]')
+    expected = {'p50': round(runtime.quantile(0.5)), 'p95': round(runtime.quantile(0.95)), 'p99': round(runtime.quantile(0.99)), 'stddev': round(runtime.std(ddof=0))}
+    assert row[9] == expected, Tests.assertion_info(expected, row[9])
+
+    # accumulating metrics and the derived CO2 have no statistics
+    counter = next(row for row in phase_stats if row[1] == 'network_io_cgroup_container')
+    assert counter[9] is None, Tests.assertion_info(None, counter[9])
+    power = next(row for row in phase_stats if row[1] == 'psu_power_ac_mcp_machine')
+    assert set(PHASE_STATISTICS) <= set(power[9]), Tests.assertion_info(list(PHASE_STATISTICS), power[9])
+
+def test_aggregation_rule_registry():
+    run_id, phases = insert_run(1_000)
+    df = generate_measurements(run_id, 1_000)
+    import_measurements(df)
+
+    @aggregation_rule(lambda metric, unit: metric == 'memory_total_cgroup_container')
+    def peak_rule(aggregates, duration): # pylint: disable=unused-argument
+        return [PhaseStatsRows(aggregates['metric'], aggregates['detail_name'], aggregates['max'], 'PEAK', None, None, aggregates['unit'])]
+
+    # Registered rules are matched after the existing ones, so the new rule must come first to take over a metric
+    AGGREGATION_RULES.insert(0, AGGREGATION_RULES.pop())
+    try:
+        phase_stats = build_phase_stats(run_id, phases, get_phase_aggregates(run_id, phases))
+    finally:
+        AGGREGATION_RULES.pop(0)
+
+    memory = [row for row in phase_stats if row[1] == 'memory_total_cgroup_container']
+    assert len(memory) == len(phases) - 1, Tests.assertion_info(f"{len(phases) - 1} rows", len(memory)) # Flow 2 has no measurements
+    assert all(row[5] == 'PEAK' and row[6] is None for row in memory), Tests.assertion_info('PEAK rows', memory)
+
+def test_integrate_energy_splits_border_samples():
+    # 100 mJ every 100 ms, except one sample of 300 mJ over 50 ms
+    times = numpy.array([0, 100_000, 200_000, 300_000, 350_000, 450_000], dtype=numpy.int64)
+    values = numpy.array([100, 100, 100, 100, 300, 100], dtype=numpy.int64)
+    starts = numpy.array([150_000, 0, 500_000, 320_000], dtype=numpy.int64)
+    ends = numpy.array([400_000, 450_000, 600_000, 330_000], dtype=numpy.int64)
+
+    energy, power_max, power_min = integrate_energy(times, values, starts, ends)
+
+    # Half of the sample at 200 ms, the 100 mJ sample at 300 ms, the 300 mJ sample and half of the sample at 450 ms
+    assert energy[0] == 50 + 100 + 300 + 50, Tests.assertion_info(500, energy[0])
+    # The first sample is dropped, as the start of its interval is unknown
+    assert energy[1] == 700, Tests.assertion_info(700, energy[1])
+    # No sample overlaps a phase after the measurements
+    assert numpy.isnan(energy[2]) and numpy.isnan(power_max[2]), Tests.assertion_info('NaN', energy[2])
+    # A phase within a single sample gets its share
+    assert energy[3] == 60, Tests.assertion_info(60, energy[3])
+
+    assert power_max[0] == 6_000 and power_min[0] == 1_000, Tests.assertion_info('6000 and 1000 mW', (power_max[0], power_min[0]))
+    assert power_max[3] == power_min[3] == 6_000, Tests.assertion_info('6000 mW', (power_max[3], power_min[3]))
+
+def test_phase_stats_have_integrated_energy():
+    run_id, phases = insert_run(5_000)
+    df = generate_measurements(run_id, 5_000)
+    import_measurements(df)
+
+    phase_stats = build_phase_stats(run_id, phases, get_phase_aggregates(run_id, phases))
+    energy = next(row for row in phase_stats if row[1] == 'psu_energy_ac_mcp_machine' and row[3] == '003_[RUNTIME]')
+    power = next(row for row in phase_stats if row[1] == 'psu_power_ac_mcp_machine' and row[3] == '003_[RUNTIME]')
+
+    # The samples are evenly spaced, so the phase contains the same energy in both approaches apart from the split border samples
+    assert abs(energy[9]['integrated_value'] - energy[4]) <= 10_000, Tests.assertion_info(energy[4], energy[9]['integrated_value'])
+    # The power of every sample is its energy over its own interval. The samples at the borders overlap the phase as well
+    machine = df[(df.metric == 'psu_energy_ac_mcp_machine') & (df.time > phases[3]['start']) & (df.time - RESOLUTION < phases[3]['end'])].value
+    assert power[9]['integrated_max_value'] == round(machine.max() * 10**6 / RESOLUTION), Tests.assertion_info(round(machine.max() * 10**6 / RESOLUTION), power[9]['integrated_max_value'])
+    assert power[9]['integrated_min_value'] == round(machine.min() * 10**6 / RESOLUTION), Tests.assertion_info(round(machine.min() * 10**6 / RESOLUTION), power[9]['integrated_min_value'])
+
+    # Metrics that are not energy have no integration
+    cpu = next(row for row in phase_stats if row[1] == 'cpu_utilization_procfs_system')
+    assert 'integrated_value' not in cpu[9], Tests.assertion_info('no integrated_value', cpu[9])
@@ -0,0 +1,87 @@
+import os
+import numpy
+import pandas
+import pytest
+
+from lib.global_config import GlobalConfig
+from metric_providers.cpu.utilization.cgroup.container.provider import CpuUtilizationCgroupContainerProvider
+from metric_providers.cpu.utilization.procfs.system.provider import CpuUtilizationProcfsSystemProvider
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+CONTAINERS = {'abc123': {'name': 'test-container-1'}, 'def456': {'name': 'test-container-2'}}
+
+# Same layout as the records written by metric_providers/binary_output.h
+RECORD_DTYPE = numpy.dtype([('time', '=i8'), ('value', '=i8'), ('id', 'S64')])
+
+def write_logs(text_provider, binary_provider, rows):
+    records = numpy.zeros(rows, dtype=RECORD_DTYPE)
+    records['time'] = 1_700_000_000_000_000 + numpy.arange(rows) * 99_000
+    records['value'] = numpy.arange(rows) % 10_000
+    records['id'] = numpy.where(numpy.arange(rows) % 2, b'abc123', b'def456')
+
+    with open(text_provider._filename, 'w', encoding='utf-8') as file:
+        for record in records:
+            file.write(f"{record['time']} {record['value']} {record['id'].decode()}\n")
+    with open(binary_provider._filename, 'wb') as file:
+        file.write(records.tobytes())
+
+@pytest.fixture(name='providers')
+def providers_fixture():
+    # Both providers have the same metric name and thus the same log file. So we move the text log aside
+    text_provider = CpuUtilizationCgroupContainerProvider(99, skip_check=True)
+    text_provider._filename = f"{text_provider._filename}.txt"
+    binary_provider = CpuUtilizationCgroupContainerProvider(99, skip_check=True, binary_output=True)
+    write_logs(text_provider, binary_provider, 1000)
+    yield text_provider, binary_provider
+    os.remove(text_provider._filename)
+    os.remove(binary_provider._filename)
+
+
+def test_binary_read_metrics_equals_text(providers):
+    text_provider, binary_provider = providers
+
+    expected = text_provider.read_metrics('test-run', CONTAINERS)
+    actual = binary_provider.read_metrics('test-run', CONTAINERS)
+
+    assert actual.shape[0] == 1000, Tests.assertion_info(1000, actual.shape[0])
+    pandas.testing.assert_frame_equal(expected, actual)
+
+def test_binary_stream_metrics_only_reads_complete_records(providers):
+    _, binary_provider = providers
+
+    chunks = list(binary_provider.iter_metrics('test-run', CONTAINERS, chunk_size=1000))
+    assert len(chunks) == 84, Tests.assertion_info(84, len(chunks)) # 12 records of 80 bytes fit into one chunk
+    assert sum(df.shape[0] for df in chunks) == 1000
+
+    record = numpy.zeros(1, dtype=RECORD_DTYPE)
+    record['time'] = 1_700_000_099_000_000
+    record['value'] = 42
+    record['id'] = b'abc123'
+    with open(binary_provider._filename, 'ab') as file:
+        file.write(record.tobytes()[:50])
+
+    assert binary_provider.stream_metrics('test-run', CONTAINERS) is None
+
+    with open(binary_provider._filename, 'ab') as file:
+        file.write(record.tobytes()[50:])
+
+    df = binary_provider.stream_metrics('test-run', CONTAINERS)
+    assert df.shape[0] == 1, Tests.assertion_info(1, df.shape[0])
+    assert df['value'].iloc[0] == 42, Tests.assertion_info(42, df['value'].iloc[0])
+    assert df['detail_name'].iloc[0] == 'test-container-1', Tests.assertion_info('test-container-1', df['detail_name'].iloc[0])
+
+def test_binary_records_without_id():
+    provider = CpuUtilizationProcfsSystemProvider(99, skip_check=True, binary_output=True)
+    records = numpy.zeros(10, dtype=[('time', '=i8'), ('value', '=i8')])
+    records['time'] = numpy.arange(10) * 99_000
+    records['value'] = 5000
+    with open(provider._filename, 'wb') as file:
+        file.write(records.tobytes())
+
+    df = provider.read_metrics('test-run')
+    os.remove(provider._filename)
+
+    assert df.shape[0] == 10, Tests.assertion_info(10, df.shape[0])
+    assert (df['detail_name'] == '[system]').all(), Tests.assertion_info('[system]', df['detail_name'].unique())
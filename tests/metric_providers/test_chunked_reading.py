@@ -0,0 +1,77 @@
+import os
+import pandas
+import pytest
+
+from lib.global_config import GlobalConfig
+from metric_providers.cpu.utilization.cgroup.container.provider import CpuUtilizationCgroupContainerProvider
+from metric_providers.psu.energy.ac.ipmi.machine.provider import PsuEnergyAcIpmiMachineProvider
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+CONTAINERS = {'abc123': {'name': 'test-container-1'}, 'def456': {'name': 'test-container-2'}}
+
+@pytest.fixture(name='container_provider')
+def container_provider_fixture():
+    provider = CpuUtilizationCgroupContainerProvider(99, skip_check=True)
+    with open(provider._filename, 'w', encoding='utf-8') as file:
+        for i in range(1000):
+            file.write(f"{1_700_000_000_000_000 + i * 99_000} {i % 10_000} {'abc123' if i % 2 else 'def456'}\n")
+        file.write('1700000099000000 12') # broken last line that must be ignored
+    yield provider
+    os.remove(provider._filename)
+
+@pytest.fixture(name='ipmi_provider')
+def ipmi_provider_fixture():
+    provider = PsuEnergyAcIpmiMachineProvider(99, skip_check=True)
+    with open(provider._filename, 'w', encoding='utf-8') as file:
+        for i in range(1000):
+            file.write(f"{1_700_000_000_000_000 + i * 99_000 + (i % 7) * 1_000} {100 + i % 50}\n")
+    yield provider
+    os.remove(provider._filename)
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1000, 4_194_304])
+def test_iter_metrics_equals_read_metrics(container_provider, chunk_size):
+    expected = container_provider.read_metrics('test-run', CONTAINERS)
+    chunks = list(container_provider.iter_metrics('test-run', CONTAINERS, chunk_size=chunk_size))
+    actual = pandas.concat(chunks, ignore_index=True)
+
+    assert actual.shape[0] == 1000, Tests.assertion_info(1000, actual.shape[0])
+    pandas.testing.assert_frame_equal(expected, actual)
+
+def test_stream_metrics_only_reads_complete_lines(container_provider):
+    rows = sum(df.shape[0] for df in container_provider.iter_metrics('test-run', CONTAINERS))
+    assert rows == 1000, Tests.assertion_info(1000, rows)
+
+    # Nothing new was written, so there is nothing to stream
+    assert container_provider.stream_metrics('test-run', CONTAINERS) is None
+
+    with open(container_provider._filename, 'a', encoding='utf-8') as file:
+        file.write('3456 abc123\n1700000099099000 42 abc123\n')
+
+    df = container_provider.stream_metrics('test-run', CONTAINERS)
+    assert df.shape[0] == 2, Tests.assertion_info(2, df.shape[0])
+    assert df['detail_name'].iloc[1] == 'test-container-1', Tests.assertion_info('test-container-1', df['detail_name'].iloc[1])
+
+def test_stream_metrics_line_longer_than_chunk(container_provider):
+    with pytest.raises(RuntimeError) as err:
+        container_provider.stream_metrics('test-run', CONTAINERS, chunk_size=10)
+    assert 'is longer than the chunk size' in str(err.value), Tests.assertion_info('is longer than the chunk size', str(err.value))
+
+def test_energy_conversion_is_chunk_independent(ipmi_provider):
+    expected = pandas.concat(list(ipmi_provider.iter_metrics('test-run', chunk_size=4_194_304)), ignore_index=True)
+
+    ipmi_provider._stream_offset = 0
+    ipmi_provider._previous_time = None
+    actual = pandas.concat(list(ipmi_provider.iter_metrics('test-run', chunk_size=100)), ignore_index=True)
+
+    pandas.testing.assert_frame_equal(expected, actual)
+
+def test_first_interval_is_resolution(ipmi_provider):
+    # A chunk with only the first line, like streaming can read it
+    df = ipmi_provider.stream_metrics('test-run', chunk_size=30)
+
+    assert df.shape[0] == 1, Tests.assertion_info(1, df.shape[0])
+    # 100 W for the 99 ms of the resolution
+    assert df['value'].iloc[0] == 9, Tests.assertion_info(9, df['value'].iloc[0])
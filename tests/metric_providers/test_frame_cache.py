@@ -0,0 +1,52 @@
+import os
+import pytest
+
+from lib.global_config import GlobalConfig
+from lib.metric_importer import MetricFrameCache
+from metric_providers.cpu.utilization.procfs.system.provider import CpuUtilizationProcfsSystemProvider
+from metric_providers.psu.energy.ac.sdia.machine.provider import PsuEnergyAcSdiaMachineProvider
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+@pytest.fixture(name='utilization_provider')
+def utilization_provider_fixture():
+    provider = CpuUtilizationProcfsSystemProvider(99, skip_check=True)
+    with open(provider._filename, 'w', encoding='utf-8') as file:
+        for i in range(1000):
+            file.write(f"{1_700_000_000_000_000 + i * 100_000} {i % 10_000}\n")
+    yield provider
+    os.remove(provider._filename)
+
+def test_cache_only_keeps_requested_metrics(utilization_provider):
+    frame_cache = MetricFrameCache(['cpu_utilization_procfs_system'])
+
+    for df in utilization_provider.iter_metrics('test-run', chunk_size=1000):
+        frame_cache.add('cpu_utilization_procfs_system', df)
+        frame_cache.add('cpu_utilization_cgroup_container', df)
+
+    assert frame_cache.get('cpu_utilization_procfs_system').shape[0] == 1000, Tests.assertion_info(1000, frame_cache.get('cpu_utilization_procfs_system').shape[0])
+    assert frame_cache.get('cpu_utilization_cgroup_container') is None, Tests.assertion_info(None, frame_cache.get('cpu_utilization_cgroup_container'))
+
+def test_derived_provider_reads_source_frame(utilization_provider):
+    sdia_provider = PsuEnergyAcSdiaMachineProvider(resolution=99, CPUChips=1, TDP=65, skip_check=True)
+    frame_cache = MetricFrameCache(sdia_provider.get_source_metrics())
+    sdia_provider.set_frame_cache(frame_cache)
+
+    for df in utilization_provider.iter_metrics('test-run', chunk_size=1000):
+        frame_cache.add('cpu_utilization_procfs_system', df)
+
+    df = sdia_provider.read_metrics('test-run')
+
+    assert df.shape[0] == 1000, Tests.assertion_info(1000, df.shape[0])
+    # 5% utilization for 100 ms with a TDP of 65 W => 0.05 * 65 W / 0.65 * 0.1 s = 500 mJ
+    assert df['value'].iloc[500] == 500, Tests.assertion_info(500, df['value'].iloc[500])
+    assert (df['metric'] == 'psu_energy_ac_sdia_machine').all()
+
+def test_derived_provider_without_source_frame():
+    sdia_provider = PsuEnergyAcSdiaMachineProvider(resolution=99, CPUChips=1, TDP=65, skip_check=True)
+    sdia_provider.set_frame_cache(MetricFrameCache(sdia_provider.get_source_metrics()))
+
+    with pytest.raises(RuntimeError) as err:
+        sdia_provider.read_metrics('test-run')
+    assert 'cpu_utilization_procfs_system' in str(err.value), Tests.assertion_info('cpu_utilization_procfs_system', str(err.value))
@@ -0,0 +1,90 @@
+import os
+import plistlib
+from datetime import timezone
+import numpy
+import pandas
+import pytest
+
+from lib.global_config import GlobalConfig
+from lib.powermetrics_decoder import PowermetricsDecoder, iter_raw_samples
+from metric_providers.powermetrics.provider import PowermetricsProvider
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = [os.path.join(CURRENT_DIR, '../data/powermetrics/apple_silicon.plist'), os.path.join(CURRENT_DIR, '../data/powermetrics/intel.plist')]
+
+# Decodes the samples one by one with plistlib, like the provider did before the decoder existed
+def reference_rows(filename):
+    with open(filename, 'rb') as file:
+        samples = [plistlib.loads(data) for data in file.read().split(b'\x00')]
+
+    rows = []
+    cum_time = int(samples[0]['timestamp'].replace(tzinfo=timezone.utc).timestamp() * 1e9)
+    for data in samples:
+        cum_time = cum_time + data['elapsed_ns']
+        conversion_factor = data['elapsed_ns'] / 1_000_000_000
+        docker_task = next((i for i in data['coalitions'] if i['name'] == 'com.docker.docker'), None)
+        if docker_task is not None:
+            rows.append([cum_time // 1_000, docker_task['cputime_ns'], 'cpu_time_powermetrics_vm'])
+            rows.append([cum_time // 1_000, docker_task['diskio_bytesread'], 'disk_io_bytesread_powermetrics_vm'])
+            rows.append([cum_time // 1_000, docker_task['diskio_byteswritten'], 'disk_io_byteswritten_powermetrics_vm'])
+            rows.append([cum_time // 1_000, int(docker_task['energy_impact']), 'energy_impact_powermetrics_vm'])
+        if 'cpu_power' in data['processor']:
+            rows.append([cum_time // 1_000, int(float(data['processor']['cpu_power']) * conversion_factor), 'cores_energy_powermetrics_component'])
+        if 'package_joules' in data['processor']:
+            rows.append([cum_time // 1_000, int(float(data['processor']['package_joules']) * 1000), 'cpu_energy_powermetrics_component'])
+        if 'gpu_power' in data['processor']:
+            rows.append([cum_time // 1_000, int(float(data['processor']['gpu_power']) * conversion_factor), 'gpu_energy_powermetrics_component'])
+        if 'ane_power' in data['processor']:
+            rows.append([cum_time // 1_000, int(float(data['processor']['ane_power']) * conversion_factor), 'ane_energy_powermetrics_component'])
+    return rows
+
+
+@pytest.mark.parametrize('filename', FIXTURES)
+def test_parse_metrics_equals_sample_by_sample_parsing(filename):
+    provider = PowermetricsProvider(99, skip_check=True)
+    df = provider._parse_metrics(PowermetricsDecoder().decode_file(filename).get_arrays(), 'test-run')
+
+    expected = reference_rows(filename)
+    actual = df[['time', 'value', 'metric']].values.tolist()
+    assert actual == expected, Tests.assertion_info(expected[:3], actual[:3])
+
+def test_decode_file_in_process_pool():
+    expected = PowermetricsDecoder().decode_file(FIXTURES[0]).get_arrays()
+    # A small batch size makes sure that the samples are spread over more batches than there are workers
+    actual = PowermetricsDecoder(capacity=1).decode_file(FIXTURES[0], processes=2, batch_size=3).get_arrays()
+
+    for field, values in expected.items():
+        numpy.testing.assert_array_equal(values, actual[field], err_msg=field)
+
+def test_raw_samples_are_split_across_blocks():
+    with open(FIXTURES[1], 'rb') as file:
+        expected = file.read().split(b'\x00')
+        file.seek(0)
+        actual = list(iter_raw_samples(file, block_size=1000))
+
+    assert actual == expected, Tests.assertion_info(len(expected), len(actual))
+
+def test_decoded_samples_equal_raw_samples():
+    # The hog sends the samples already decoded, which must result in the same arrays
+    with open(FIXTURES[0], 'rb') as file:
+        samples = [plistlib.loads(data) for data in file.read().split(b'\x00')]
+
+    decoder = PowermetricsDecoder()
+    for sample in samples:
+        decoder.add_sample(sample)
+
+    expected = PowermetricsDecoder().decode_file(FIXTURES[0]).get_arrays()
+    actual = decoder.get_arrays()
+    for field, values in expected.items():
+        numpy.testing.assert_array_equal(values, actual[field], err_msg=field)
+
+    # docker is not running in every 5th sample
+    assert numpy.isnan(actual['docker_cputime_ns']).sum() == 4, Tests.assertion_info(4, numpy.isnan(actual['docker_cputime_ns']).sum())
+
+def test_parse_metrics_without_samples():
+    provider = PowermetricsProvider(99, skip_check=True)
+    df = provider._parse_metrics(PowermetricsDecoder().get_arrays(), 'test-run')
+    assert isinstance(df, pandas.DataFrame) and df.empty
@@ -0,0 +1,35 @@
+import os
+import pandas
+import pytest
+
+from lib.global_config import GlobalConfig
+from metric_providers.synthetic.energy.machine.provider import SyntheticEnergyMachineProvider
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+def generate(provider):
+    provider.start_profiling()
+    provider._ps.wait()
+    provider.stop_profiling()
+    df = provider.read_metrics('test-run')
+    os.remove(provider._filename)
+    return df
+
+@pytest.mark.parametrize('detail_names', [0, 3])
+def test_synthetic_provider_output(detail_names):
+    df = generate(SyntheticEnergyMachineProvider(100, detail_names=detail_names, duration=2))
+
+    expected_rows = 20 * max(detail_names, 1)
+    assert df.shape[0] == expected_rows, Tests.assertion_info(expected_rows, df.shape[0])
+    assert (df.groupby('detail_name')['time'].diff().dropna() == 100_000).all(), 'Samples are not spaced by the resolution'
+
+    expected_detail_names = [f"synthetic-{i}" for i in range(detail_names)] if detail_names else ['[machine]']
+    assert sorted(df.detail_name.unique()) == expected_detail_names, Tests.assertion_info(expected_detail_names, df.detail_name.unique())
+
+def test_synthetic_provider_binary_output_equals_text_output():
+    expected = generate(SyntheticEnergyMachineProvider(100, detail_names=3, duration=2))
+    actual = generate(SyntheticEnergyMachineProvider(100, detail_names=3, duration=2, binary_output=True))
+
+    # The timestamps start at the time the provider was started
+    pandas.testing.assert_frame_equal(expected.drop(columns='time'), actual.drop(columns='time'))
@@ -0,0 +1,69 @@
+import json
+import subprocess
+
+from lib.db import DB
+from lib.global_config import GlobalConfig
+from tools.machine import Machine
+from tools.rebuild_phase_stats import get_runs, get_unfinished_runs, rebuild_phase_stats
+from tests import test_functions as Tests
+
+GlobalConfig().override_config(config_name='test-config.yml')
+
+PHASES = [{'start': 1_700_000_000_000_000, 'end': 1_700_000_001_000_000, 'name': '[RUNTIME]'}]
+
+def get_gmt_hash(revision):
+    return subprocess.check_output(['git', 'rev-parse', revision], encoding='UTF-8').strip()
+
+def insert_run(machine_id=1, created_at='2024-04-10 12:00:00+00', gmt_hash=None, phases=None, finished=True):
+    return str(DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, machine_id, created_at, gmt_hash, phases, end_measurement)
+        VALUES ('test', 'test', 'test', 'test', 'manual', %s, %s, %s, %s, %s)
+        RETURNING id
+        """, params=(machine_id, created_at, gmt_hash, json.dumps(phases or PHASES), 1 if finished else None))[0])
+
+def test_get_runs_filters():
+    Machine(machine_id=1, description='test-machine-1').register()
+    Machine(machine_id=2, description='test-machine-2').register()
+
+    old_run = insert_run(created_at='2024-03-01 12:00:00+00', gmt_hash=get_gmt_hash('HEAD~1'))
+    new_run = insert_run(created_at='2024-04-01 12:00:00+00', gmt_hash=get_gmt_hash('HEAD'))
+    other_machine_run = insert_run(machine_id=2, created_at='2024-05-01 12:00:00+00')
+    insert_run(finished=False)
+
+    runs = get_runs()
+    assert runs == [old_run, new_run, other_machine_run], Tests.assertion_info('all finished runs by created_at', runs)
+
+    runs = get_runs(machine_ids=[2])
+    assert runs == [other_machine_run], Tests.assertion_info([other_machine_run], runs)
+
+    runs = get_runs(start_date='2024-03-15', end_date='2024-05-01')
+    assert runs == [new_run], Tests.assertion_info([new_run], runs)
+
+    # Runs without a gmt_hash are from before it was stored and thus older as well
+    runs = get_runs(older_than_gmt_hash=get_gmt_hash('HEAD'))
+    assert runs == [old_run, other_machine_run], Tests.assertion_info([old_run, other_machine_run], runs)
+
+def test_resume_skips_finished_and_retries_failed_runs(tmp_path):
+    Machine(machine_id=1, description='test-machine-1').register()
+    checkpoint_file = tmp_path / 'rebuild_phase_stats.checkpoint'
+
+    run = insert_run()
+    failing_run = insert_run(phases=[{'name': '[RUNTIME]'}]) # phase without start and end
+    DB().query("""
+        INSERT INTO phase_stats (run_id, metric, detail_name, phase, value, type, unit)
+        VALUES (%s, 'software_carbon_intensity_global', '[SYSTEM]', '000_[RUNTIME]', 42, 'TOTAL', 'ugCO2e/request')
+        """, params=(run, ))
+
+    failed_runs = rebuild_phase_stats([run, failing_run], 1, checkpoint_file)
+
+    assert failed_runs == [failing_run], Tests.assertion_info([failing_run], failed_runs)
+    assert get_unfinished_runs([run, failing_run], checkpoint_file) == [failing_run], Tests.assertion_info('only the failed run', checkpoint_file.read_text(encoding='utf-8'))
+
+    phase_stats = dict(DB().fetch_all('SELECT metric, value FROM phase_stats WHERE run_id = %s', params=(run, )))
+    assert 'phase_time_syscall_system' in phase_stats, Tests.assertion_info('rebuilt phase stats', phase_stats)
+    # R is not stored, so the SCI cannot be recalculated and is kept
+    assert phase_stats['software_carbon_intensity_global'] == 42, Tests.assertion_info(42, phase_stats)
+
+def test_get_unfinished_runs_without_checkpoint(tmp_path):
+    runs = get_unfinished_runs(['a', 'b'], tmp_path / 'missing.checkpoint')
+    assert runs == ['a', 'b'], Tests.assertion_info(['a', 'b'], runs)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import faulthandler
+faulthandler.enable()  # will catch segfaults and write to stderr
+
+import time
+import uuid
+from io import StringIO
+
+import numpy as np
+import pandas
+
+from lib.db import DB
+
+# Compares the text CSV COPY that was used to import the metric provider DataFrames with the binary COPY.
+# The rows are written to an UNLOGGED copy of the measurements table that is dropped afterwards.
+# The time includes the serialization of the DataFrame, as this is part of the import for both formats
+
+TABLE = 'copy_formats_benchmark'
+COLUMNS = ('run_id', 'detail_name', 'metric', 'value', 'unit', 'time')
+TYPES = ('uuid', 'text', 'text', 'bigint', 'text', 'bigint')
+
+def generate_measurements(rows):
+    rng = np.random.default_rng(42)
+    return pandas.DataFrame({
+        'time': np.arange(rows, dtype='int64') * 99_000 + 1_700_000_000_000_000,
+        'value': rng.integers(0, 10_000, rows, dtype='int64'),
+        'detail_name': rng.choice(['container-1', 'container-2', 'container-3'], rows),
+        'unit': 'Ratio',
+        'metric': 'cpu_utilization_cgroup_container',
+        'run_id': str(uuid.uuid4()),
+    })
+
+def copy_csv(df):
+    f = StringIO(df.to_csv(index=False, header=False))
+    DB().copy_from(file=f, table=TABLE, columns=df.columns, sep=',')
+
+def copy_binary(df):
+    data = {column: df[column].tolist() for column in COLUMNS}
+    data['run_id'] = [uuid.UUID(df['run_id'].iloc[0])] * df.shape[0]
+    DB().copy_binary(table=TABLE, columns=COLUMNS, types=TYPES, data=data)
+
+def run_benchmark(rows, repetitions):
+    df = generate_measurements(rows)
+    DB().query(f"CREATE UNLOGGED TABLE IF NOT EXISTS {TABLE} (LIKE measurements INCLUDING DEFAULTS)")
+
+    try:
+        for name, copy_function in (('csv', copy_csv), ('binary', copy_binary)):
+            timings = []
+            for _ in range(repetitions):
+                DB().query(f"TRUNCATE {TABLE}")
+                start = time.perf_counter()
+                copy_function(df)
+                timings.append(time.perf_counter() - start)
+
+            best = min(timings)
+            print(f"{name:>6}: {rows} rows in {best:.3f} s => {rows / best:,.0f} rows/s (best of {repetitions})")
+    finally:
+        DB().query(f"DROP TABLE IF EXISTS {TABLE}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Amount of measurement rows to import per repetition')
+    parser.add_argument('--repetitions', type=int, default=3, help='How often every format is imported. The best time is reported')
+
+    args = parser.parse_args()  # script will exit if arguments not present
+
+    run_benchmark(args.rows, args.repetitions)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import faulthandler
+faulthandler.enable()  # will catch segfaults and write to stderr
+
+import json
+import threading
+import time
+
+import psutil
+
+from lib.db import DB
+from lib.metric_importer import import_measurements
+from metric_providers.synthetic.energy.machine.provider import SyntheticEnergyMachineProvider
+from tools.phase_stats import build_and_store_phase_stats
+
+# Runs the hot paths of the import end to end with the synthetic energy provider, so that changes to them can
+# be measured without RAPL or PSU hardware: starting and stopping the provider, reading its output,
+# the COPY into measurements and building the phase stats.
+# Every stage reports its wall time, the rows per second and the peak RSS of this process while it ran.
+# The run and its measurements are deleted afterwards.
+# The synthetic provider must have been compiled with make before
+
+PHASES = ['[BASELINE]', '[INSTALLATION]', '[BOOT]', '[IDLE]', '[RUNTIME]', '[REMOVE]']
+
+# Polls the RSS in a thread, as the peak of the whole process (ru_maxrss) can not be reset between stages
+class PeakRss(threading.Thread):
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self._interval = interval
+        self._process = psutil.Process()
+        self._stopped = threading.Event()
+        self.peak = self._process.memory_info().rss
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+        return self.peak
+
+def measure_stage(results, name, function):
+    peak_rss = PeakRss()
+    peak_rss.start()
+    start = time.perf_counter()
+    try:
+        rows = function()
+    finally:
+        wall_time = time.perf_counter() - start
+        peak = peak_rss.stop()
+
+    results.append({
+        'stage': name,
+        'rows': rows,
+        'wall_time_s': round(wall_time, 3),
+        'rows_per_s': round(rows / wall_time) if rows and wall_time else None,
+        'peak_rss_mb': round(peak / 1024**2, 1),
+    })
+    rows_per_s = f"{results[-1]['rows_per_s']:>12,} rows/s" if results[-1]['rows_per_s'] else f"{'-':>19}"
+    print(f"{name:>12}: {wall_time:8.3f} s {rows_per_s} {results[-1]['peak_rss_mb']:>9} MB peak RSS")
+
+def insert_run(start, end):
+    # The phases split the measured time evenly, as the phase stats are calculated for every phase
+    duration = (end - start + 1) // len(PHASES)
+    phases = [{'start': start + i * duration, 'end': start + (i + 1) * duration, 'name': name} for i, name in enumerate(PHASES)]
+
+    return DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, phases, start_measurement, end_measurement)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+        """, params=('Ingestion benchmark', 'benchmark', 'benchmark', 'benchmark', 'manual', json.dumps(phases), start, end))[0]
+
+def run_benchmark(resolution, detail_names, duration, binary_output, output=None):
+    provider = SyntheticEnergyMachineProvider(resolution, detail_names=detail_names, duration=duration, binary_output=binary_output)
+    results = []
+    state = {}
+
+    def generate():
+        provider.start_profiling()
+        # The provider writes the samples of the whole duration at once and then exits
+        provider._ps.wait()
+        provider.stop_profiling()
+
+    def read():
+        state['df'] = provider.read_metrics('benchmark')
+        return state['df'].shape[0]
+
+    def copy():
+        state['run_id'] = insert_run(int(state['df'].time.min()), int(state['df'].time.max()))
+        state['df']['run_id'] = state['run_id']
+        import_measurements(state['df'])
+        rows = state['df'].shape[0]
+        del state['df']
+        return rows
+
+    def phase_stats():
+        build_and_store_phase_stats(state['run_id'])
+        return DB().fetch_one('SELECT COUNT(*) FROM measurements WHERE run_id = %s', params=(state['run_id'], ))[0]
+
+    try:
+        measure_stage(results, 'generate', generate)
+        measure_stage(results, 'read', read)
+        measure_stage(results, 'copy', copy)
+        measure_stage(results, 'phase_stats', phase_stats)
+    finally:
+        if 'run_id' in state:
+            DB().query('DELETE FROM runs WHERE id = %s', params=(state['run_id'], ))
+
+    if output is not None:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump({
+                'resolution': resolution,
+                'detail_names': detail_names,
+                'duration': duration,
+                'binary_output': binary_output,
+                'stages': results,
+            }, file, indent=4)
+
+    return results
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resolution', type=int, default=99, help='Milliseconds between two samples of the synthetic provider')
+    parser.add_argument('--detail-names', type=int, default=0, help='Amount of detail names every sample has a value for. 0 is a machine level provider')
+    parser.add_argument('--duration', type=int, default=3600, help='Seconds of measurement the synthetic provider generates')
+    parser.add_argument('--binary-output', action='store_true', help='Let the provider write binary records instead of text lines')
+    parser.add_argument('--output', type=str, help='Also write the results as JSON to this file, e.g. to compare them between commits')
+
+    args = parser.parse_args()  # script will exit if arguments not present
+
+    run_benchmark(args.resolution, args.detail_names, args.duration, args.binary_output, args.output)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import faulthandler
+faulthandler.enable()  # will catch segfaults and write to stderr
+
+import json
+import time
+
+import numpy as np
+import pandas
+
+from lib.db import DB
+from lib.metric_importer import import_measurements
+from tools.phase_stats import PHASE_STATISTICS, add_energy_integration, build_phase_stats, get_energy_series, get_phase_aggregates, is_energy_metric
+
+# Compares the single set-based aggregation of the phase stats with the previous approach of one query per
+# phase, metric and detail_name on a generated run with millions of measurements.
+# Both must result in the same phase stats rows. The run is deleted afterwards
+
+# metric, unit, detail_names, value range. The mix covers all derivation rules of the phase stats
+SERIES = [
+    ('cpu_utilization_procfs_system', 'Ratio', ['[SYSTEM]'], (0, 10_000)),
+    ('cpu_utilization_cgroup_container', 'Ratio', ['container-1', 'container-2', 'container-3'], (0, 10_000)),
+    ('memory_total_cgroup_container', 'Bytes', ['container-1', 'container-2', 'container-3'], (10_000_000, 500_000_000)),
+    ('network_io_cgroup_container', 'Bytes', ['container-1', 'container-2', 'container-3'], (0, 1_000)),
+    ('cpu_energy_rapl_msr_component', 'mJ', ['Package_0'], (500, 5_000)),
+    ('psu_energy_ac_mcp_machine', 'mJ', ['[machine]'], (1_000, 10_000)),
+]
+PHASES = ['[BASELINE]', '[INSTALLATION]', '[BOOT]', '[IDLE]', '[RUNTIME]', '[REMOVE]']
+FLOWS = ['Flow 1', 'Flow 2']
+RESOLUTION = 99_000 # us
+
+def insert_run(samples):
+    start = 1_700_000_000_000_000
+    duration = samples * RESOLUTION // len(PHASES)
+    phases = [{'start': start + i * duration, 'end': start + (i + 1) * duration, 'name': name} for i, name in enumerate(PHASES)]
+
+    # The flows are phases within [RUNTIME], like the runner records them
+    runtime = phases[PHASES.index('[RUNTIME]')]
+    flow_duration = duration // len(FLOWS)
+    phases[-1:-1] = [{'start': runtime['start'] + i * flow_duration, 'end': runtime['start'] + (i + 1) * flow_duration, 'name': name} for i, name in enumerate(FLOWS)]
+
+    run_id = DB().fetch_one("""
+        INSERT INTO runs (name, uri, branch, filename, email, phases, start_measurement, end_measurement)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+        """, params=('Phase stats benchmark', 'benchmark', 'benchmark', 'benchmark', 'manual', json.dumps(phases), start, start + samples * RESOLUTION))[0]
+
+    return run_id, start, phases
+
+def insert_measurements(run_id, start, samples):
+    rng = np.random.default_rng(42)
+    for metric, unit, detail_names, (low, high) in SERIES:
+        for detail_name in detail_names:
+            values = rng.integers(low, high, samples, dtype='int64')
+            if metric == 'network_io_cgroup_container':
+                values = np.cumsum(values) # accumulating
+            import_measurements(pandas.DataFrame({
+                'time': start + np.arange(samples, dtype='int64') * RESOLUTION,
+                'value': values,
+                'detail_name': detail_name,
+                'unit': unit,
+                'metric': metric,
+                'run_id': run_id,
+            }))
+
+# One query per phase, metric and detail_name as build_and_store_phase_stats did it before
+def get_phase_aggregates_per_query(run_id, phases):
+    query = """
+            SELECT metric, unit, detail_name
+            FROM measurements
+            WHERE run_id = %s
+            GROUP BY metric, unit, detail_name
+            ORDER BY metric ASC, detail_name ASC, unit ASC
+            """
+    metrics = DB().fetch_all(query, (run_id, ))
+
+    select_query = f"""
+        SELECT SUM(value), MAX(value), MIN(value), AVG(value), COUNT(value){''.join(f', {aggregate}' for (aggregate, _) in PHASE_STATISTICS.values())}
+        FROM measurements
+        WHERE run_id = %s AND metric = %s AND detail_name = %s AND time > %s and time < %s
+    """
+
+    phase_aggregates = []
+    for phase in phases:
+        aggregates = []
+        for (metric, unit, detail_name) in metrics:
+            results = DB().fetch_one(select_query, (run_id, metric, detail_name, phase['start'], phase['end'], ))
+            if results[4] != 0:
+                aggregates.append([metric, unit, detail_name, *results])
+        phase_aggregates.append(aggregates)
+
+    energy_metrics = {metric for (metric, unit, _) in metrics if is_energy_metric(np.array(metric), np.array(unit))}
+    return add_energy_integration(phase_aggregates, phases, get_energy_series(run_id, energy_metrics))
+
+def run_benchmark(rows, repetitions):
+    samples = rows // sum(len(detail_names) for (_, _, detail_names, _) in SERIES)
+    run_id, start, phases = insert_run(samples)
+
+    try:
+        print(f"Inserting {samples * sum(len(detail_names) for (_, _, detail_names, _) in SERIES)} measurements ...")
+        insert_measurements(run_id, start, samples)
+        DB().query('ANALYZE measurements')
+
+        results = {}
+        for name, function in (('per query', get_phase_aggregates_per_query), ('set based', get_phase_aggregates)):
+            timings = []
+            for _ in range(repetitions):
+                start_time = time.perf_counter()
+                phase_aggregates = function(run_id, phases)
+                timings.append(time.perf_counter() - start_time)
+            results[name] = build_phase_stats(run_id, phases, phase_aggregates)
+            print(f"{name:>10}: {min(timings):.3f} s (best of {repetitions})")
+
+        if results['per query'] != results['set based']:
+            raise RuntimeError('The set based phase stats differ from the phase stats calculated per query')
+        print(f"Both resulted in the same {len(results['set based'])} phase stats rows")
+    finally:
+        DB().query('DELETE FROM runs WHERE id = %s', params=(run_id, ))
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5_000_000, help='Amount of measurements of the generated run')
+    parser.add_argument('--repetitions', type=int, default=3, help='How often the phase stats are aggregated. The best time is reported')
+
+    args = parser.parse_args()  # script will exit if arguments not present
+
+    run_benchmark(args.rows, args.repetitions)
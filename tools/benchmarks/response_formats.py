@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import faulthandler
+faulthandler.enable()  # will catch segfaults and write to stderr
+
+import time
+import uuid
+import gzip
+import datetime
+
+import numpy as np
+
+from api.api_helpers import ORJSONResponseObjKeep
+from api.main import measurements_encoder, timeline_encoder, ci_measurements_encoder
+
+# Compares the list per row, that the measurement, timeline and CI endpoints return by default, with the columnar format.
+# The rows are generated in the shape of the queries of the endpoints, so no database is needed.
+# The bytes after gzip are what a client gets through a compressing proxy
+
+def generate_measurements(series, samples):
+    rng = np.random.default_rng(42)
+    rows = []
+    for i in range(series):
+        times = (np.arange(samples, dtype='int64') * 99_000 + 1_700_000_000_000_000).tolist()
+        values = rng.integers(0, 10_000, samples, dtype='int64').tolist()
+        rows.extend(zip([f"container-{i}"] * samples, times, ['cpu_energy_rapl_msr_component'] * samples, values, ['mJ'] * samples))
+    return rows
+
+def generate_timeline(runs, series):
+    rng = np.random.default_rng(42)
+    run_data = [
+        (uuid.uuid4(), f"Run {i}", datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=i), uuid.uuid4().hex, datetime.datetime(2024, 1, 1) + datetime.timedelta(hours=i), uuid.uuid4().hex)
+        for i in range(runs)
+    ]
+    rows = []
+    for i in range(series):
+        for j, (run_id, name, created_at, commit_hash, commit_timestamp, gmt_hash) in enumerate(run_data):
+            rows.append((run_id, name, created_at, f"metric_{i}_energy_component", f"detail-{i}", '004_[RUNTIME]', int(rng.integers(0, 10_000_000)), 'mJ', commit_hash, commit_timestamp, gmt_hash, i * runs + j + 1))
+    return rows
+
+def generate_ci_measurements(runs, steps):
+    rng = np.random.default_rng(42)
+    rows = []
+    for i in range(runs):
+        commit_hash = uuid.uuid4().hex
+        for j in range(steps):
+            rows.append((int(rng.integers(0, 100_000)), 'mJ', str(6_000_000_000 + i), datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i * 10 + j),
+                         f"Step {j}", 'AMD EPYC 7763 64-Core Processor', commit_hash, int(rng.integers(0, 1_000_000)), 'github', float(rng.random() * 100),
+                         'CI', '52.52', '13.40', 'Berlin', 350, 0.01))
+    return rows
+
+def encode_rows(rows):
+    return ORJSONResponseObjKeep({'success': True, 'data': rows}).body
+
+def encode_columnar(rows, encoder_factory):
+    return b'{"success":true,"data":' + encoder_factory().encode(rows) + b'}'
+
+def run_benchmark(samples, repetitions):
+    endpoints = (
+        ('measurements', generate_measurements(10, samples), measurements_encoder),
+        ('timeline', generate_timeline(365, 40), timeline_encoder),
+        ('ci', generate_ci_measurements(2_000, 5), ci_measurements_encoder),
+    )
+
+    for endpoint, rows, encoder_factory in endpoints:
+        print(f"{endpoint} ({len(rows)} rows)")
+        for name, encode in (('rows', encode_rows), ('columnar', lambda rows: encode_columnar(rows, encoder_factory))): # pylint: disable=cell-var-from-loop
+            timings = []
+            for _ in range(repetitions):
+                start = time.perf_counter()
+                body = encode(rows)
+                timings.append(time.perf_counter() - start)
+
+            print(f"{name:>10}: {len(body):>12,} bytes {len(gzip.compress(body, compresslevel=6)):>12,} gzipped {min(timings) * 1000:>8.1f} ms (best of {repetitions})")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=60_000, help='Amount of samples in every of the 10 measurement series')
+    parser.add_argument('--repetitions', type=int, default=5, help='How often every format is encoded. The best time is reported')
+
+    args = parser.parse_args()  # script will exit if arguments not present
+
+    run_benchmark(args.samples, args.repetitions)
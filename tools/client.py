@@ -91,6 +91,8 @@ if __name__ == '__main__':
             sys.exit(1)
         GlobalConfig(config_name=args.config_override) # will create a singleton and subsequent calls will retrieve object with altered default config file
 
+    DB.role = 'client' # must be set before the first query creates the pool
+
     config_main = GlobalConfig().config
 
 
@@ -4,175 +4,442 @@
 import faulthandler
 faulthandler.enable()  # will catch segfaults and write to stderr
 
+import collections
 import decimal
-from io import StringIO
+import threading
+import uuid
+import numpy
 
 from lib.global_config import GlobalConfig
 from lib.db import DB
 
 
-def generate_csv_line(run_id, metric, detail_name, phase_name, value, value_type, max_value, min_value, unit):
-    return f"{run_id},{metric},{detail_name},{phase_name},{round(value)},{value_type},{round(max_value) if max_value is not None else ''},{round(min_value) if min_value is not None else ''},{unit},NOW()\n"
-
-def build_and_store_phase_stats(run_id, sci=None):
+PHASE_STATS_COLUMNS = ('run_id', 'metric', 'detail_name', 'phase', 'value', 'type', 'max_value', 'min_value', 'unit', 'statistics')
+PHASE_STATS_TYPES = ('uuid', 'text', 'text', 'text', 'bigint', 'text', 'bigint', 'bigint', 'text', 'jsonb')
+
+# Statistics over the measurements of a metric in a phase, that are stored in phase_stats.statistics for the rules that want them.
+# Every statistic is an aggregate for get_phase_aggregates() and a function over the values for the PhaseStatsCollector,
+# which must calculate the same. Adding a statistic here adds it for every metric
+PHASE_STATISTICS = {
+    'p50': ('percentile_cont(0.50) WITHIN GROUP (ORDER BY measurements.value)', lambda values: numpy.percentile(values, 50)),
+    'p95': ('percentile_cont(0.95) WITHIN GROUP (ORDER BY measurements.value)', lambda values: numpy.percentile(values, 95)),
+    'p99': ('percentile_cont(0.99) WITHIN GROUP (ORDER BY measurements.value)', lambda values: numpy.percentile(values, 99)),
+    'stddev': ('stddev_pop(measurements.value)', numpy.std),
+}
+
+# The phase stats rows a rule returns. Every field is an array with one element per metric and detail_name or a single value for all
+PhaseStatsRows = collections.namedtuple('PhaseStatsRows', ['metric', 'detail_name', 'value', 'type', 'max_value', 'min_value', 'unit', 'statistics'], defaults=[None])
+
+# The rules that derive the phase stats of a metric family, in the order they are matched. A metric belongs to the first
+# rule that matches its metric name and unit. The rule is called once per phase with the aggregates of all metrics
+# of the family as arrays (see get_aggregate_arrays()) and the duration of the phase and returns a list of PhaseStatsRows
+AGGREGATION_RULES = []
+
+def aggregation_rule(matches):
+    def register(rule):
+        AGGREGATION_RULES.append((matches, rule))
+        return rule
+    return register
+
+def is_energy_metric(metric, unit):
+    return (numpy.char.find(metric, '_energy_') >= 0) & (unit == 'mJ')
+
+@aggregation_rule(lambda metric, unit: numpy.isin(metric, (
+    'lm_sensors_temperature_component',
+    'lm_sensors_fan_component',
+    'cpu_utilization_procfs_system',
+    'cpu_utilization_mach_system',
+    'cpu_utilization_cgroup_container',
+    'memory_total_cgroup_container',
+    'cpu_frequency_sysfs_core',
+    'energy_impact_powermetrics_vm',
+)))
+def mean_rule(aggregates, duration): # pylint: disable=unused-argument
+    return [PhaseStatsRows(aggregates['metric'], aggregates['detail_name'], aggregates['avg'], 'MEAN', aggregates['max'], aggregates['min'], aggregates['unit'], aggregates['statistics'])]
+
+@aggregation_rule(lambda metric, unit: metric == 'network_io_cgroup_container')
+def counter_rule(aggregates, duration): # pylint: disable=unused-argument
+    # These metrics are accumulating already. We only need the delta here and deliver it as total. No max here
+    return [PhaseStatsRows(aggregates['metric'], aggregates['detail_name'], aggregates['max'] - aggregates['min'], 'TOTAL', None, None, aggregates['unit'])]
+
+@aggregation_rule(is_energy_metric)
+def energy_rule(aggregates, duration):
     config = GlobalConfig().config
+    metric = aggregates['metric']
+
+    # for energy we want to deliver an extra value, the watts.
+    # Here we need to calculate the average differently. Max, min and the statistics are scaled by the average sample duration
+    power_factor = 10**6 / (duration / aggregates['count'])
+    # The time weighted values of add_energy_integration() are delivered alongside in the statistics, so that both can be compared
+    rows = [
+        PhaseStatsRows(
+            metric, aggregates['detail_name'], aggregates['sum'], 'TOTAL', None, None, aggregates['unit'],
+            {**aggregates['statistics'], 'integrated_value': aggregates['integrated_sum']}
+        ),
+        PhaseStatsRows(
+            numpy.char.replace(metric, '_energy_', '_power_'), aggregates['detail_name'], (aggregates['sum'] * 10**6) / duration, 'MEAN',
+            aggregates['max'] * power_factor, aggregates['min'] * power_factor, 'mW',
+            {
+                **{name: values * power_factor for name, values in aggregates['statistics'].items()},
+                'integrated_value': (aggregates['integrated_sum'] * 10**6) / duration,
+                'integrated_max_value': aggregates['power_max'],
+                'integrated_min_value': aggregates['power_min'],
+            }
+        ),
+    ]
+
+    machine = numpy.char.endswith(metric, '_machine')
+    if machine.any():
+        machine_co2_in_ug = (aggregates['sum'][machine] / 3_600) * config['sci']['I']
+        rows.append(PhaseStatsRows(numpy.char.replace(metric[machine], '_energy_', '_co2_'), aggregates['detail_name'][machine], machine_co2_in_ug, 'TOTAL', None, None, 'ug'))
+
+    return rows
+
+@aggregation_rule(lambda metric, unit: numpy.ones(metric.shape, dtype=bool))
+def total_rule(aggregates, duration): # pylint: disable=unused-argument
+    return [PhaseStatsRows(aggregates['metric'], aggregates['detail_name'], aggregates['sum'], 'TOTAL', aggregates['max'], aggregates['min'], aggregates['unit'], aggregates['statistics'])]
+
+# Turns the aggregates of a phase into one array per column
+def get_aggregate_arrays(aggregates):
+    columns = list(zip(*aggregates)) if aggregates else [()] * (11 + len(PHASE_STATISTICS))
+    return {
+        'metric': numpy.array(columns[0], dtype=str),
+        'unit': numpy.array(columns[1], dtype=str),
+        'detail_name': numpy.array(columns[2], dtype=str),
+        'sum': numpy.array([int(value) for value in columns[3]], dtype=numpy.int64),
+        'max': numpy.array(columns[4], dtype=numpy.int64),
+        'min': numpy.array(columns[5], dtype=numpy.int64),
+        'avg': numpy.array(columns[6], dtype=numpy.float64),
+        'count': numpy.array(columns[7], dtype=numpy.int64),
+        'statistics': {name: numpy.array(columns[8 + i], dtype=numpy.float64) for i, name in enumerate(PHASE_STATISTICS)},
+        # See add_energy_integration(). NaN for all other metrics
+        'integrated_sum': numpy.array(columns[8 + len(PHASE_STATISTICS)], dtype=numpy.float64),
+        'power_max': numpy.array(columns[9 + len(PHASE_STATISTICS)], dtype=numpy.float64),
+        'power_min': numpy.array(columns[10 + len(PHASE_STATISTICS)], dtype=numpy.float64),
+    }
+
+def select_aggregates(aggregates, mask):
+    selected = {key: values[mask] for key, values in aggregates.items() if key != 'statistics'}
+    selected['statistics'] = {name: values[mask] for name, values in aggregates['statistics'].items()}
+    return selected
+
+# NaN becomes None
+def round_values(values, count):
+    if values is None:
+        return [None] * count
+    values = numpy.broadcast_to(values, (count, ))
+    if values.dtype.kind == 'f':
+        missing = numpy.isnan(values)
+        values = numpy.rint(numpy.where(missing, 0, values)).astype(numpy.int64)
+        if missing.any():
+            return [None if is_missing else value for value, is_missing in zip(values.tolist(), missing.tolist())]
+    return values.tolist()
+
+def generate_phase_stats_rows(run_id, phase_name, rows):
+    count = len(rows.metric)
+    if rows.statistics is None:
+        statistics = [None] * count
+    else:
+        statistics = [
+            {name: value for name, value in zip(rows.statistics, values) if value is not None}
+            for values in zip(*(round_values(values, count) for values in rows.statistics.values()))
+        ]
+
+    return zip(
+        [run_id] * count, rows.metric.tolist(), rows.detail_name.tolist(), [phase_name] * count,
+        round_values(rows.value, count), [rows.type] * count, round_values(rows.max_value, count), round_values(rows.min_value, count),
+        numpy.broadcast_to(rows.unit, (count, )).tolist(), statistics
+    )
 
-    query = """
-            SELECT metric, unit, detail_name
-            FROM measurements
-            WHERE run_id = %s
-            GROUP BY metric, unit, detail_name
-            ORDER BY metric ASC -- we need this ordering for later, when we read again
-            """
-    metrics = DB().fetch_all(query, (run_id, ))
+def generate_phase_stats_row(run_id, metric, detail_name, phase_name, value, value_type, max_value, min_value, unit, statistics=None):
+    return (run_id, metric, detail_name, phase_name, round(value), value_type, round(max_value) if max_value is not None else None, round(min_value) if min_value is not None else None, unit, statistics)
+
+# Integrates the energy of a series over every phase by time instead of summing the samples within the phase.
+# Every sample holds the energy since the previous sample, so a sample that straddles a phase border is split pro rata
+# by the time of its interval on both sides. The first sample is dropped, as the start of its interval is unknown.
+# times must be sorted. Returns the energy in every phase and the max and min power in mW of the sample intervals
+# that overlap the phase, or NaN if no interval overlaps the phase
+def integrate_energy(times, values, starts, ends):
+    energy = numpy.full(starts.shape, numpy.nan)
+    power_max = numpy.full(starts.shape, numpy.nan)
+    power_min = numpy.full(starts.shape, numpy.nan)
+
+    interval_starts = times[:-1]
+    interval_ends = times[1:]
+    interval_values = values[1:].astype(numpy.float64)
+    valid = interval_ends > interval_starts # samples with the same time have no duration
+    interval_starts, interval_ends, interval_values = interval_starts[valid], interval_ends[valid], interval_values[valid]
+    if not interval_values.size:
+        return energy, power_max, power_min
+
+    # The cumulated energy is linear within every interval, so the energy up to any time is an interpolation
+    knots = numpy.concatenate((interval_starts[:1], interval_ends))
+    cumulated = numpy.concatenate(([0], numpy.cumsum(interval_values)))
+    power = (interval_values * 10**6) / (interval_ends - interval_starts)
+
+    # The intervals that overlap a phase. They are sorted by their start and by their end alike
+    lows = numpy.searchsorted(interval_ends, starts, side='right')
+    highs = numpy.searchsorted(interval_starts, ends, side='left')
+    overlapping = highs > lows
+    energy[overlapping] = (numpy.interp(ends, knots, cumulated) - numpy.interp(starts, knots, cumulated))[overlapping]
+    for idx in numpy.flatnonzero(overlapping).tolist():
+        power_max[idx] = power[lows[idx]:highs[idx]].max()
+        power_min[idx] = power[lows[idx]:highs[idx]].min()
+
+    return energy, power_max, power_min
+
+# Appends the integrated energy and the max and min power of integrate_energy() to the aggregates of every energy metric.
+# energy_series has sorted time and value arrays per metric, unit and detail_name. All other metrics get NaN
+def add_energy_integration(phase_aggregates, phases, energy_series):
+    starts = numpy.array([phase['start'] for phase in phases], dtype=numpy.int64)
+    ends = numpy.array([phase['end'] for phase in phases], dtype=numpy.int64)
+    integrated = {key: integrate_energy(times, values, starts, ends) for key, (times, values) in energy_series.items()}
+
+    for idx, aggregates in enumerate(phase_aggregates):
+        for row in aggregates:
+            key = tuple(row[:3])
+            if key in integrated:
+                row.extend(float(values[idx]) for values in integrated[key])
+            else:
+                row.extend([numpy.nan] * 3)
+
+    return phase_aggregates
 
+# The samples of the energy metrics of the run for add_energy_integration(). They are only a small part of the measurements.
+# The metrics are given, so that the index on the metric can be used. They are fetched as one array per series,
+# as the rows would be much slower to transfer and convert
+def get_energy_series(run_id, metrics):
+    query = """
+        SELECT metric, unit, detail_name, array_agg(time ORDER BY time ASC), array_agg(value ORDER BY time ASC)
+        FROM measurements
+        WHERE
+            run_id = %s AND metric = ANY(%s) AND unit = 'mJ'
+            AND created_at = (SELECT created_at FROM runs WHERE id = %s) -- see get_phase_aggregates()
+        GROUP BY metric, unit, detail_name
+        """
+    return {
+        (metric, unit, detail_name): (numpy.array(times, dtype=numpy.int64), numpy.array(values, dtype=numpy.int64))
+        for (metric, unit, detail_name, times, values) in DB().fetch_all(query, (run_id, list(metrics), run_id))
+    }
+
+# Returns SUM, MAX, MIN, AVG, COUNT and the PHASE_STATISTICS of every metric and detail_name for every phase of the run in a single query.
+# The measurements of the run are scanned once and matched against the phase windows instead of querying every
+# phase, metric and detail_name on its own. The result is a list per phase, ordered by metric like the phases expect it.
+# The energy metrics additionally get their time weighted integration, see add_energy_integration()
+def get_phase_aggregates(run_id, phases):
+    query = f"""
+        WITH phases AS (
+            SELECT
+                (phase.idx - 1) AS idx,
+                (phase.data->>'start')::bigint AS start_time,
+                (phase.data->>'end')::bigint AS end_time
+            FROM runs, json_array_elements(runs.phases) WITH ORDINALITY AS phase(data, idx)
+            WHERE runs.id = %s
+        )
+        SELECT
+            phases.idx, measurements.metric, measurements.unit, measurements.detail_name,
+            SUM(measurements.value), MAX(measurements.value), MIN(measurements.value), AVG(measurements.value), COUNT(measurements.value)
+            {''.join(f', {aggregate}' for (aggregate, _) in PHASE_STATISTICS.values())}
+        FROM measurements
+        JOIN phases ON measurements.time > phases.start_time AND measurements.time < phases.end_time
+        WHERE
+            measurements.run_id = %s
+            -- the measurements carry the created_at of the run, so only its partition is read
+            AND measurements.created_at = (SELECT created_at FROM runs WHERE id = %s)
+        GROUP BY phases.idx, measurements.metric, measurements.unit, measurements.detail_name
+        -- C collation, so that the order is the same as in PhaseStatsCollector
+        ORDER BY phases.idx ASC, measurements.metric COLLATE "C" ASC, measurements.detail_name COLLATE "C" ASC, measurements.unit COLLATE "C" ASC
+        """
+    results = DB().fetch_all(query, (run_id, run_id, run_id))
+
+    phase_aggregates = [[] for _ in phases]
+    for (idx, *aggregates) in results:
+        phase_aggregates[idx].append(aggregates)
+
+    energy_metrics = {metric for (_, metric, unit, *_) in results if is_energy_metric(numpy.array(metric), numpy.array(unit))}
+    return add_energy_integration(phase_aggregates, phases, get_energy_series(run_id, energy_metrics))
+
+class PhaseStatsCollector:
+    '''
+        Collects time and value of every measurement of a run while the metric providers are imported,
+        so that the phase stats can be calculated in the runner process without reading the measurements
+        back from the DB. The runner passes every imported frame through the MetricFrameCache to add().
+
+        Only two int64 arrays per metric, unit and detail_name are kept.
+    '''
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock() # frames are added from the import workers and the streaming importer
+
+    def add(self, df):
+        if df.empty:
+            return
+        # detail_name is cast the same way as in import_measurements(), as some providers use numeric ids
+        df = df[['metric', 'unit', 'time', 'value']].assign(detail_name=df['detail_name'].astype(str))
+        for (metric, unit, detail_name), series in df.groupby(['metric', 'unit', 'detail_name'], sort=False):
+            with self._lock:
+                self._series.setdefault((metric, unit, detail_name), []).append(
+                    (series['time'].to_numpy(dtype=numpy.int64), series['value'].to_numpy(dtype=numpy.int64))
+                )
+
+    # Returns the same aggregates as get_phase_aggregates() does from the DB, including the energy integration.
+    # The times of every series are sorted once and the measurements of a phase are then found by binary search
+    def get_phase_aggregates(self, phases):
+        starts = numpy.array([phase['start'] for phase in phases], dtype=numpy.int64)
+        ends = numpy.array([phase['end'] for phase in phases], dtype=numpy.int64)
+        phase_aggregates = [[] for _ in phases]
+
+        with self._lock:
+            series = {key: chunks.copy() for key, chunks in self._series.items()}
+
+        energy_series = {}
+        for (metric, unit, detail_name) in sorted(series, key=lambda key: (key[0], key[2], key[1])):
+            times = numpy.concatenate([chunk[0] for chunk in series[(metric, unit, detail_name)]])
+            values = numpy.concatenate([chunk[1] for chunk in series[(metric, unit, detail_name)]])
+            order = numpy.argsort(times, kind='stable')
+            times = times[order]
+            values = values[order]
+            cumulated = numpy.concatenate(([0], numpy.cumsum(values, dtype=numpy.int64)))
+            if is_energy_metric(numpy.array(metric), numpy.array(unit)):
+                energy_series[(metric, unit, detail_name)] = (times, values)
+
+            # Like in the query the borders of the phase are excluded
+            lows = numpy.searchsorted(times, starts, side='right')
+            highs = numpy.searchsorted(times, ends, side='left')
+            for idx, (low, high) in enumerate(zip(lows.tolist(), highs.tolist())):
+                if high <= low:
+                    continue
+                # SUM and AVG return numeric in PostgreSQL, so Decimal keeps the derived values the same
+                value_sum = decimal.Decimal(int(cumulated[high] - cumulated[low]))
+                value_count = high - low
+                phase_values = values[low:high]
+                phase_aggregates[idx].append([
+                    metric, unit, detail_name,
+                    value_sum, int(phase_values.max()), int(phase_values.min()), value_sum / value_count, value_count,
+                    *(float(function(phase_values)) for (_, function) in PHASE_STATISTICS.values())
+                ])
+
+        return add_energy_integration(phase_aggregates, phases, energy_series)
+
+# With a phase_stats_collector the measurements are not read back from the DB. See PhaseStatsCollector
+# replace deletes the existing phase stats of the run in the same transaction, so they are never missing
+def build_and_store_phase_stats(run_id, sci=None, phase_stats_collector=None, replace=False):
     query = """
         SELECT phases
         FROM runs
         WHERE id = %s
         """
-    phases = DB().fetch_one(query, (run_id, ))
+    phases = DB().fetch_one(query, (run_id, ))[0]
+
+    if phase_stats_collector is not None:
+        phase_aggregates = phase_stats_collector.get_phase_aggregates(phases)
+    else:
+        phase_aggregates = get_phase_aggregates(run_id, phases)
+
+    phase_stats = build_phase_stats(run_id, phases, phase_aggregates, sci)
+
+    # created_at is set by the column default
+    if replace:
+        # R of the SCI is only known to the runner during the run, so without sci the existing SCI row is kept
+        before_query = 'DELETE FROM phase_stats WHERE run_id = %s'
+        if sci is None:
+            before_query += " AND metric <> 'software_carbon_intensity_global'"
+        DB().copy_binary(table='phase_stats', columns=PHASE_STATS_COLUMNS, types=PHASE_STATS_TYPES, data=phase_stats,
+                         before_query=before_query, before_params=(run_id, ))
+    else:
+        DB().copy_binary(table='phase_stats', columns=PHASE_STATS_COLUMNS, types=PHASE_STATS_TYPES, data=phase_stats)
+
+    # The API derives the ETag of the resources of a finished run from updated_at, so they change with the phase stats
+    DB().query('UPDATE runs SET updated_at = NOW() WHERE id = %s', params=(run_id, ))
+
+# Derives the phase stats rows from the aggregated measurements of every phase.
+# phase_aggregates has a list of (metric, unit, detail_name, sum, max, min, avg, count, *statistics) for every phase
+def build_phase_stats(run_id, phases, phase_aggregates, sci=None):
+    config = GlobalConfig().config
 
-    csv_buffer = StringIO()
+    run_uuid = uuid.UUID(str(run_id))
+    phase_stats = []
 
     machine_power_idle = None
     machine_power_runtime = None
     machine_energy_runtime = None
 
-    for idx, phase in enumerate(phases[0]):
-        network_io_bytes_total = [] # reset; # we use array here and sum later, because checking for 0 alone not enough
-
-        cpu_utilization_containers = {} # reset
-        cpu_utilization_machine = None
+    for idx, phase in enumerate(phases):
+        phase_name = f"{idx:03}_{phase['name']}"
         machine_co2_in_ug = None # reset
-        network_io_co2_in_ug = None
-
-        select_query = """
-            SELECT SUM(value), MAX(value), MIN(value), AVG(value), COUNT(value)
-            FROM measurements
-            WHERE run_id = %s AND metric = %s AND detail_name = %s AND time > %s and time < %s
-        """
 
         duration = phase['end']-phase['start']
-        csv_buffer.write(generate_csv_line(run_id, 'phase_time_syscall_system', '[SYSTEM]', f"{idx:03}_{phase['name']}", duration, 'TOTAL', None, None, 'us'))
-
-        # now we go through all metrics in the run and aggregate them
-        for (metric, unit, detail_name) in metrics: # unpack
-            # -- saved for future if I need lag time query
-            #    WITH times as (
-            #        SELECT id, value, time, (time - LAG(time) OVER (ORDER BY detail_name ASC, time ASC)) AS diff, unit
-            #        FROM measurements
-            #        WHERE run_id = %s AND metric = %s
-            #        ORDER BY detail_name ASC, time ASC
-            #    ) -- Backlog: if we need derivatives / integrations in the future
-
-            results = DB().fetch_one(select_query,
-                (run_id, metric, detail_name, phase['start'], phase['end'], ))
-
-            value_sum = 0
-            max_value = 0
-            min_value = 0
-            avg_value = 0
-            value_count = 0
-
-            value_sum, max_value, min_value, avg_value, value_count = results
-
-            # no need to calculate if we have no results to work on
-            # This can happen if the phase is too short
-            if value_count == 0: continue
-
-            if metric in (
-                'lm_sensors_temperature_component',
-                'lm_sensors_fan_component',
-                'cpu_utilization_procfs_system',
-                'cpu_utilization_mach_system',
-                'cpu_utilization_cgroup_container',
-                'memory_total_cgroup_container',
-                'cpu_frequency_sysfs_core',
-            ):
-                csv_buffer.write(generate_csv_line(run_id, metric, detail_name, f"{idx:03}_{phase['name']}", avg_value, 'MEAN', max_value, min_value, unit))
-
-                if metric in ('cpu_utilization_procfs_system', 'cpu_utilization_mach_system'):
-                    cpu_utilization_machine = avg_value
-                if metric in ('cpu_utilization_cgroup_container', ):
-                    cpu_utilization_containers[detail_name] = avg_value
-
-            elif metric == 'network_io_cgroup_container':
-                # These metrics are accumulating already. We only need the max here and deliver it as total
-                csv_buffer.write(generate_csv_line(run_id, metric, detail_name, f"{idx:03}_{phase['name']}", max_value-min_value, 'TOTAL', None, None, unit))
-                # No max here
-                # But we need to build the energy
-                network_io_bytes_total.append(max_value-min_value)
-
-            elif metric == 'energy_impact_powermetrics_vm':
-                csv_buffer.write(generate_csv_line(run_id, metric, detail_name, f"{idx:03}_{phase['name']}", avg_value, 'MEAN', max_value, min_value, unit))
-
-            elif "_energy_" in metric and unit == 'mJ':
-                csv_buffer.write(generate_csv_line(run_id, metric, detail_name, f"{idx:03}_{phase['name']}", value_sum, 'TOTAL', None, None, unit))
-                # for energy we want to deliver an extra value, the watts.
-                # Here we need to calculate the average differently
-                power_avg = (value_sum * 10**6) / duration
-                power_max = (max_value * 10**6) / (duration / value_count)
-                power_min = (min_value * 10**6) / (duration / value_count)
-                csv_buffer.write(generate_csv_line(run_id, f"{metric.replace('_energy_', '_power_')}", detail_name, f"{idx:03}_{phase['name']}", power_avg, 'MEAN', power_max, power_min, 'mW'))
-
-                if metric.endswith('_machine'):
-                    machine_co2_in_ug = decimal.Decimal((value_sum / 3_600) * config['sci']['I'])
-                    csv_buffer.write(generate_csv_line(run_id, f"{metric.replace('_energy_', '_co2_')}", detail_name, f"{idx:03}_{phase['name']}", machine_co2_in_ug, 'TOTAL', None, None, 'ug'))
-
-                    if phase['name'] == '[IDLE]':
-                        machine_power_idle = power_avg
-                    else:
-                        machine_energy_runtime = value_sum
-                        machine_power_runtime = power_avg
-
+        phase_stats.append(generate_phase_stats_row(run_uuid, 'phase_time_syscall_system', '[SYSTEM]', phase_name, duration, 'TOTAL', None, None, 'us'))
+
+        # now we go through all metric families that have values in this phase
+        # phases that are too short to have values for a metric do not return it at all
+        aggregates = get_aggregate_arrays(phase_aggregates[idx])
+        unmatched = numpy.ones(aggregates['metric'].shape, dtype=bool)
+        for matches, rule in AGGREGATION_RULES:
+            mask = unmatched & matches(aggregates['metric'], aggregates['unit'])
+            unmatched &= ~mask
+            if mask.any():
+                for rows in rule(select_aggregates(aggregates, mask), duration):
+                    phase_stats.extend(generate_phase_stats_rows(run_uuid, phase_name, rows))
+
+        # after going through the metric families, create the cumulated ones
+        metric, unit = aggregates['metric'], aggregates['unit']
+
+        cpu_utilization_machine = aggregates['avg'][numpy.isin(metric, ('cpu_utilization_procfs_system', 'cpu_utilization_mach_system'))]
+        cpu_utilization_machine = cpu_utilization_machine[-1] if cpu_utilization_machine.size else None
+        containers = metric == 'cpu_utilization_cgroup_container'
+        cpu_utilization_containers = dict(zip(aggregates['detail_name'][containers].tolist(), aggregates['avg'][containers].tolist()))
+
+        machine_energy = is_energy_metric(metric, unit) & numpy.char.endswith(metric, '_machine')
+        if machine_energy.any():
+            # Like the phase stats rows the last machine energy metric is used
+            value_sum = aggregates['sum'][machine_energy][-1]
+            power_avg = (value_sum * 10**6) / duration
+            machine_co2_in_ug = (value_sum / 3_600) * config['sci']['I']
+
+            if phase['name'] == '[IDLE]':
+                machine_power_idle = power_avg
             else:
-                csv_buffer.write(generate_csv_line(run_id, metric, detail_name, f"{idx:03}_{phase['name']}", value_sum, 'TOTAL', max_value, min_value, unit))
-        # after going through detail metrics, create cumulated ones
-        if network_io_bytes_total:
+                machine_energy_runtime = value_sum
+                machine_power_runtime = power_avg
+
+        network_io = metric == 'network_io_cgroup_container'
+        if network_io.any(): # we check the mask, because checking the sum for 0 alone is not enough
             # build the network energy
             # network via formula: https://www.green-coding.io/co2-formulas/
             # pylint: disable=invalid-name
-            network_io_in_kWh = (sum(network_io_bytes_total) / 1_000_000_000) * 0.002651650429449553
+            network_io_in_kWh = ((aggregates['max'][network_io] - aggregates['min'][network_io]).sum() / 1_000_000_000) * 0.002651650429449553
             network_io_in_mJ = network_io_in_kWh * 3_600_000_000
-            csv_buffer.write(generate_csv_line(run_id, 'network_energy_formula_global', '[FORMULA]', f"{idx:03}_{phase['name']}", network_io_in_mJ, 'TOTAL', None, None, 'mJ'))
+            phase_stats.append(generate_phase_stats_row(run_uuid, 'network_energy_formula_global', '[FORMULA]', phase_name, network_io_in_mJ, 'TOTAL', None, None, 'mJ'))
             # co2 calculations
-            network_io_co2_in_ug = decimal.Decimal(network_io_in_kWh * config['sci']['I'] * 1_000_000)
-            csv_buffer.write(generate_csv_line(run_id, 'network_co2_formula_global', '[FORMULA]', f"{idx:03}_{phase['name']}", network_io_co2_in_ug, 'TOTAL', None, None, 'ug'))
+            network_io_co2_in_ug = network_io_in_kWh * config['sci']['I'] * 1_000_000
+            phase_stats.append(generate_phase_stats_row(run_uuid, 'network_co2_formula_global', '[FORMULA]', phase_name, network_io_co2_in_ug, 'TOTAL', None, None, 'ug'))
         else:
-            network_io_co2_in_ug = decimal.Decimal(0)
+            network_io_co2_in_ug = 0
 
 
         duration_in_years = duration / (1_000_000 * 60 * 60 * 24 * 365)
         embodied_carbon_share_g = (duration_in_years / (config['sci']['EL']) ) * config['sci']['TE'] * config['sci']['RS']
-        embodied_carbon_share_ug = decimal.Decimal(embodied_carbon_share_g * 1_000_000)
-        csv_buffer.write(generate_csv_line(run_id, 'embodied_carbon_share_machine', '[SYSTEM]', f"{idx:03}_{phase['name']}", embodied_carbon_share_ug, 'TOTAL', None, None, 'ug'))
+        embodied_carbon_share_ug = embodied_carbon_share_g * 1_000_000
+        phase_stats.append(generate_phase_stats_row(run_uuid, 'embodied_carbon_share_machine', '[SYSTEM]', phase_name, embodied_carbon_share_ug, 'TOTAL', None, None, 'ug'))
 
         if phase['name'] == '[RUNTIME]' and machine_co2_in_ug is not None and sci is not None \
                          and sci.get('R', None) is not None and sci['R'] != 0:
-            csv_buffer.write(generate_csv_line(run_id, 'software_carbon_intensity_global', '[SYSTEM]', f"{idx:03}_{phase['name']}", (machine_co2_in_ug + embodied_carbon_share_ug + network_io_co2_in_ug) / sci['R'], 'TOTAL', None, None, f"ugCO2e/{sci['R_d']}"))
+            phase_stats.append(generate_phase_stats_row(run_uuid, 'software_carbon_intensity_global', '[SYSTEM]', phase_name, (machine_co2_in_ug + embodied_carbon_share_ug + network_io_co2_in_ug) / sci['R'], 'TOTAL', None, None, f"ugCO2e/{sci['R_d']}"))
 
         if machine_power_idle and cpu_utilization_machine and cpu_utilization_containers:
             surplus_power_runtime = machine_power_runtime - machine_power_idle
-            surplus_energy_runtime = machine_energy_runtime - (machine_power_idle * decimal.Decimal(duration / 10**6))
+            surplus_energy_runtime = machine_energy_runtime - (machine_power_idle * (duration / 10**6))
             total_container_utilization = sum(cpu_utilization_containers.values())
             if int(total_container_utilization) == 0:
                 continue
 
             for detail_name, container_utilization in cpu_utilization_containers.items():
-                csv_buffer.write(generate_csv_line(run_id, 'psu_energy_cgroup_container', detail_name, f"{idx:03}_{phase['name']}", surplus_energy_runtime * (container_utilization / total_container_utilization), 'TOTAL', None, None, 'mJ'))
-                csv_buffer.write(generate_csv_line(run_id, 'psu_power_cgroup_container', detail_name, f"{idx:03}_{phase['name']}", surplus_power_runtime * (container_utilization / total_container_utilization), 'TOTAL', None, None, 'mW'))
-
-
-    csv_buffer.seek(0)  # Reset buffer position to the beginning
-    DB().copy_from(
-        csv_buffer,
-        table='phase_stats',
-        sep=',',
-        columns=('run_id', 'metric', 'detail_name', 'phase', 'value', 'type', 'max_value', 'min_value', 'unit', 'created_at')
-    )
-    csv_buffer.close()  # Close the buffer
+                phase_stats.append(generate_phase_stats_row(run_uuid, 'psu_energy_cgroup_container', detail_name, phase_name, surplus_energy_runtime * (container_utilization / total_container_utilization), 'TOTAL', None, None, 'mJ'))
+                phase_stats.append(generate_phase_stats_row(run_uuid, 'psu_power_cgroup_container', detail_name, phase_name, surplus_power_runtime * (container_utilization / total_container_utilization), 'TOTAL', None, None, 'mW'))
 
+    return phase_stats
 
 if __name__ == '__main__':
     import argparse
@@ -5,18 +5,48 @@ import faulthandler
 faulthandler.enable()  # will catch segfaults and write to stderr
 
 import sys
+import datetime
 
 from lib.db import DB
+from lib.metric_importer import get_measurements_partitions, get_next_month
+
+# Detaches the measurements partitions of all months before the given one. Detaching only changes the catalog,
+# so it takes the same time for every size instead of deleting the measurements row by row.
+# The runs created before are deleted afterwards, as their measurements are gone. All measurements of a run carry the
+# created_at of the run, so none of them are left in the partitions that are kept.
+def detach_measurements_before(month, keep_detached=False):
+    partitions = [name for (partition_month, name) in sorted(get_measurements_partitions().items()) if get_next_month(partition_month) <= month]
+    for name in partitions:
+        DB().query(f"ALTER TABLE measurements DETACH PARTITION {name}")
+        if not keep_detached:
+            DB().query(f"DROP TABLE {name}")
+            continue
+
+        # Otherwise deleting the runs would cascade into the detached table
+        for (constraint, ) in DB().fetch_all("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", params=(name, )):
+            DB().query(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}")
+
+    DB().query("DELETE FROM runs WHERE created_at < %s", params=(f"{month} 00:00:00+00", ))
+    return partitions
 
 if __name__ == '__main__':
     import argparse
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--all', action='store_true', default=False, help='Will also remove successful runs')
+    parser.add_argument('--detach-before', type=str, help='Removes all runs created before this month (YYYY-MM) by detaching the measurements partitions of the months before')
+    parser.add_argument('--keep-detached', action='store_true', default=False, help='Keeps the detached partitions as tables, e.g. to archive them, instead of dropping them')
 
     args = parser.parse_args()  # script will exit if arguments not present
 
-    if args.all:
+    if args.detach_before:
+        detach_month = datetime.datetime.strptime(args.detach_before, '%Y-%m').date()
+        print(f"This will remove all runs created before {detach_month:%Y-%m} and their measurements. Continue? (y/N)")
+        answer = sys.stdin.readline()
+        if answer.strip().lower() == 'y':
+            detached = detach_measurements_before(detach_month, keep_detached=args.keep_detached)
+            print(f"Done. Detached {', '.join(detached) if detached else 'no partitions'}")
+    elif args.all:
         print("This will remove ALL runs and measurement data from the DB. Continue? (y/N)")
         answer = sys.stdin.readline()
         if answer.strip().lower() == 'y':
@@ -4,30 +4,131 @@
 import faulthandler
 faulthandler.enable()  # will catch segfaults and write to stderr
 
+import os
 import sys
+import subprocess
+import multiprocessing
+import concurrent.futures
+from pathlib import Path
 
 from tools.phase_stats import build_and_store_phase_stats
 
 from lib.db import DB
+from lib.global_config import GlobalConfig
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every rebuilt run is appended to this file, so an interrupted rebuild can be resumed with --resume
+CHECKPOINT_FILE = Path.home() / '.cache' / 'green-metrics-tool' / 'rebuild_phase_stats.checkpoint'
+
+# The hashes of all GMT commits before the given one. Runs store the commit of the GMT they were measured with
+def get_older_gmt_hashes(gmt_hash):
+    output = subprocess.check_output(['git', 'rev-list', f"{gmt_hash}^@"], encoding='UTF-8', cwd=CURRENT_DIR)
+    return output.split()
+
+def get_runs(machine_ids=None, start_date=None, end_date=None, older_than_gmt_hash=None):
+    query = '''
+        SELECT id
+        FROM runs
+        WHERE
+            end_measurement IS NOT NULL AND phases IS NOT NULL
+    '''
+    params = []
+
+    if machine_ids:
+        query += ' AND machine_id = ANY(%s)'
+        params.append(machine_ids)
+    if start_date:
+        query += ' AND created_at >= %s'
+        params.append(start_date)
+    if end_date:
+        query += ' AND created_at < %s'
+        params.append(end_date)
+    if older_than_gmt_hash:
+        # Runs from before the GMT hash was stored are older as well
+        query += ' AND (gmt_hash IS NULL OR gmt_hash = ANY(%s))'
+        params.append(get_older_gmt_hashes(older_than_gmt_hash))
+
+    query += ' ORDER BY created_at ASC'
+
+    return [str(run[0]) for run in DB().fetch_all(query, params=params)]
+
+# Removes the runs that an interrupted rebuild has already finished. Failed runs are not in the checkpoint file
+# and are thus rebuilt again
+def get_unfinished_runs(run_ids, checkpoint_file):
+    if not checkpoint_file.exists():
+        return run_ids
+    finished_runs = set(checkpoint_file.read_text(encoding='utf-8').split())
+    return [run_id for run_id in run_ids if run_id not in finished_runs]
+
+# The workers are spawned and would read the config.yml again. They use the config of this process instead
+def init_worker(config):
+    GlobalConfig().config = config
+
+# Runs in the worker processes. The old phase stats of the run are replaced in one transaction,
+# so the phase stats of a run are never missing while the rebuild is running.
+# R of the SCI is not stored with the run, so the software_carbon_intensity_global of the run is kept as it was
+def rebuild_run(run_id):
+    build_and_store_phase_stats(run_id, replace=True)
+    return run_id
+
+def rebuild_phase_stats(run_ids, workers, checkpoint_file):
+    errors = []
+    checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # spawn, as forked workers would share the connections of the DB pool of this process
+    with open(checkpoint_file, 'a', encoding='utf-8') as checkpoint, \
+        concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=init_worker, initargs=(GlobalConfig().config, )) as executor:
+
+        futures = {executor.submit(rebuild_run, run_id): run_id for run_id in run_ids}
+        for count, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            run_id = futures[future]
+            # pylint: disable=broad-exception-caught
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"[{count}/{len(run_ids)}] Could not rebuild phase_stats for run {run_id}: {exc}")
+                errors.append(run_id)
+                continue
+
+            checkpoint.write(f"{run_id}\n")
+            checkpoint.flush()
+            print(f"[{count}/{len(run_ids)}] Rebuilt phase_stats for run {run_id}")
+
+    return errors
 
 if __name__ == '__main__':
-    print('This will remove ALL phase_stats and completely rebuild them. No data will get lost, but it will take some time. Continue? (y/N)')
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Amount of processes that rebuild runs in parallel')
+    parser.add_argument('--machine-id', type=int, action='append', help='Only rebuild runs of this machine. Can be given multiple times')
+    parser.add_argument('--start-date', type=str, help='Only rebuild runs created on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', type=str, help='Only rebuild runs created before this date (YYYY-MM-DD)')
+    parser.add_argument('--older-than-gmt-hash', type=str, help='Only rebuild runs that were measured with a GMT version before this commit')
+    parser.add_argument('--resume', action='store_true', help='Skip the runs that an interrupted rebuild has already finished')
+    parser.add_argument('--checkpoint-file', type=Path, default=CHECKPOINT_FILE, help='File to record the finished runs in')
+
+    args = parser.parse_args()  # script will exit if arguments not present
+
+    print('Fetching runs ...')
+    runs = get_runs(args.machine_id, args.start_date, args.end_date, args.older_than_gmt_hash)
+
+    if args.resume:
+        unfinished_runs = get_unfinished_runs(runs, args.checkpoint_file)
+        print(f"Resuming. {len(runs) - len(unfinished_runs)} runs were already rebuilt")
+        runs = unfinished_runs
+
+    print(f"This will rebuild the phase_stats of {len(runs)} runs. The phase_stats of every run are replaced on their own, so a run never misses them.")
+    print('The software_carbon_intensity_global of the runs is NOT recalculated, as R is not stored with a run. The existing values are kept. Continue? (y/N)')
     answer = sys.stdin.readline()
     if answer.strip().lower() == 'y':
-        print('Deleting old phase_stats ...')
-        DB().query('DELETE FROM phase_stats')
-        print('Fetching runs ...')
-        query = '''
-            SELECT id
-            FROM runs
-            WHERE
-                end_measurement IS NOT NULL AND phases IS NOT NULL
-        '''
-        runs = DB().fetch_all(query)
-
-        print(f"Fetched {len(runs)} runs. Commencing ...")
-        for idx, run_id in enumerate(runs):
-
-            print(f"Rebuilding phase_stats for run #{idx} {run_id[0]}")
-            build_and_store_phase_stats(run_id[0])
-        print('Done')
+        if not args.resume and args.checkpoint_file.exists():
+            args.checkpoint_file.unlink() # a new rebuild
+        failed_runs = rebuild_phase_stats(runs, args.workers, args.checkpoint_file)
+        if failed_runs:
+            print(f"Done. The phase_stats of {len(failed_runs)} runs could not be rebuilt: {', '.join(failed_runs)}")
+            print('Running again with --resume will only retry these')
+        else:
+            print('Done')
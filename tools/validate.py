@@ -85,7 +85,7 @@ def run_workload(name, uri, filename, branch):
     )
     # Start main code. Only URL is allowed for cron jobs
     run_id = runner.run()
-    build_and_store_phase_stats(run_id, runner._sci)
+    build_and_store_phase_stats(run_id, runner._sci, runner._phase_stats_collector)
 
 def validate_workload_stddev(data, threshold):
     warning = False